@@ -1,5 +1,5 @@
 # Flask and app imports
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from . import flask_app as app
 import os
 import sys
@@ -9,14 +9,32 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from backend.models.table_models import db, ParkingLot, ParkingSpot, Reservation, User
 from backend.models.create_admin import create_admin
 from backend.models.auth_routes import register_user, login_user
+from backend.models.occupancy import lots_with_occupancy, check_occupancy_consistency
+from backend.models.spot_allocator import claim_spot, free_spot, close_reservation, remove_free_spot
+from backend.models.spot_provisioning import add_spots, resize_lot, parse_total_spots
+from backend.models.occupancy_bitmap import get_occupancy, forget_after_commit
+from backend.models.pagination import page_args, keyset_page
+from backend.models.reports import user_summary, revenue_by_lot
+from backend.models.lot_search import search_lots
+from backend.models.user_search import search_users, autocomplete_users
+from backend.models.occupancy_events import publish_lots, publish_lot_deleted, event_stream
+from backend.models.geo import parse_coordinates, nearest_available_lots, NEARBY_LIMIT, MAX_NEARBY_LIMIT, MAX_RADIUS_KM
+from backend.models.lot_map import lot_map
+from backend.models.metrics import render_metrics, remote_samples
+from backend.models.history_export import export_chunks, export_filename, export_mimetype
+from backend.models.analytics import parse_range, lot_report, occupancy_timeline, occupancy_heatmap
+from backend.models.rollups import bump_rollups, booking, completion
+from backend.models.write_behind import write_behind_enabled, get_write_behind, drain_write_behind, write_behind_paused, WriteBehindFull, RELEASED, NOT_FOUND
 
 # JWT and other libraries
-from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timezone
-from tasks.reminder_tasks import export_user_parking_history
-from sqlalchemy import or_
+from tasks.reminder_tasks import export_user_parking_history, monthly_report_progress
+from sqlalchemy.orm import joinedload
 import math
-from backend.models import cache
+import hmac
+from backend.models.roles import role_required, current_user_id
+from flask_jwt_extended import jwt_required
+from backend.models.caching import cached_view, invalidate_user, invalidate_lots, invalidate_users, cache_stats
 import time
 
 # Initialize admin user on app startup
@@ -32,40 +50,55 @@ create_admin(app)
 # Creates a new parking lot and its associated parking spots.
 def CreateParkingLot(data):
     try:
+        latitude, longitude = parse_coordinates(data.get('latitude'), data.get('longitude'))
+
+        total_spots = parse_total_spots(data.get('total_spots'))
+
         lot = ParkingLot(
             prime_location = data['prime_location'],
             price = data['price'],
             address =data['address'],
             pincode = data['pincode'],
-            total_spots = data['total_spots'],
-            available_spots = data['total_spots']
+            total_spots = total_spots,
+            available_spots = total_spots,
+            latitude = latitude,
+            longitude = longitude
         )
 
+        # Lot and all of its spots are created in one transaction
         db.session.add(lot)
-        db.session.commit()
+        db.session.flush()
 
-        for _ in range(data['total_spots']):
-            db.session.add(ParkingSpot(lot_id=lot.id, status='A'))
+        add_spots(lot.id, total_spots)
 
         db.session.commit()
+        publish_lots([lot.id])
 
         return {'msg': 'Parking lot created with spots'}, 201
+
+    except ValueError as e:
+        db.session.rollback()
+        return {'msg': str(e)}, 400
     
     except Exception as e:
         db.session.rollback()
         return {'msg': 'Error occured while creating Parking Lot'}, 400
 
 ## Get Records of All Lots
-# Returns all parking lots with their spot statistics.
-def GetAllLots():
+# Returns all parking lots with their spot statistics, or one keyset page of them.
+def GetAllLots(paginated=False):
     try:
-        lots = ParkingLot.query.all()
+        lot_ids = None
+        next_cursor = None
+        if paginated:
+            limit, cursor = page_args()
+            page, next_cursor = keyset_page(db.session.query(ParkingLot.id), [ParkingLot.id], limit, cursor)
+            lot_ids = [row.id for row in page]
+
         result = []
 
-        for lot in lots:
+        for lot, available_spots, occupied_spots in lots_with_occupancy(lot_ids):
             total_spots = lot.total_spots
-            available_spots = ParkingSpot.query.filter_by(lot_id=lot.id, status='A').count()
-            occupied_spots = total_spots - available_spots
 
             result.append({
                 'id': lot.id,
@@ -73,18 +106,28 @@ def GetAllLots():
                 'price': lot.price,
                 'address': lot.address,
                 'pincode': lot.pincode,
+                'latitude': lot.latitude,
+                'longitude': lot.longitude,
                 'total_spots': total_spots,
                 'available_spots': available_spots,
                 'occupied_spots': occupied_spots
             })
 
+        if paginated:
+            return {'items': result, 'next_cursor': next_cursor}, 200
+
         return result, 200
 
+    except ValueError as e:
+        return {'msg': str(e)}, 400
+
     except Exception as e:
         return {'msg': 'Error occured while getting all Parking Lots'}, 400
 
 ## Admin Edits Parking Lot
 # Updates details of a parking lot.
+# Resizing works on the spot rows; they must include queued reservations
+@write_behind_paused()
 def EditParkingLot(lot_id):
     try:
         lot = ParkingLot.query.get(lot_id)
@@ -98,12 +141,25 @@ def EditParkingLot(lot_id):
         lot.price = data.get('price', lot.price)
         lot.address = data.get('address', lot.address)
         lot.pincode = data.get('pincode', lot.pincode)
-        lot.total_spots = data.get('total_spots', lot.total_spots)
+        if 'latitude' in data or 'longitude' in data:
+            lot.latitude, lot.longitude = parse_coordinates(data.get('latitude'), data.get('longitude'))
+
+        # Resizing adds or removes spot rows and shifts the counters with them
+        new_total = parse_total_spots(data.get('total_spots', lot.total_spots))
+
+        if not resize_lot(lot, new_total):
+            db.session.rollback()
+            return {'msg': 'Cannot shrink lot. Not enough free spots without reservation history.'}, 400
 
         db.session.commit()
+        publish_lots([lot.id])
 
         return {'msg': 'Lot updated successfully'}, 200
 
+    except ValueError as e:
+        db.session.rollback()
+        return {'msg': str(e)}, 400
+
     except Exception as e:
         db.session.rollback()
         return {'msg': 'Error occurred while editing Parking Lot'}, 400
@@ -111,6 +167,7 @@ def EditParkingLot(lot_id):
 
 ## Admin Deletes Parking Lot
 # Deletes a parking lot if no reservations or occupied spots exist.
+@write_behind_paused()
 def DeleteParkingLot(lot_id):
     try:
         lot = ParkingLot.query.get(lot_id)
@@ -131,8 +188,10 @@ def DeleteParkingLot(lot_id):
 
         # Safe to delete
         ParkingSpot.query.filter_by(lot_id=lot.id).delete()
+        forget_after_commit(lot.id)
         db.session.delete(lot)
         db.session.commit()
+        publish_lot_deleted(lot_id)
 
         return {'msg': 'Lot and its spots deleted successfully'}, 200
     
@@ -141,31 +200,34 @@ def DeleteParkingLot(lot_id):
         return {'msg': 'Error occured while editing Parking Lot'}, 400
 
 ## Admin Gets All Registered Users
-# Returns all registered users (excluding admins).
+# Returns one keyset page of registered users (excluding admins).
 def GetRegisteredUsers():
     try:
-        users = User.query.all()
+        limit, cursor = page_args()
+        users, next_cursor = keyset_page(User.query.filter(User.role == 'user'), [User.id], limit, cursor)
+
         result = []
         for user in users:
-            if user.role == 'user':
-                result.append({
-                    'id': user.id,
-                    'full_name': user.full_name,
-                    'email': user.email,
-                    'address': user.address,
-                    'pincode': user.pincode
-                })
-            
-            else:
-                continue
+            result.append({
+                'id': user.id,
+                'full_name': user.full_name,
+                'email': user.email,
+                'address': user.address,
+                'pincode': user.pincode
+            })
 
-        return result, 200
+        return {'items': result, 'next_cursor': next_cursor}, 200
+
+    except ValueError as e:
+        return {'msg': str(e)}, 400
     
     except Exception as e:
         return {'msg': 'Error fetching registered users'}, 400
     
 ## Admin Deletes a Parking Spot
 # Deletes a parking spot if not occupied and has no reservation history.
+# A queued reservation may hold the spot; it is written before the checks
+@write_behind_paused()
 def DeleteSpot(spot_id):
     try:
         spot = ParkingSpot.query.get(spot_id)
@@ -183,11 +245,13 @@ def DeleteSpot(spot_id):
         if not lot:
             return {'msg': 'Associated parking lot not found'}, 404
 
-        lot.total_spots -= 1
-        lot.available_spots -= 1
+        # Delete only if still free; counters are adjusted in SQL
+        if not remove_free_spot(spot.id, lot.id):
+            db.session.rollback()
+            return {'msg': 'Cannot delete an occupied spot'}, 400
 
-        db.session.delete(spot)
         db.session.commit()
+        publish_lots([lot.id])
 
         return {'msg': 'Parking spot deleted successfully'}, 200
 
@@ -199,15 +263,18 @@ def DeleteSpot(spot_id):
 # Returns data for a specific spot in a lot, including reservation info if occupied.
 def GetSpotData(spot_no, lot_id):
     try:
-        spots = ParkingSpot.query.filter_by(lot_id=lot_id).order_by(ParkingSpot.id).all()
+        # Queued reservations would show their spots as free
+        drain_write_behind()
 
-        if spot_no < 1 or spot_no > len(spots):
-            return {'msg': 'Invalid spot number for the given lot'}, 400
+        # Single lookup on the (lot_id, spot_no) unique index
+        spot = ParkingSpot.query.filter_by(lot_id=lot_id, spot_no=spot_no).first()
 
-        spot = spots[spot_no - 1]
+        if not spot:
+            return {'msg': 'Invalid spot number for the given lot'}, 400
 
         response = {
             'spot_id': spot.id,
+            'spot_no': spot.spot_no,
             'lot_id': spot.lot_id,
             'status': spot.status,
             'reservation': None
@@ -231,9 +298,27 @@ def GetSpotData(spot_no, lot_id):
         print("Error in GetSpotData:", e)
         return {'msg': 'Server error while fetching spot data'}, 500
 
+## Admin Gets the Spot Map of a Lot
+# Returns the status of every spot number in a lot as a run-length string or bitmaps.
+def GetLotMap(lot_id):
+    try:
+        drain_write_behind()
+
+        if not db.session.get(ParkingLot, lot_id):
+            return {'msg': 'Lot not found'}, 404
+
+        return lot_map(lot_id, request.args.get('format', 'rle')), 200
+
+    except ValueError as e:
+        return {'msg': str(e)}, 400
+
+    except Exception as e:
+        print("Error in GetLotMap:", e)
+        return {'msg': 'Server error while fetching the lot map'}, 500
+
     
 ## User Searches for Users
-# Allows admin to search for users by name.
+# Allows admin to search for users by name or email (word prefixes), one keyset page at a time.
 def SearchUsers():
     try:
         search_query = request.args.get('search_query')
@@ -241,21 +326,13 @@ def SearchUsers():
         if not search_query:
             return {'msg': 'Search query is required'}, 400
 
-        users = User.query.filter(User.full_name.ilike(f'%{search_query}%')).all()
-
-        result = []
+        limit, cursor = page_args()
+        result, next_cursor = search_users(search_query, limit, cursor)
 
-        for user in users:
-            if user.role != 'admin':
-                result.append({
-                    'id': user.id,
-                    'email': user.email,
-                    'full_name': user.full_name,
-                    'address': user.address,
-                    'pincode': user.pincode
-                })
+        return {'items': result, 'next_cursor': next_cursor}, 200
 
-        return result, 200
+    except ValueError as e:
+        return {'msg': str(e)}, 400
     
     except Exception as e:
         print("Error: ", e)
@@ -273,27 +350,38 @@ def ReserveSpot(user_id):
         if not lot:
             return {'msg': 'Lot not found'}, 404
 
-        # Find available spot
-        spot = ParkingSpot.query.filter_by(lot_id=lot_id, status='A').first()
-        if not spot:
+        # Write-behind: decided in memory, journaled, written to the tables shortly after
+        if write_behind_enabled():
+            reservation_id = get_write_behind().reserve(user_id, lot.id, vehicle_no)
+            if reservation_id is None:
+                return {'msg': 'No available spots in this lot'}, 400
+            publish_lots([lot.id])
+            return {'msg': 'Spot reserved', 'reservation_id': reservation_id}, 201
+
+        # Atomically claim an available spot (also decrements the lot counter)
+        spot_id = claim_spot(lot.id)
+        if not spot_id:
+            db.session.rollback()
             return {'msg': 'No available spots in this lot'}, 400
 
-        # Mark spot as occupied
-        spot.status = 'O'
-
         reservation = Reservation(
             user_id = user_id,
-            spot_id = spot.id,
+            spot_id = spot_id,
             parking_time = datetime.now(timezone.utc),
             vehicle_no = vehicle_no
         )
 
-        lot.available_spots -= 1
         db.session.add(reservation)
+        bump_rollups([booking(user_id, lot.id, reservation.parking_time)])
         db.session.commit()
+        publish_lots([lot.id])
 
         return {'msg': 'Spot reserved', 'reservation_id': reservation.id}, 201
 
+    except WriteBehindFull as e:
+        print("Error: ", e)
+        return {'msg': 'Too many reservations are being saved, please retry shortly'}, 503
+
     except Exception as e:
         db.session.rollback()
         return {'msg': 'Reservation failed'}, 500
@@ -302,6 +390,16 @@ def ReserveSpot(user_id):
 # Allows a user to release a reserved parking spot and calculates cost.
 def ReleaseSpot(reservation_id, user_id):
     try:
+        # Write-behind: checked against the pending changes first, journaled like reserves
+        if write_behind_enabled():
+            outcome, cost, lot_id = get_write_behind().release(reservation_id, user_id)
+            if outcome == NOT_FOUND:
+                return {'msg': 'Reservation not found'}, 404
+            if outcome != RELEASED:
+                return {'msg': 'Reservation already released'}, 400
+            publish_lots([lot_id])
+            return {'msg':'Spot released', 'cost': cost},200
+
         reservation = Reservation.query.filter_by(id=reservation_id, user_id=user_id).first()
         if not reservation:
             return {'msg': 'Reservation not found'}, 404
@@ -309,24 +407,31 @@ def ReleaseSpot(reservation_id, user_id):
         if reservation.leaving_time:
             return {'msg': 'Reservation already released'}, 400
 
-        leaving_time = datetime.now(timezone.utc)
+        leaving_time = datetime.now(timezone.utc).replace(tzinfo = None)
 
         spot = ParkingSpot.query.get(reservation.spot_id)
-        spot.status = 'A'
-
         lot = ParkingLot.query.get(spot.lot_id)
-        lot.available_spots += 1
-
-        reservation.leaving_time = leaving_time.replace(tzinfo = None)
 
         # cost calc
-        hours = (reservation.leaving_time - reservation.parking_time).total_seconds() / 3600
+        hours = (leaving_time - reservation.parking_time).total_seconds() / 3600
         hours = math.ceil(hours)  # ceiling to next integer
-        reservation.cost = hours * lot.price
+        cost = hours * lot.price
 
+        # Close the reservation only if no concurrent release got there first
+        if not close_reservation(reservation.id, leaving_time, cost):
+            db.session.rollback()
+            return {'msg': 'Reservation already released'}, 400
+
+        free_spot(spot.id, lot.id)
+        bump_rollups([completion(user_id, lot.id, reservation.parking_time, leaving_time, cost)])
         db.session.commit()
+        publish_lots([lot.id])
 
-        return {'msg':'Spot released', 'cost': reservation.cost},200
+        return {'msg':'Spot released', 'cost': cost},200
+
+    except WriteBehindFull as e:
+        print("Error: ", e)
+        return {'msg': 'Too many reservations are being saved, please retry shortly'}, 503
 
     except Exception as e:
         print("Error: ", e)
@@ -334,15 +439,27 @@ def ReleaseSpot(reservation_id, user_id):
         return {'msg': 'Release failed'}, 500
 
 ## Particular User's Reservation Details
-# Returns all reservations for a specific user.
+# Returns one keyset page of a user's reservations, newest first.
 def GetUserReservations(user_id):
     try:
-        reservations = Reservation.query.filter_by(user_id=user_id).all()
+        # The user's own queued reservations are written first (read-your-writes)
+        drain_write_behind(user_id)
+        limit, cursor = page_args()
+
+        # Spots and lots are joined into the same query
+        query = (
+            Reservation.query
+            .filter_by(user_id=user_id)
+            .options(joinedload(Reservation.spot).joinedload(ParkingSpot.lot))
+        )
+        reservations, next_cursor = keyset_page(
+            query, [Reservation.parking_time, Reservation.id], limit, cursor, descending=True
+        )
         result = []
 
         for res in reservations:
-            spot = ParkingSpot.query.get(res.spot_id)
-            lot = ParkingLot.query.get(spot.lot_id)
+            spot = res.spot
+            lot = spot.lot
 
             result.append({
                 'reservation_id': res.id,
@@ -355,13 +472,16 @@ def GetUserReservations(user_id):
                 'vehicle_no': res.vehicle_no
             })
 
-        return result, 200
+        return {'items': result, 'next_cursor': next_cursor}, 200
+
+    except ValueError as e:
+        return {'msg': str(e)}, 400
 
     except Exception as e:
         return {'msg': 'Error fetching reservations'}, 400
 
 ## User Searches for Lots
-# Allows users to search for parking lots by location, address, or pincode.
+# Allows users to search for parking lots by location, address, or pincode, best match first.
 def SearchLots():
     try:
         search_query = request.args.get('search_query')
@@ -369,23 +489,7 @@ def SearchLots():
         if not search_query:
             return {'msg': 'Search query is required'}, 400
 
-        lots = ParkingLot.query.filter(
-                    or_(
-                        ParkingLot.prime_location.ilike(f'%{search_query}%'),
-                        ParkingLot.address.ilike(f'%{search_query}%'),
-                        ParkingLot.pincode.ilike(f'%{search_query}%')
-                    )
-                ).all()
-
-        result = []
-
-        for lot in lots:
-            result.append({
-                'id': lot.id,
-                'address': lot.address,
-                'price': lot.price,
-                'available_spots': lot.available_spots,
-            })
+        result = search_lots(search_query)
 
         return result, 200
     
@@ -393,26 +497,35 @@ def SearchLots():
         print("Error: ", e)
         return {'msg': 'Error searching for lots'}, 455
     
+## User Finds Nearby Lots
+# Returns the nearest lots with free spots around ?lat=&lng=, nearest first.
+def NearbyLots():
+    try:
+        latitude, longitude = parse_coordinates(request.args.get('lat'), request.args.get('lng'))
+        if latitude is None:
+            return {'msg': 'lat and lng are required'}, 400
+
+        limit = min(int(request.args.get('limit', NEARBY_LIMIT)), MAX_NEARBY_LIMIT)
+        radius_km = min(float(request.args.get('radius_km', MAX_RADIUS_KM)), MAX_RADIUS_KM)
+        if limit < 1 or radius_km <= 0:
+            return {'msg': 'limit and radius_km must be positive'}, 400
+
+        return nearest_available_lots(latitude, longitude, limit, radius_km), 200
+
+    except ValueError as e:
+        return {'msg': str(e)}, 400
+
+    except Exception as e:
+        print("Error: ", e)
+        return {'msg': 'Error finding nearby lots'}, 500
+
 ## User Summary
 # Returns summary statistics for a user's reservations.
 def GetUserSummary(user_id):
     try:
-        reservations = Reservation.query.filter_by(user_id=user_id).all()
-        active = 0
-        checked_out = 0
-        total_spent = 0
-        for res in reservations:
-            if res.leaving_time:
-                checked_out += 1
-                total_spent += res.cost
-            else:
-                active += 1
-
-        result = {
-            'active_reservations': active,
-            'checked_out_reservations': checked_out,
-            'total_spent': total_spent
-        }
+        drain_write_behind(user_id)
+        # Counts and sum are computed in SQL
+        result = user_summary(user_id)
 
         return result, 200
 
@@ -423,23 +536,16 @@ def GetUserSummary(user_id):
 # Returns overall statistics for admin dashboard (revenue, occupancy, etc.).
 def GetAdminSummary():
     try:
-        reservations = Reservation.query.all()
-        print("HELLO")
-        lots = ParkingLot.query.all()
+        # Revenue is summed per lot in SQL
+        lot_revenue = revenue_by_lot()
+        total_revenue = sum(lot['revenue'] for lot in lot_revenue)
 
-        total_revenue = 0
         occupied = 0
         available = 0
         lot_shares = []
-        for res in reservations:
-            if res.leaving_time:
-                total_revenue += res.cost
-            else:
-                pass
         
-        for lot in lots:
-            lot_occupied = lot.total_spots - lot.available_spots
-            available += lot.available_spots
+        for lot, lot_available, lot_occupied in lots_with_occupancy():
+            available += lot_available
             occupied += lot_occupied
             lot_shares.append({
                 'lot_name': lot.prime_location,
@@ -450,7 +556,8 @@ def GetAdminSummary():
             'occupied': occupied,
             'available': available,
             'total_revenue': total_revenue,
-            'lot_shares': lot_shares
+            'lot_shares': lot_shares,
+            'lot_revenue': lot_revenue
         }
         
         return result, 200
@@ -459,6 +566,95 @@ def GetAdminSummary():
         print("Exception: ", e)
         return {'msg': 'Error fetching admin summary'}, 400
 
+## Occupancy Consistency
+# Reports lots whose stored spot counters disagree with their ParkingSpot rows.
+def GetOccupancyConsistency(repair=False):
+    try:
+        drain_write_behind()
+        mismatches = check_occupancy_consistency(repair=repair)
+        if repair:
+            # Bitmaps are rebuilt from the spot rows on next use
+            get_occupancy().forget()
+        if repair and mismatches:
+            publish_lots(mismatch['lot_id'] for mismatch in mismatches)
+
+        return {'consistent': not mismatches, 'repaired': repair and bool(mismatches), 'mismatches': mismatches}, 200
+
+    except Exception as e:
+        db.session.rollback()
+        print("Error in GetOccupancyConsistency:", e)
+        return {'msg': 'Error checking lot occupancy'}, 500
+
+## Get Monthly Report Progress
+# Batches completed and emails sent or failed so far for a monthly report run
+# (the group id returned by send_monthly_user_report).
+def GetMonthlyReportProgress(group_id):
+    try:
+        progress = monthly_report_progress(group_id)
+        if progress is None:
+            return {'msg': 'Monthly report run not found'}, 404
+
+        return {'group_id': group_id, **progress}, 200
+
+    except Exception as e:
+        print("Error in GetMonthlyReportProgress:", e)
+        return {'msg': 'Error reading monthly report progress'}, 500
+
+## Analytics Arguments
+# Date range (start/end days, utc_offset minutes) and optional lot_id from the query string.
+def analytics_args():
+    lot_id = request.args.get('lot_id')
+    if lot_id is not None and not lot_id.isdigit():
+        raise ValueError('lot_id must be an integer')
+
+    start_s, end_s = parse_range(request.args.get('start'), request.args.get('end'), request.args.get('utc_offset'))
+    return start_s, end_s, int(lot_id) if lot_id else None
+
+## Lot Analytics
+# Bookings, revenue, dwell time, turnover and occupancy rate per lot over a date range.
+def GetLotAnalytics():
+    try:
+        start_s, end_s, _ = analytics_args()
+
+        return lot_report(start_s, end_s), 200
+
+    except ValueError as e:
+        return {'msg': str(e)}, 400
+
+    except Exception as e:
+        print("Error in GetLotAnalytics:", e)
+        return {'msg': 'Error computing lot analytics'}, 500
+
+## Occupancy Timeline
+# Average occupied spots per lot for every hour (or day) of a date range.
+def GetOccupancyTimeline():
+    try:
+        start_s, end_s, lot_id = analytics_args()
+
+        return occupancy_timeline(start_s, end_s, request.args.get('bucket', 'hour'), lot_id), 200
+
+    except ValueError as e:
+        return {'msg': str(e)}, 400
+
+    except Exception as e:
+        print("Error in GetOccupancyTimeline:", e)
+        return {'msg': 'Error computing occupancy timeline'}, 500
+
+## Occupancy Heatmap
+# Average occupancy rate by weekday and hour of day over a date range.
+def GetOccupancyHeatmap():
+    try:
+        start_s, end_s, lot_id = analytics_args()
+
+        return occupancy_heatmap(start_s, end_s, request.args.get('utc_offset', 0), lot_id), 200
+
+    except ValueError as e:
+        return {'msg': str(e)}, 400
+
+    except Exception as e:
+        print("Error in GetOccupancyHeatmap:", e)
+        return {'msg': 'Error computing occupancy heatmap'}, 500
+
 
 #----------------------------------------------- Route Functions ------------------------------------------------------
 # These functions define the API endpoints for user and admin actions.
@@ -468,6 +664,9 @@ def GetAdminSummary():
 def Register():
     data = request.get_json()
     response, status = register_user(data)
+
+    if status == 201:
+        invalidate_users()
     
     return jsonify(response), status
 
@@ -481,237 +680,293 @@ def Login():
 
 
 @app.route('/admin/parking_lot', methods=['POST'])
-@jwt_required()
+@role_required('admin')
 # Admin endpoint to create a new parking lot.
 def Create_Parking_Lot():
-    user_id = get_jwt_identity()
-    user = User.query.get(int(user_id))
-    if not user or user.role != 'admin':
-        return jsonify({'msg': 'Admins only'}), 403
-
     data = request.get_json()
 
     result, status = CreateParkingLot(data)
 
-    cache.delete('/admin/parking_lots')
+    invalidate_lots()
 
     return jsonify(result), status
 
 @app.route('/admin/parking_lots', methods=['GET'])
-@cache.cached(timeout = 60, key_prefix = '/admin/parking_lots')
-@jwt_required()
+@role_required('admin')
+@cached_view('/admin/parking_lots', timeout = 60, scopes = ('lots',))
 # Admin endpoint to get all parking lots.
 def Get_All_Lots():
-    user_id = get_jwt_identity()
-    user = User.query.get(int(user_id))
-    if not user or user.role != 'admin':
-        return jsonify({'msg': 'Admins only'}), 403
-
-    result, status = GetAllLots()
+    result, status = GetAllLots(paginated=True)
 
     return jsonify(result), status
 
 @app.route('/admin/parking_lot/<int:lot_id>', methods=['PUT'])
-@jwt_required()
+@role_required('admin')
 # Admin endpoint to edit a parking lot.
 def Edit_Parking_Lot(lot_id):
-    user_id = get_jwt_identity()
-    user = User.query.get(int(user_id))
-    if not user or user.role != 'admin':
-        return jsonify({'msg': 'Admins only'}), 403
-
     result, status = EditParkingLot(lot_id)
 
-    cache.delete('/admin/parking_lots')
+    invalidate_lots()
 
     return jsonify(result), status
 
 @app.route('/admin/registered_users', methods = ["GET"])
-@cache.cached(timeout = 120, key_prefix = '/admin/registered_users')
-@jwt_required()
+@role_required('admin')
+@cached_view('/admin/registered_users', timeout = 120, scopes = ('users',))
 # Admin endpoint to get all registered users.
 def Get_Registered_Users():
-    user_id = get_jwt_identity()
-    user = User.query.get(int(user_id))
-    if not user or user.role != 'admin':
-        return jsonify({'msg': 'Admins only'}), 403
-
     result, status = GetRegisteredUsers()
 
     return jsonify(result), status
 
 @app.route('/admin/parking_lot/<int:lot_id>', methods = ['DELETE'])
-@jwt_required()
+@role_required('admin')
 # Admin endpoint to delete a parking lot.
 def Delete_Parking_Lot(lot_id):
-    user_id = get_jwt_identity()
-    user = User.query.get(int(user_id))
-    if not user or user.role != 'admin':
-        return jsonify({'msg': 'Admins only'}), 403
-
     result, status = DeleteParkingLot(lot_id)
 
-    cache.delete('/admin/parking_lots')
+    invalidate_lots()
 
     return jsonify(result), status
 
 @app.route('/lots', methods = ["GET"])
-@jwt_required()
+@role_required('user')
+@cached_view('/lots', timeout = 60, scopes = ('lots',))
 # User endpoint to get all parking lots.
 def Get_Lots_For_User():
-    user_id = get_jwt_identity()
-    user = User.query.get(int(user_id))
-    if not user or user.role != 'user':
-        return jsonify({'msg': 'Users only'}), 403
-
     result, status = GetAllLots()
 
     return jsonify(result), status
     
 @app.route('/reserve', methods=['POST'])
-@jwt_required()
+@role_required('user')
 # User endpoint to reserve a parking spot.
 def Reserve_Spot():
-    user_id = get_jwt_identity()
-    user = User.query.get(int(user_id))
-    if not user or user.role != 'user':
-        return jsonify({'msg': 'Users only'}), 403
-    
+    user_id = current_user_id()
 
-    response, status = ReserveSpot(user.id)
+    response, status = ReserveSpot(user_id)
 
-    cache.delete('/my_reservations')
-    cache.delete('/user/summary')
+    invalidate_user(user_id)
+    invalidate_lots()
 
     return jsonify(response), status
 
 
 @app.route('/release/<int:reservation_id>', methods=['POST'])
-@jwt_required()
+@role_required('user')
 # User endpoint to release a reserved parking spot.
 def Release_Spot(reservation_id):
-    user_id = get_jwt_identity()
-    user = User.query.get(int(user_id))
-    if not user or user.role != 'user':
-        return jsonify({'msg': 'Users only'}), 403
+    user_id = current_user_id()
 
-    response, status = ReleaseSpot(reservation_id, user.id)
+    response, status = ReleaseSpot(reservation_id, user_id)
 
-    cache.delete('/my_reservations')
-    cache.delete('/user/summary')
+    invalidate_user(user_id)
+    invalidate_lots()
 
     return jsonify(response), status
 
 
 @app.route('/my_reservations', methods=['GET'])
-@cache.cached(timeout = 120, key_prefix = '/my_reservations')
-@jwt_required()
+@role_required('user')
+@cached_view('/my_reservations', timeout = 120, scopes = ('user',))
 # User endpoint to get all reservations for the logged-in user.
 def Get_My_Reservations():
-    user_id = get_jwt_identity()
-    user = User.query.get(int(user_id))
-    if not user or user.role != 'user':
-        return jsonify({'msg': 'Users only'}), 403
+    user_id = current_user_id()
 
-    result, status = GetUserReservations(user.id)
+    result, status = GetUserReservations(user_id)
 
     return jsonify(result), status
 
 @app.route('/search_lots', methods = ['GET'])
-@jwt_required()
+@role_required('user')
 # User endpoint to search for parking lots.
 def Search_Lots():
-    user_id = get_jwt_identity()
-    user = User.query.get(int(user_id))
-    if not user or user.role != 'user':
-        return jsonify({'msg': 'Users only'}), 403
-
     result, status = SearchLots()
 
     return jsonify(result), status
 
+@app.route('/lots/nearby', methods = ['GET'])
+@role_required('user')
+# User endpoint to find the nearest lots with free spots.
+def Nearby_Lots():
+    result, status = NearbyLots()
+
+    return jsonify(result), status
+
 @app.route('/user/summary', methods = ['GET'])
-@cache.cached(timeout = 120, key_prefix = '/user/summary')
-@jwt_required()
+@role_required('user')
+@cached_view('/user/summary', timeout = 120, scopes = ('user',))
 # User endpoint to get summary statistics for the logged-in user.
 def Get_User_Summary():
-    user_id = get_jwt_identity()
-    user = User.query.get(int(user_id))
-    if not user or user.role != 'user':
-        return jsonify({'msg': 'Users only'}), 403
+    user_id = current_user_id()
     
-    result, status = GetUserSummary(user.id)
+    result, status = GetUserSummary(user_id)
 
     return jsonify(result), status
 
 @app.route('/admin/summary', methods = ['GET'])
-@cache.cached(timeout = 120, key_prefix = '/admin/summary')
-@jwt_required()
+@role_required('admin')
+@cached_view('/admin/summary', timeout = 120, scopes = ('lots',))
 # Admin endpoint to get overall summary statistics.
 def Get_Admin_Summary():
-    user_id = get_jwt_identity()
-    user = User.query.get(int(user_id))
-    if not user or user.role != 'admin':
-        return jsonify({'msg': 'Admins only'}), 403
-
     result, status = GetAdminSummary()
 
     return jsonify(result), status
 
-@app.route('/admin/search', methods = ['GET'])
+@app.route('/admin/occupancy/consistency', methods = ['GET', 'POST'])
+@role_required('admin')
+# Admin endpoint to check (GET) or repair (POST) lot spot counters against spot rows.
+def Occupancy_Consistency():
+    repair = request.method == 'POST'
+    result, status = GetOccupancyConsistency(repair=repair)
+
+    if repair:
+        invalidate_lots()
+
+    return jsonify(result), status
+
+# Analytics responses are cached per query string (date range, lot, bucket) for 5 minutes
+@app.route('/admin/analytics/lots', methods = ['GET'])
+@role_required('admin')
+@cached_view('/admin/analytics/lots', timeout = 300)
+# Admin endpoint to get per-lot bookings, revenue, dwell time, turnover and occupancy (?start=&end=).
+def Get_Lot_Analytics():
+    result, status = GetLotAnalytics()
+
+    return jsonify(result), status
+
+@app.route('/admin/analytics/occupancy', methods = ['GET'])
+@role_required('admin')
+@cached_view('/admin/analytics/occupancy', timeout = 300)
+# Admin endpoint to get each lot's occupancy per hour or day (?start=&end=&bucket=hour|day&lot_id=).
+def Get_Occupancy_Timeline():
+    result, status = GetOccupancyTimeline()
+
+    return jsonify(result), status
+
+@app.route('/admin/analytics/heatmap', methods = ['GET'])
+@role_required('admin')
+@cached_view('/admin/analytics/heatmap', timeout = 300)
+# Admin endpoint to get the weekday x hour occupancy heatmap (?start=&end=&utc_offset=&lot_id=).
+def Get_Occupancy_Heatmap():
+    result, status = GetOccupancyHeatmap()
+
+    return jsonify(result), status
+
+@app.route('/admin/reports/monthly/<group_id>', methods = ['GET'])
+@role_required('admin')
+# Admin endpoint to follow a monthly report run: batches completed, emails sent and failed.
+def Get_Monthly_Report_Progress(group_id):
+    result, status = GetMonthlyReportProgress(group_id)
+
+    return jsonify(result), status
+
+@app.route('/admin/cache_stats', methods = ['GET'])
+@role_required('admin')
+# Admin endpoint to get cache hit/miss counters and cache backend usage.
+def Get_Cache_Stats():
+    return jsonify(cache_stats()), 200
+
+# Prometheus text body with this process's samples and the Celery workers' ones
+def metrics_response():
+    body = render_metrics(remote_samples(app.config['METRICS_REDIS_URL']))
+
+    return Response(body, mimetype = 'text/plain; version=0.0.4')
+
+@app.route('/metrics', methods = ['GET'])
+# Prometheus scrape endpoint: request, SQL, cache and Celery task metrics.
+# Requires "Authorization: Bearer <METRICS_TOKEN>" when METRICS_TOKEN is set,
+# otherwise (or with any other token) an admin JWT.
+def Metrics():
+    token = app.config.get('METRICS_TOKEN')
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return metrics_response()
+
+    return role_required('admin')(metrics_response)()
+
+@app.route('/events/occupancy', methods = ['GET'])
 @jwt_required()
+# Endpoint streaming lot availability changes to logged-in users and admins (Server-Sent Events).
+def Occupancy_Events():
+    return Response(
+        stream_with_context(event_stream()),
+        mimetype = 'text/event-stream',
+        headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/admin/search', methods = ['GET'])
+@role_required('admin')
 # Admin endpoint to search for users.
 def Search_Users():
-    user_id = get_jwt_identity()
-    user = User.query.get(int(user_id))
-    if not user or user.role != 'admin':
-        return jsonify({'msg': 'Admins only'}), 403
-
     result, status = SearchUsers()
 
     return jsonify(result), status
 
+@app.route('/admin/users/autocomplete', methods = ['GET'])
+@role_required('admin')
+# Admin endpoint to suggest users (ids and names only) while typing a search.
+def Autocomplete_Users():
+    prefix = request.args.get('q', '')
+
+    return jsonify(autocomplete_users(prefix)), 200
+
 @app.route('/admin/delete_spot/<int:spot_id>', methods = ['DELETE'])
-@jwt_required()
+@role_required('admin')
 # Admin endpoint to delete a parking spot.
 def Delete_Spot(spot_id):
-    user_id = get_jwt_identity()
-    user = User.query.get(int(user_id))
-    if not user or user.role != 'admin':
-        return jsonify({'msg': 'Admins only'}), 403
     
     result, status = DeleteSpot(spot_id)
 
-    cache.delete('/admin/parking_lots')
+    invalidate_lots()
 
     return jsonify(result), status
 
 @app.route('/admin/spot/<int:spot_no>/<int:lot_id>', methods = ["GET"])
-@jwt_required()
+@role_required('admin')
 # Admin endpoint to get data for a specific parking spot.
 def Get_Spot_Data(spot_no, lot_id):
-    user_id = get_jwt_identity()
-    user = User.query.get(int(user_id))
-    if not user or user.role != 'admin':
-        return jsonify({'msg': 'Admins only'}), 403
     
     result, status = GetSpotData(spot_no, lot_id)
 
     return jsonify(result), status
 
+@app.route('/admin/lot_map/<int:lot_id>', methods = ["GET"])
+@role_required('admin')
+# Admin endpoint to get the spot grid of a lot (?format=rle or bitmap).
+def Get_Lot_Map(lot_id):
+
+    result, status = GetLotMap(lot_id)
+
+    return jsonify(result), status
+
 @app.route('/export_parking_csv', methods = ['POST'])
-@jwt_required()
+@role_required('user')
 # User endpoint to export parking history as CSV (async task).
 def trigger_csv_export():
-    user_id = get_jwt_identity()
-    user = User.query.get(int(user_id))
-    if not user or user.role != 'user':
-        return jsonify({'msg': 'Users only'}), 403
+    user_id = current_user_id()
 
-    export_user_parking_history.delay(user_id)
+    compress = bool((request.get_json(silent = True) or {}).get('gzip'))
+
+    # The worker reads the tables, so queued reservations go in first
+    drain_write_behind(user_id)
+    export_user_parking_history.delay(user_id, compress)
 
     return jsonify({"msg": "Your parking history is being processed. You'll receive an email once ready."}), 202
 
+@app.route('/export_parking_csv/download', methods = ['GET'])
+@role_required('user')
+# User endpoint to download parking history as CSV, streamed as it is generated (?gzip=1 to compress).
+def download_csv_export():
+    user_id = current_user_id()
+    compress = request.args.get('gzip', '').lower() in ('1', 'true')
+    drain_write_behind(user_id)
+
+    return Response(
+        stream_with_context(export_chunks(user_id, compress)),
+        mimetype = export_mimetype(compress),
+        headers = {'Content-Disposition': f'attachment; filename={export_filename(compress)}'}
+    )
+
 @app.after_request
 # Adds CORS headers to every response.
 def after_request(response):
@@ -1,6 +1,10 @@
 # Backend app initialization and configuration
 from flask import Flask
 from .table_models import db
+from .migrations import upgrade_schema
+from .storage import database_url, engine_options, apply_sqlite_pragmas
+from .metrics import init_metrics
+from .write_behind import init_write_behind
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from flask_mail import Mail
@@ -30,32 +34,73 @@ def create_app():
     # Enable CORS for all routes and origins
     CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True, allow_headers=["Authorization", "Content-Type"], expose_headers=["Authorization"])
     
-    # Database configuration
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///../instance/parking.db'
+    # Database configuration (DATABASE_URL switches to e.g. PostgreSQL)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.secret_key = APP_SECRET_KEY
     app.config['JWT_SECRET_KEY'] = JWT_SECRET_KEY
+    # Trust the 'role' claim in access tokens instead of looking the role up per request
+    app.config['JWT_ROLE_CLAIM'] = os.getenv('JWT_ROLE_CLAIM', 'false').lower() == 'true'
 
     # Mail server configuration
-    app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-    app.config['MAIL_PORT'] = 587
-    app.config['MAIL_USE_TLS'] = True
+    app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+    app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
+    app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'true').lower() == 'true'
+    # Messages sent per SMTP connection by tasks/mail_dispatch.py
+    app.config['MAIL_BATCH_SIZE'] = int(os.getenv('MAIL_BATCH_SIZE', 100))
     app.config['MAIL_USERNAME'] = MAIL_USERNAME
     app.config['MAIL_PASSWORD'] = MAIL_PASSWORD
     app.config['MAIL_DEFAULT_SENDER'] = MAIL_DEFAULT_SENDER
 
-    # Redis cache configuration
-    app.config['CACHE_TYPE'] = 'RedisCache'
-    app.config['CACHE_REDIS_URL'] = 'redis://localhost:6379/2'
+    # Emailed history exports: largest attachment (gzipped first, then a link to the
+    # download on API_URL instead)
+    app.config['EXPORT_ATTACHMENT_MAX_BYTES'] = int(os.getenv('EXPORT_ATTACHMENT_MAX_BYTES', 10 * 1024 * 1024))
+    app.config['API_URL'] = os.getenv('API_URL', 'http://127.0.0.1:5000')
+
+    # Redis cache configuration (overridable, e.g. CACHE_TYPE=SimpleCache for local runs)
+    app.config['CACHE_TYPE'] = os.getenv('CACHE_TYPE', 'RedisCache')
+    app.config['CACHE_REDIS_URL'] = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/2')
+
+    # Live occupancy events: 'memory' (single process) or 'redis' (shared by all processes)
+    app.config['EVENT_BROKER'] = os.getenv('EVENT_BROKER', 'memory')
+    app.config['EVENT_REDIS_URL'] = os.getenv('EVENT_REDIS_URL', 'redis://localhost:6379/3')
+
+    # Per-lot occupancy bitmaps: 'memory' (single process) or 'redis' (shared by all processes)
+    app.config['OCCUPANCY_ENGINE'] = os.getenv('OCCUPANCY_ENGINE', 'memory')
+    app.config['OCCUPANCY_REDIS_URL'] = os.getenv('OCCUPANCY_REDIS_URL', 'redis://localhost:6379/4')
+
+    # Instrumentation: /metrics scrape token (admins only if unset), where web
+    # samples are kept ('memory': per process, so run a single web process;
+    # 'redis': shared like the Celery ones), opt-in SQL headers on responses and
+    # cProfile dumps of requests sent with "X-Profile: 1"
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+    app.config['METRICS_STORE'] = os.getenv('METRICS_STORE', 'memory')
+    app.config['METRICS_REDIS_URL'] = os.getenv('METRICS_REDIS_URL', 'redis://localhost:6379/5')
+    app.config['SQL_HEADERS'] = os.getenv('SQL_HEADERS', 'false').lower() == 'true'
+    app.config['PROFILE_REQUESTS'] = os.getenv('PROFILE_REQUESTS', 'false').lower() == 'true'
+    app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR')
+
+    # Write-behind reservations: journaled in memory, applied to the tables in group
+    # commits every WRITE_BEHIND_INTERVAL_MS (single app process only)
+    app.config['WRITE_BEHIND'] = os.getenv('WRITE_BEHIND', 'false').lower() == 'true'
+    app.config['WRITE_BEHIND_JOURNAL'] = os.getenv('WRITE_BEHIND_JOURNAL')
+    app.config['WRITE_BEHIND_INTERVAL_MS'] = int(os.getenv('WRITE_BEHIND_INTERVAL_MS', 5))
+    app.config['WRITE_BEHIND_FSYNC'] = os.getenv('WRITE_BEHIND_FSYNC', 'true').lower() == 'true'
+    app.config['WRITE_BEHIND_MAX_QUEUE'] = int(os.getenv('WRITE_BEHIND_MAX_QUEUE', 100000))
 
     # Initialize extensions with app
     cache.init_app(app)
     mail.init_app(app)
     db.init_app(app)
     jwt.init_app(app)
+    init_metrics(app)
+    init_write_behind(app)
 
-    # Create all database tables
+    # Tune SQLite connections, then create missing tables and bring existing
+    # databases up to date (one process at a time, see upgrade_schema)
     with app.app_context():
-        db.create_all()
+        apply_sqlite_pragmas(db.engine)
+        upgrade_schema(db.engine)
 
     return app
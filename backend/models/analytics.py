@@ -0,0 +1,234 @@
+# Reservation analytics for the admin dashboard. Reservations overlapping a date
+# range are loaded once in columnar form (NumPy arrays of epoch seconds, lot and
+# cost) and occupancy timelines, weekday/hour heatmaps and per-lot figures are
+# computed on the arrays: interval overlap through sorted prefix sums, group-bys
+# through bincount. No per-reservation Python loop runs on the request.
+import calendar
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from sqlalchemy import select, or_, and_
+from backend.models.table_models import db, ParkingLot, ParkingSpot, Reservation
+from backend.models.sql_helpers import epoch_seconds
+
+DEFAULT_RANGE_DAYS = 30
+MAX_RANGE_DAYS = 731
+MAX_TIMELINE_CELLS = 250_000    # lots x buckets in one occupancy timeline
+BUCKET_SECONDS = {'hour': 3600, 'day': 86400}
+DAY = 86400
+
+
+## Parse Range
+# (start, end) epoch seconds of the whole days start..end (inclusive, YYYY-MM-DD)
+# in local time `utc_offset` minutes east of UTC. Defaults to the last 30 days.
+def parse_range(start = None, end = None, utc_offset = 0):
+    try:
+        utc_offset = int(utc_offset or 0)
+    except ValueError:
+        raise ValueError('utc_offset must be a whole number of minutes')
+    if not -14 * 60 <= utc_offset <= 14 * 60:
+        raise ValueError('utc_offset must be within ±840 minutes')
+
+    try:
+        today = (datetime.now(timezone.utc) + timedelta(minutes = utc_offset)).date()
+        end_day = datetime.strptime(end, '%Y-%m-%d').date() if end else today
+        start_day = datetime.strptime(start, '%Y-%m-%d').date() if start else end_day - timedelta(days = DEFAULT_RANGE_DAYS - 1)
+    except ValueError:
+        raise ValueError('start and end must be dates (YYYY-MM-DD)')
+
+    days = (end_day - start_day).days + 1
+    if days < 1:
+        raise ValueError('end must not be before start')
+    if days > MAX_RANGE_DAYS:
+        raise ValueError(f'Date range cannot exceed {MAX_RANGE_DAYS} days')
+
+    start_s = calendar.timegm(start_day.timetuple()) - utc_offset * 60
+    return start_s, start_s + days * DAY
+
+def _utc(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo = None)
+
+## Load Intervals
+# Reservations overlapping [start_s, end_s) as arrays: start / end (epoch
+# seconds; open reservations end now), lot, cost (0 while open) and closed.
+def load_intervals(start_s, end_s, lot_id = None):
+    start, end = _utc(start_s), _utc(end_s)
+    query = (
+        select(epoch_seconds(Reservation.parking_time), epoch_seconds(Reservation.leaving_time), ParkingSpot.lot_id, Reservation.cost)
+        .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+        # Started in the range, or before it and still parked at its start (left after it or
+        # not yet). Each OR branch is an index range, so SQLite unions three index searches.
+        .where(or_(
+            and_(Reservation.parking_time >= start, Reservation.parking_time < end),
+            and_(Reservation.leaving_time > start, Reservation.parking_time < start),
+            and_(Reservation.leaving_time.is_(None), Reservation.parking_time < start)
+        ))
+    )
+    if lot_id is not None:
+        query = query.where(ParkingSpot.lot_id == lot_id)
+
+    # One array per column from plain tuples (NumPy probing Row objects one by one is
+    # several times slower than the query); NULL leaving times and costs become NaN
+    rows = db.session.execute(query).all()
+    starts, leaves, lots, costs = (np.array(column, dtype = np.float64) for column in zip(*rows)) if rows \
+        else (np.empty(0),) * 4
+    closed = ~np.isnan(leaves)
+    now = datetime.now(timezone.utc).timestamp()
+
+    return {
+        'start': starts.astype(np.int64),
+        'end': np.where(closed, leaves, now).astype(np.int64),
+        'lot': lots.astype(np.int64),
+        'cost': np.nan_to_num(costs),
+        'closed': closed,
+    }
+
+# Lots (all, or one) as arrays sorted by id, plus their names
+def load_lots(lot_id = None):
+    query = select(ParkingLot.id, ParkingLot.prime_location, ParkingLot.total_spots).order_by(ParkingLot.id)
+    if lot_id is not None:
+        query = query.where(ParkingLot.id == lot_id)
+    rows = db.session.execute(query).all()
+
+    return {
+        'id': np.array([row.id for row in rows], dtype = np.int64),
+        'name': [row.prime_location for row in rows],
+        'spots': np.array([row.total_spots for row in rows], dtype = np.int64),
+    }
+
+# Row of each reservation's lot in `lots` (reservations of other lots are dropped by the caller)
+def _lot_index(intervals, lots):
+    index = np.searchsorted(lots['id'], intervals['lot'])
+    known = index < len(lots['id'])
+    known[known] = lots['id'][index[known]] == intervals['lot'][known]
+    return index, known
+
+## Occupied Seconds
+# Seconds occupied per group and bucket: a (groups, len(edges) - 1) matrix for
+# intervals [starts, ends) already clipped to [edges[0], edges[-1]].
+# The occupied time up to t is sum(t - start) over starts before t minus the same
+# over ends; with intervals sorted per group on one key axis, both sums come from
+# searchsorted and prefix sums for every (group, edge) at once.
+def occupied_seconds(groups, starts, ends, group_count, edges):
+    span = int(edges[-1] - edges[0]) + 1
+    offsets = groups * span - edges[0]
+    points = (np.arange(group_count, dtype = np.int64)[:, None] * span + (edges - edges[0])[None, :]).ravel()
+    group_first = np.repeat(np.arange(group_count, dtype = np.int64) * span, len(edges))
+
+    def time_before(keys):
+        keys = np.sort(keys)
+        prefix = np.concatenate(([0], np.cumsum(keys)))
+        below = np.searchsorted(keys, points)
+        first = np.searchsorted(keys, group_first)
+        return points * (below - first) - (prefix[below] - prefix[first])
+
+    cumulative = time_before(offsets + starts) - time_before(offsets + ends)
+    return np.diff(cumulative.reshape(group_count, len(edges)), axis = 1)
+
+def _clipped(intervals, start_s, end_s):
+    return np.clip(intervals['start'], start_s, end_s), np.clip(intervals['end'], start_s, end_s)
+
+## Occupancy Timeline
+# Average occupied spots and occupancy rate of each lot per hour or day.
+def occupancy_timeline(start_s, end_s, bucket = 'hour', lot_id = None):
+    if bucket not in BUCKET_SECONDS:
+        raise ValueError(f"bucket must be one of: {', '.join(BUCKET_SECONDS)}")
+
+    lots = load_lots(lot_id)
+    edges = np.arange(start_s, end_s + 1, BUCKET_SECONDS[bucket], dtype = np.int64)
+    if len(lots['id']) * (len(edges) - 1) > MAX_TIMELINE_CELLS:
+        raise ValueError('Range too large for this bucket; use a shorter range, bucket=day or lot_id')
+
+    intervals = load_intervals(start_s, end_s, lot_id)
+    index, known = _lot_index(intervals, lots)
+    starts, ends = _clipped(intervals, start_s, end_s)
+    occupied = occupied_seconds(index[known], starts[known], ends[known], len(lots['id']), edges) / BUCKET_SECONDS[bucket]
+    capacity = np.maximum(lots['spots'], 1)[:, None]
+
+    return {
+        'start': _utc(start_s).isoformat(), 'bucket': bucket, 'bucket_seconds': BUCKET_SECONDS[bucket],
+        'buckets': len(edges) - 1,
+        'lots': [
+            {'lot_id': int(lot), 'lot_name': name, 'total_spots': int(spots),
+             'occupied': occupied_row.tolist(), 'occupancy_rate': rate_row.tolist()}
+            for lot, name, spots, occupied_row, rate_row in zip(
+                lots['id'], lots['name'], lots['spots'], np.round(occupied, 2), np.round(occupied / capacity, 4))
+        ]
+    }
+
+## Occupancy Heatmap
+# Average occupancy rate by weekday (Monday first) and local hour of day over
+# the range, for all lots together or one lot: a 7 x 24 matrix.
+def occupancy_heatmap(start_s, end_s, utc_offset = 0, lot_id = None):
+    lots = load_lots(lot_id)
+    intervals = load_intervals(start_s, end_s, lot_id)
+    _, known = _lot_index(intervals, lots)
+    starts, ends = _clipped(intervals, start_s, end_s)
+
+    edges = np.arange(start_s, end_s + 1, 3600, dtype = np.int64)
+    occupied = occupied_seconds(np.zeros(known.sum(), dtype = np.int64), starts[known], ends[known], 1, edges)[0]
+    rate = occupied / (3600 * max(int(lots['spots'].sum()), 1))
+
+    # Epoch day 0 was a Thursday
+    local = edges[:-1] + int(utc_offset) * 60
+    cell = ((local // DAY + 3) % 7) * 24 + (local // 3600) % 24
+    totals = np.bincount(cell, weights = rate, minlength = 168)
+    counts = np.bincount(cell, minlength = 168)
+    average = np.divide(totals, counts, out = np.zeros(168), where = counts > 0)
+
+    return {
+        'weekdays': ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
+        'hours': list(range(24)),
+        'occupancy_rate': np.round(average.reshape(7, 24), 4).tolist(),
+        'peak': {'weekday': int(average.argmax() // 24), 'hour': int(average.argmax() % 24),
+                 'occupancy_rate': round(float(average.max()), 4)},
+    }
+
+## Lot Report
+# Per lot over the range: bookings made, completed ones with their revenue and
+# average dwell time, turnover (bookings per spot per day) and occupancy rate
+# (occupied spot-time over available spot-time), plus totals for all lots.
+def lot_report(start_s, end_s):
+    lots = load_lots()
+    intervals = load_intervals(start_s, end_s)
+    index, known = _lot_index(intervals, lots)
+    count = len(lots['id'])
+    days = (end_s - start_s) / DAY
+
+    started = known & (intervals['start'] >= start_s) & (intervals['start'] < end_s)
+    completed = started & intervals['closed']
+    dwell = (intervals['end'] - intervals['start']).astype(np.float64)
+    starts, ends = _clipped(intervals, start_s, end_s)
+
+    bookings = np.bincount(index[started], minlength = count)
+    done = np.bincount(index[completed], minlength = count)
+    revenue = np.bincount(index[completed], weights = intervals['cost'][completed], minlength = count)
+    dwell_total = np.bincount(index[completed], weights = dwell[completed], minlength = count)
+    occupied = np.bincount(index[known], weights = (ends - starts)[known], minlength = count)
+
+    spots = lots['spots']
+    avg_dwell = np.divide(dwell_total, done * 60, out = np.full(count, np.nan), where = done > 0)
+    turnover = np.divide(bookings, spots * days, out = np.zeros(count), where = spots > 0)
+    rate = np.divide(occupied, spots * (end_s - start_s), out = np.zeros(count), where = spots > 0)
+
+    def minutes(value):
+        return None if np.isnan(value) else round(float(value), 1)
+
+    total_spots = int(spots.sum())
+    return {
+        'start': _utc(start_s).isoformat(), 'end': _utc(end_s).isoformat(),
+        'lots': [
+            {
+                'lot_id': int(lots['id'][n]), 'lot_name': lots['name'][n], 'total_spots': int(spots[n]),
+                'bookings': int(bookings[n]), 'completed': int(done[n]), 'revenue': round(float(revenue[n]), 2),
+                'avg_dwell_minutes': minutes(avg_dwell[n]), 'turnover_rate': round(float(turnover[n]), 3),
+                'occupancy_rate': round(float(rate[n]), 4)
+            }
+            for n in range(count)
+        ],
+        'totals': {
+            'bookings': int(bookings.sum()), 'completed': int(done.sum()), 'revenue': round(float(revenue.sum()), 2),
+            'avg_dwell_minutes': minutes(dwell_total.sum() / done.sum() / 60 if done.sum() else np.nan),
+            'turnover_rate': round(bookings.sum() / (total_spots * days), 3) if total_spots else 0.0,
+            'occupancy_rate': round(float(occupied.sum()) / (total_spots * (end_s - start_s)), 4) if total_spots else 0.0
+        }
+    }
@@ -35,6 +35,7 @@ def login_user(data):
         return {"msg" : "Invalid credentials"}, 401
 
     # Generate JWT access token
-    access_token = create_access_token(identity=str(user.id))  # Use user ID as string
+    # Role claim lets routes skip the role lookup when JWT_ROLE_CLAIM is enabled
+    access_token = create_access_token(identity=str(user.id), additional_claims={'role': user.role})  # Use user ID as string
 
     return {'access_token': access_token, 'role': user.role, 'user_id': user.id}, 200
\ No newline at end of file
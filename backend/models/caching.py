@@ -0,0 +1,126 @@
+# View caching: per-user cache keys, scoped invalidation and hit/miss counters
+import threading
+import time
+from functools import wraps
+from flask import request, current_app, make_response
+from flask_jwt_extended import get_jwt_identity
+from backend.models import cache
+from backend.models.metrics import inc
+
+# Hit/miss counters per cached view (per process)
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+# Cache namespace a view depends on; 'user' means the logged-in user's own data
+def _namespace(scope, identity):
+    if scope == 'user':
+        return f'user:{identity}'
+    return scope
+
+def _generation_key(namespace):
+    return f'gen:{namespace}'
+
+def _count(prefix, outcome):
+    with _stats_lock:
+        counters = _stats.setdefault(prefix, {'hits': 0, 'misses': 0})
+        counters[outcome] += 1
+    inc('cache_requests_total', {'view': prefix, 'result': 'hit' if outcome == 'hits' else 'miss'})
+
+## Cached View Decorator
+# Caches successful JSON responses per JWT identity and query string. Each entry is
+# tied to the current generation of its scopes ('user', 'lots', 'users'), so bumping
+# a scope's generation invalidates every entry that depends on it.
+# Must be applied below @jwt_required().
+def cached_view(prefix, timeout, scopes=()):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            identity = get_jwt_identity()
+            generation_keys = [_generation_key(_namespace(scope, identity)) for scope in scopes]
+            generations = cache.get_many(*generation_keys) if generation_keys else []
+
+            key = ':'.join([
+                'view', prefix, str(identity),
+                *[str(generation or 0) for generation in generations],
+                request.query_string.decode()
+            ])
+
+            cached = cache.get(key)
+            if cached is not None:
+                _count(prefix, 'hits')
+                data, mimetype = cached
+                return current_app.response_class(data, status=200, mimetype=mimetype)
+
+            _count(prefix, 'misses')
+            response = make_response(view(*args, **kwargs))
+
+            # Only successful responses are cached; errors must be retried
+            if response.status_code == 200:
+                cache.set(key, (response.get_data(), response.mimetype), timeout=timeout)
+
+            return response
+
+        return wrapper
+
+    return decorator
+
+# Starts a new generation for a namespace, orphaning its cached entries
+def _bump(namespace):
+    cache.set(_generation_key(namespace), time.time_ns(), timeout=0)
+
+## Invalidation Helpers
+# Drop cached views of a single user (reservations, summary).
+def invalidate_user(user_id):
+    _bump(f'user:{user_id}')
+
+# Drop cached views built from lot data (lot lists, occupancy, admin summary).
+def invalidate_lots():
+    _bump('lots')
+
+# Drop cached views listing registered users.
+def invalidate_users():
+    _bump('users')
+
+# Make every process drop its cached user roles (backend/models/roles.py).
+def invalidate_roles():
+    _bump('roles')
+
+# Current generation of the cached user roles (None until first bumped).
+def roles_generation():
+    return cache.get(_generation_key('roles'))
+
+## Cache Statistics
+# Hit/miss counters per view for this process, plus key count and memory of the
+# Redis database backing the cache when one is configured.
+def cache_stats():
+    with _stats_lock:
+        views = {prefix: dict(counters) for prefix, counters in _stats.items()}
+
+    hits = sum(counters['hits'] for counters in views.values())
+    misses = sum(counters['misses'] for counters in views.values())
+    for counters in views.values():
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_ratio'] = round(counters['hits'] / lookups, 4) if lookups else None
+
+    result = {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+        'views': views,
+        'backend': None
+    }
+
+    client = getattr(cache.cache, '_read_client', None)
+    if client is not None:
+        try:
+            memory = client.info('memory')
+            result['backend'] = {
+                'keys': client.dbsize(),
+                'used_memory': memory.get('used_memory'),
+                'used_memory_peak': memory.get('used_memory_peak')
+            }
+        except Exception as e:
+            print("Error reading cache backend info:", e)
+
+    return result
@@ -1,4 +1,5 @@
 # Utility to create default admin user if not present
+from sqlalchemy.exc import IntegrityError
 from backend.models.table_models import User, db
 
 def create_admin(app):
@@ -22,9 +23,13 @@ def create_admin(app):
             # Hash and store admin password
             admin.hash_password(admin_password)
 
-            # Add admin to database
-            db.session.add(admin)
-            db.session.commit()
-            print("Admin created")
+            # Add admin to database; another process starting at the same time may have won
+            try:
+                db.session.add(admin)
+                db.session.commit()
+                print("Admin created")
+            except IntegrityError:
+                db.session.rollback()
+                print("Admin already exists")
         else:
             print("Admin already exists")
@@ -0,0 +1,158 @@
+# Nearest-lot lookup: lot coordinates in an SQLite R*Tree kept in sync by
+# triggers, searched with a bounding box that grows until it holds k lots with
+# free spots. Other databases filter the latitude/longitude columns instead.
+import math
+from sqlalchemy import text, inspect
+from backend.models.table_models import db, ParkingLot
+from backend.models.occupancy import free_spot_counts
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32          # length of one degree of latitude
+
+NEARBY_LIMIT = 10
+MAX_NEARBY_LIMIT = 50
+INITIAL_RADIUS_KM = 1.0
+MAX_RADIUS_KM = 50.0
+AVAILABILITY_CHUNK = 50         # lots whose free spots are counted at a time, nearest first
+
+# One point-sized box per lot that has coordinates
+RTREE_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS parking_lot_rtree USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+    """
+    CREATE TRIGGER IF NOT EXISTS parking_lot_rtree_insert AFTER INSERT ON parking_lot
+    WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN
+        INSERT INTO parking_lot_rtree VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS parking_lot_rtree_update AFTER UPDATE OF latitude, longitude ON parking_lot BEGIN
+        DELETE FROM parking_lot_rtree WHERE id = old.id;
+        INSERT INTO parking_lot_rtree
+        SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+        WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS parking_lot_rtree_delete AFTER DELETE ON parking_lot BEGIN
+        DELETE FROM parking_lot_rtree WHERE id = old.id;
+    END
+    """,
+    """
+    INSERT OR REPLACE INTO parking_lot_rtree
+    SELECT id, latitude, latitude, longitude, longitude FROM parking_lot
+    WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    """,
+]
+
+
+# Creates the R*Tree and its triggers on SQLite; a no-op elsewhere
+def create_spatial_index(connection):
+    if connection.dialect.name != 'sqlite':
+        return
+
+    for statement in RTREE_SCHEMA:
+        connection.exec_driver_sql(statement)
+
+# Engines known to have the R*Tree, so the catalog is checked only once
+_indexed_engines = set()
+
+def has_spatial_index():
+    engine = db.engine
+    if engine.url not in _indexed_engines:
+        if engine.dialect.name != 'sqlite' or not inspect(engine).has_table('parking_lot_rtree'):
+            return False
+        _indexed_engines.add(engine.url)
+    return True
+
+## Parse Coordinates
+# Validated (latitude, longitude) floats, or (None, None) if both are missing.
+# Raises ValueError for partial or out-of-range input.
+def parse_coordinates(latitude, longitude):
+    if latitude in (None, '') and longitude in (None, ''):
+        return None, None
+
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        raise ValueError('latitude and longitude must both be numbers')
+
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        raise ValueError('latitude must be within ±90 and longitude within ±180')
+
+    return latitude, longitude
+
+# Great-circle distance in km
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+# (south, north, west, east) of a box containing the circle of `radius_km`.
+# Boxes are not wrapped across the antimeridian.
+def _bounding_box(latitude, longitude, radius_km):
+    dlat = radius_km / KM_PER_DEGREE
+    dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return latitude - dlat, latitude + dlat, longitude - dlng, longitude + dlng
+
+# Lots inside the box, as mappings (availability is added by the caller)
+def _lots_in_box(south, north, west, east):
+    bounds = {'south': south, 'north': north, 'west': west, 'east': east}
+
+    if has_spatial_index():
+        statement = text(
+            """
+            SELECT parking_lot.id, parking_lot.prime_location, parking_lot.address, parking_lot.pincode,
+                   parking_lot.price, parking_lot.total_spots, parking_lot.latitude, parking_lot.longitude
+            FROM parking_lot_rtree
+            JOIN parking_lot ON parking_lot.id = parking_lot_rtree.id
+            WHERE parking_lot_rtree.min_lat >= :south AND parking_lot_rtree.max_lat <= :north
+              AND parking_lot_rtree.min_lng >= :west AND parking_lot_rtree.max_lng <= :east
+            """
+        )
+        return db.session.execute(statement, bounds).mappings().all()
+
+    lots = ParkingLot.query.filter(
+        ParkingLot.latitude.between(south, north),
+        ParkingLot.longitude.between(west, east)
+    ).all()
+    return [
+        {
+            'id': lot.id, 'prime_location': lot.prime_location, 'address': lot.address, 'pincode': lot.pincode,
+            'price': lot.price, 'total_spots': lot.total_spots, 'latitude': lot.latitude, 'longitude': lot.longitude
+        }
+        for lot in lots
+    ]
+
+## Nearest Available Lots
+# Up to `limit` lots with free spots within `max_radius_km`, nearest first, each
+# with distance_km. The search box doubles from INITIAL_RADIUS_KM until the k-th
+# nearest candidate lies inside the searched circle, so only nearby lots are read.
+# Free spots are counted like the lot listings (free_spot_counts), nearest lot
+# first and only until `limit` lots with free spots are found.
+def nearest_available_lots(latitude, longitude, limit=NEARBY_LIMIT, max_radius_km=MAX_RADIUS_KM):
+    radius = min(INITIAL_RADIUS_KM, max_radius_km)
+    free = {}   # free spots of the lots counted so far, kept as the circle grows
+
+    while True:
+        in_circle = []
+        for lot in _lots_in_box(*_bounding_box(latitude, longitude, radius)):
+            distance = haversine_km(latitude, longitude, lot['latitude'], lot['longitude'])
+            if distance <= radius:
+                in_circle.append({**lot, 'distance_km': round(distance, 3)})
+        in_circle.sort(key = lambda lot: (lot['distance_km'], lot['id']))
+
+        candidates = []
+        for start in range(0, len(in_circle), AVAILABILITY_CHUNK):
+            chunk = in_circle[start:start + AVAILABILITY_CHUNK]
+            uncounted = [lot['id'] for lot in chunk if lot['id'] not in free]
+            if uncounted:
+                free.update(free_spot_counts(uncounted))
+            candidates.extend({**lot, 'available_spots': free[lot['id']]} for lot in chunk if free[lot['id']] > 0)
+            if len(candidates) >= limit:
+                break
+
+        # Lots outside the circle but inside the box may not be the nearest yet
+        if len(candidates) >= limit or radius >= max_radius_km:
+            return candidates[:limit]
+
+        radius = min(radius * 2, max_radius_km)
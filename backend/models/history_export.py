@@ -0,0 +1,113 @@
+# Parking history CSV export: rows stream from the database in batches and are
+# encoded chunk by chunk, so memory stays bounded however long the history is
+import csv
+import io
+import zlib
+from tempfile import SpooledTemporaryFile
+from sqlalchemy import select
+from backend.models.table_models import db, ParkingLot, ParkingSpot, Reservation
+
+EXPORT_BATCH_SIZE = 1000                # rows fetched per round trip and written per chunk
+EXPORT_SPOOL_SIZE = 4 * 1024 * 1024     # bytes kept in memory before the spool moves to a temp file
+EXPORT_ATTACHMENT_LIMIT = 10 * 1024 * 1024  # largest export emailed as an attachment
+
+HEADER = [
+    'Slot ID', 'Spot ID', 'Parking Time', 'Checkout Time',
+    'Duration (mins)', 'Cost (Rs)', 'Lot Name'
+]
+
+
+# File name and content type of an export
+def export_filename(compress=False):
+    return 'parking_history.csv.gz' if compress else 'parking_history.csv'
+
+def export_mimetype(compress=False):
+    return 'application/gzip' if compress else 'text/csv'
+
+## History Rows
+# A user's reservations newest first as CSV fields. yield_per keeps only one batch
+# of rows in memory; lot names come from the same query instead of per-row lookups.
+def history_rows(user_id, batch_size=EXPORT_BATCH_SIZE):
+    query = (
+        select(
+            Reservation.id, Reservation.spot_id, Reservation.parking_time,
+            Reservation.leaving_time, Reservation.cost, ParkingLot.prime_location
+        )
+        .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+        .join(ParkingLot, ParkingLot.id == ParkingSpot.lot_id)
+        .where(Reservation.user_id == user_id)
+        .order_by(Reservation.parking_time.desc())
+        .execution_options(yield_per = batch_size)
+    )
+
+    for reservation_id, spot_id, parking_time, leaving_time, cost, lot_name in db.session.execute(query):
+        yield [
+            reservation_id,
+            spot_id,
+            parking_time.strftime('%Y-%m-%d %H:%M'),
+            leaving_time.strftime('%Y-%m-%d %H:%M') if leaving_time else '-',
+            (leaving_time - parking_time).total_seconds() // 60 if leaving_time else '-',
+            cost,
+            lot_name
+        ]
+
+## Export Chunks
+# The CSV (optionally gzip-compressed) as a stream of byte chunks, header first.
+def export_chunks(user_id, compress=False, batch_size=EXPORT_BATCH_SIZE):
+    # wbits 31 writes a gzip container, so the output is a regular .gz file
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HEADER)
+
+    def drain():
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    for count, row in enumerate(history_rows(user_id, batch_size), 1):
+        writer.writerow(row)
+        if count % batch_size == 0:
+            chunk = drain()
+            if chunk:
+                yield chunk
+
+    chunk = drain()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+
+## Spooled Export
+# Writes the export into a SpooledTemporaryFile, which stays in memory up to
+# EXPORT_SPOOL_SIZE bytes and then moves to disk. Returned rewound; caller closes it.
+def spooled_export(user_id, compress=False):
+    spool = SpooledTemporaryFile(max_size = EXPORT_SPOOL_SIZE)
+    for chunk in export_chunks(user_id, compress):
+        spool.write(chunk)
+
+    spool.seek(0)
+    return spool
+
+## Attachment Export
+# The export to attach to an email, as (spool, compressed), spooled like
+# spooled_export. A plain CSV larger than `max_bytes` is exported again gzipped;
+# if even that is larger the spool is None and the email should link to the
+# streamed download instead, so no more than `max_bytes` is ever read into memory.
+def attachment_export(user_id, compress=False, max_bytes=EXPORT_ATTACHMENT_LIMIT):
+    for compressed in ((True,) if compress else (False, True)):
+        spool = spooled_export(user_id, compressed)
+        size = spool.seek(0, 2)
+        if size <= max_bytes:
+            spool.seek(0)
+            return spool, compressed
+        spool.close()
+
+    return None, True
+
+# Whether the user has any reservation to export
+def has_history(user_id):
+    return db.session.execute(
+        select(Reservation.id).where(Reservation.user_id == user_id).limit(1)
+    ).first() is not None
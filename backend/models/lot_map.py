@@ -0,0 +1,60 @@
+# Lot map: the status of every spot in a lot, indexed by spot number, encoded
+# compactly (run-length string or bitmaps) instead of one JSON object per spot
+import base64
+from itertools import groupby
+from sqlalchemy import select
+from backend.models.table_models import db, ParkingSpot
+
+MISSING = '-'                   # spot number with no spot (deleted)
+MAP_FORMATS = ('rle', 'bitmap')
+
+
+## Spot Statuses
+# One character per spot number from 1 to the highest in the lot: 'A', 'O' or
+# MISSING. Reads (spot_no, status) tuples in index order, no ORM objects.
+def spot_statuses(lot_id):
+    rows = db.session.execute(
+        select(ParkingSpot.spot_no, ParkingSpot.status)
+        .where(ParkingSpot.lot_id == lot_id)
+        .order_by(ParkingSpot.spot_no)
+    ).all()
+
+    if not rows:
+        return ''
+
+    statuses = [MISSING] * rows[-1].spot_no
+    for spot_no, status in rows:
+        statuses[spot_no - 1] = status
+    return ''.join(statuses)
+
+# '3A2O1-' for 'AAAOO-'
+def encode_rle(statuses):
+    return ''.join(f'{len(list(run))}{status}' for status, run in groupby(statuses))
+
+# Base64 bitmap with bit n (most significant bit first) set where statuses[n] == `status`
+def encode_bitmap(statuses, status):
+    bits = bytearray((len(statuses) + 7) // 8)
+    for index, value in enumerate(statuses):
+        if value == status:
+            bits[index >> 3] |= 0x80 >> (index & 7)
+    return base64.b64encode(bytes(bits)).decode('ascii')
+
+## Lot Map
+# Spot grid of a lot in the requested format:
+#   rle:    {'spot_count', 'rle'}
+#   bitmap: {'spot_count', 'occupied', 'missing'}
+# Raises ValueError for an unknown format.
+def lot_map(lot_id, format = 'rle'):
+    if format not in MAP_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(MAP_FORMATS)}")
+
+    statuses = spot_statuses(lot_id)
+    result = {'lot_id': lot_id, 'spot_count': len(statuses), 'format': format}
+
+    if format == 'rle':
+        result['rle'] = encode_rle(statuses)
+    else:
+        result['occupied'] = encode_bitmap(statuses, 'O')
+        result['missing'] = encode_bitmap(statuses, MISSING)
+
+    return result
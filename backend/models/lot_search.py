@@ -0,0 +1,127 @@
+# Lot search: an SQLite FTS5 index over location, address and pincode, kept in
+# sync with parking_lot by triggers. Other databases fall back to ILIKE filters.
+import re
+from sqlalchemy import text, or_, inspect
+from backend.models.table_models import db, ParkingLot
+from backend.models.occupancy import with_availability
+
+SEARCH_LIMIT = 50
+
+# bm25 column weights: a hit in the location name outranks the address, then pincode
+FTS_WEIGHTS = (10.0, 4.0, 2.0)
+
+# External-content FTS5 table (stores only the index, reads text from parking_lot)
+# with prefix indexes so "cen" and "5600" match without scanning the vocabulary
+FTS_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS parking_lot_fts USING fts5(
+        prime_location, address, pincode,
+        content = 'parking_lot', content_rowid = 'id',
+        prefix = '1 2 3 4', tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS parking_lot_fts_insert AFTER INSERT ON parking_lot BEGIN
+        INSERT INTO parking_lot_fts (rowid, prime_location, address, pincode)
+        VALUES (new.id, new.prime_location, new.address, new.pincode);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS parking_lot_fts_delete AFTER DELETE ON parking_lot BEGIN
+        INSERT INTO parking_lot_fts (parking_lot_fts, rowid, prime_location, address, pincode)
+        VALUES ('delete', old.id, old.prime_location, old.address, old.pincode);
+    END
+    """,
+    # Counter updates on every reserve/release leave the index alone
+    """
+    CREATE TRIGGER IF NOT EXISTS parking_lot_fts_update
+    AFTER UPDATE OF prime_location, address, pincode ON parking_lot BEGIN
+        INSERT INTO parking_lot_fts (parking_lot_fts, rowid, prime_location, address, pincode)
+        VALUES ('delete', old.id, old.prime_location, old.address, old.pincode);
+        INSERT INTO parking_lot_fts (rowid, prime_location, address, pincode)
+        VALUES (new.id, new.prime_location, new.address, new.pincode);
+    END
+    """,
+    # Index lots that existed before the table was created
+    "INSERT INTO parking_lot_fts (parking_lot_fts) VALUES ('rebuild')",
+]
+
+
+# Creates the FTS table and its triggers on SQLite; a no-op elsewhere
+def create_search_index(connection):
+    if connection.dialect.name != 'sqlite':
+        return
+
+    for statement in FTS_SCHEMA:
+        connection.exec_driver_sql(statement)
+
+# Engines known to have the FTS index, so the catalog is checked only once
+_indexed_engines = set()
+
+# Whether the FTS index exists in the current database
+def has_search_index():
+    engine = db.engine
+    if engine.url not in _indexed_engines:
+        if engine.dialect.name != 'sqlite' or not inspect(engine).has_table('parking_lot_fts'):
+            return False
+        _indexed_engines.add(engine.url)
+    return True
+
+# User input as an FTS5 query: every word must match as a prefix, e.g. "mg ro" -> "mg"* "ro"*
+def match_query(search_query):
+    words = re.findall(r'\w+', search_query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+## Search Lots
+# Lots matching `search_query`, best match first, with their availability (as
+# the lot listings count it).
+def search_lots(search_query, limit=SEARCH_LIMIT):
+    if not has_search_index():
+        return with_availability(_search_lots_like(search_query, limit))
+
+    match = match_query(search_query)
+    if not match:
+        return []
+
+    rows = db.session.execute(
+        text(
+            """
+            SELECT parking_lot.id, parking_lot.prime_location, parking_lot.address, parking_lot.pincode,
+                   parking_lot.price, parking_lot.total_spots
+            FROM parking_lot_fts
+            JOIN parking_lot ON parking_lot.id = parking_lot_fts.rowid
+            WHERE parking_lot_fts MATCH :match
+            ORDER BY bm25(parking_lot_fts, :w_location, :w_address, :w_pincode), parking_lot.id
+            LIMIT :limit
+            """
+        ),
+        {
+            'match': match, 'limit': limit,
+            'w_location': FTS_WEIGHTS[0], 'w_address': FTS_WEIGHTS[1], 'w_pincode': FTS_WEIGHTS[2]
+        }
+    ).mappings().all()
+
+    return with_availability([dict(row) for row in rows])
+
+# Substring match without an index, for databases without FTS5
+def _search_lots_like(search_query, limit):
+    pattern = f'%{search_query}%'
+    lots = (
+        ParkingLot.query
+        .filter(or_(
+            ParkingLot.prime_location.ilike(pattern),
+            ParkingLot.address.ilike(pattern),
+            ParkingLot.pincode.ilike(pattern)
+        ))
+        .order_by(ParkingLot.id)
+        .limit(limit)
+        .all()
+    )
+
+    return [
+        {
+            'id': lot.id, 'prime_location': lot.prime_location, 'address': lot.address, 'pincode': lot.pincode,
+            'price': lot.price, 'total_spots': lot.total_spots
+        }
+        for lot in lots
+    ]
@@ -0,0 +1,301 @@
+# Instrumentation: per-route latency, SQL statement counts and time (SQLAlchemy
+# engine events), cached view hits and Celery task timings, rendered in the
+# Prometheus text format on /metrics. Samples are kept per process; Celery worker
+# processes, and web processes with METRICS_STORE=redis, add theirs to a Redis
+# hash that /metrics merges in. A request can also be profiled with cProfile
+# when PROFILE_REQUESTS is on.
+import atexit
+import cProfile
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from flask import g, request, current_app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+REMOTE_FLUSH_SECONDS = 1.0      # how often a web process adds its samples to the shared hash
+PROFILE_HEADER = 'X-Profile'
+
+# Metric families: name -> (type, help)
+FAMILIES = {
+    'http_requests_total': ('counter', 'HTTP requests by route, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency by route.'),
+    'http_request_sql_statements': ('histogram', 'SQL statements issued per HTTP request by route.'),
+    'sql_statements_total': ('counter', 'SQL statements executed, by operation.'),
+    'sql_statement_seconds_total': ('counter', 'Time spent executing SQL statements, by operation.'),
+    'cache_requests_total': ('counter', 'Cached view lookups by view and result.'),
+    'celery_tasks_total': ('counter', 'Celery tasks run, by task and final state.'),
+    'celery_task_duration_seconds': ('histogram', 'Celery task run time by task.'),
+    'celery_task_sql_statements': ('histogram', 'SQL statements issued per Celery task run.'),
+    'write_behind_dead_letters_total': ('counter', 'Write-behind entries that could not be applied, by operation.'),
+    'write_behind_rejected_total': ('counter', 'Reserves and releases refused while the write-behind queue was full.'),
+}
+
+# Series ('name{labels}' -> value) of this process
+_samples = {}
+_lock = threading.Lock()
+
+# Statement count and time of the request or task running in this context
+_work = ContextVar('metrics_work', default = None)
+
+
+def _series(name, labels):
+    if not labels:
+        return name
+    escaped = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels.items()
+    )
+    return f'{name}{{{escaped}}}'
+
+def inc(name, labels = None, value = 1):
+    key = _series(name, labels)
+    with _lock:
+        _samples[key] = _samples.get(key, 0) + value
+
+# Records one observation in a cumulative histogram
+def observe(name, labels, value, buckets):
+    labels = labels or {}
+    with _lock:
+        for bound in (*buckets, '+Inf'):
+            if bound == '+Inf' or value <= bound:
+                key = _series(f'{name}_bucket', {**labels, 'le': bound})
+                _samples[key] = _samples.get(key, 0) + 1
+            else:
+                _samples.setdefault(_series(f'{name}_bucket', {**labels, 'le': bound}), 0)
+        for suffix, amount in (('_sum', value), ('_count', 1)):
+            key = _series(name + suffix, labels)
+            _samples[key] = _samples.get(key, 0) + amount
+
+def samples():
+    with _lock:
+        return dict(_samples)
+
+# ---- Units of work: SQL statements are counted per request / task ----
+
+def begin_work():
+    return _work.set({'statements': 0, 'sql_seconds': 0.0})
+
+def current_work():
+    return _work.get()
+
+def end_work(token):
+    work = _work.get()
+    _work.reset(token)
+    return work
+
+_OPERATION = re.compile(r'\s*(\w+)')
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['metrics_started'].pop()
+    match = _OPERATION.match(statement)
+    operation = match.group(1).upper() if match else 'OTHER'
+
+    inc('sql_statements_total', {'operation': operation})
+    inc('sql_statement_seconds_total', {'operation': operation}, elapsed)
+
+    work = _work.get()
+    if work is not None:
+        work['statements'] += 1
+        work['sql_seconds'] += elapsed
+
+# A failed statement never reaches after_cursor_execute
+@event.listens_for(Engine, 'handle_error')
+def _execute_failed(context):
+    if context.connection is not None and context.connection.info.get('metrics_started'):
+        context.connection.info['metrics_started'].pop()
+
+## Flask Instrumentation
+# Times every request and counts its SQL statements by route template. With
+# SQL_HEADERS on, responses carry X-SQL-Statements / X-SQL-Time-ms (off by
+# default: they expose each route's query work). Streamed responses (e.g. the
+# CSV download) run their queries after the headers are sent, so they get no
+# SQL headers and their latency and statement histograms stop at the first
+# byte. With PROFILE_REQUESTS on, a
+# request sent with "X-Profile: 1" is run under cProfile and dumped to
+# PROFILE_DIR; the file name is returned in X-Profile-File (open it with pstats
+# or snakeviz). With METRICS_STORE=redis the samples are added to the shared
+# hash at most every REMOTE_FLUSH_SECONDS, so /metrics on any web process
+# reports all of them.
+def init_metrics(app):
+    if app.config.get('METRICS_STORE') == 'redis':
+        enable_remote(app.config['METRICS_REDIS_URL'])
+        atexit.register(flush_remote)
+
+    @app.before_request
+    def _start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        g.metrics_token = begin_work()
+        g.profiler = None
+
+        if app.config.get('PROFILE_REQUESTS') and request.headers.get(PROFILE_HEADER) == '1':
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                g.profiler = profiler
+            except ValueError as e:
+                # Only one profiler can be active at a time on some Python versions
+                print("Profiling skipped:", e)
+
+    @app.after_request
+    def _record_request_metrics(response):
+        if 'metrics_token' not in g:
+            return response
+
+        elapsed = time.perf_counter() - g.metrics_started
+        work = current_work()
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+
+        inc('http_requests_total', {'route': route, 'method': request.method, 'status': response.status_code})
+        observe('http_request_duration_seconds', {'route': route, 'method': request.method}, elapsed, LATENCY_BUCKETS)
+        observe('http_request_sql_statements', {'route': route, 'method': request.method}, work['statements'], STATEMENT_BUCKETS)
+
+        if app.config.get('SQL_HEADERS') and not response.is_streamed:
+            response.headers['X-SQL-Statements'] = str(work['statements'])
+            response.headers['X-SQL-Time-ms'] = f"{work['sql_seconds'] * 1000:.2f}"
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            response.headers['X-Profile-File'] = _dump_profile(profiler, route)
+
+        return response
+
+    # Teardown runs even when after_request did not (an exception in another
+    # hook), so the context never keeps counting into a finished request
+    @app.teardown_request
+    def _end_request_metrics(exception = None):
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            end_work(token)
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+
+        if _remote['client'] is not None:
+            flush_remote(REMOTE_FLUSH_SECONDS)
+
+# Writes the profile to PROFILE_DIR and returns its file name
+def _dump_profile(profiler, route):
+    directory = current_app.config.get('PROFILE_DIR') or os.path.join(current_app.instance_path, 'profiles')
+    os.makedirs(directory, exist_ok = True)
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', f'{request.method}{route}').strip('_')
+    filename = f'{time.strftime("%Y%m%d-%H%M%S")}-{int(time.time() * 1000) % 1000:03d}-{slug}.prof'
+    profiler.dump_stats(os.path.join(directory, filename))
+    return filename
+
+## Celery Instrumentation
+# Called from the task_prerun / task_postrun signals in celery_app.py.
+_running_tasks = {}
+
+def task_started(task_id):
+    _running_tasks[task_id] = (time.perf_counter(), begin_work())
+
+def task_finished(task_id, task_name, state):
+    started = _running_tasks.pop(task_id, None)
+    if started is None:
+        return
+
+    began, token = started
+    work = end_work(token)
+    inc('celery_tasks_total', {'task': task_name, 'state': state or 'UNKNOWN'})
+    observe('celery_task_duration_seconds', {'task': task_name}, time.perf_counter() - began, LATENCY_BUCKETS)
+    observe('celery_task_sql_statements', {'task': task_name}, work['statements'], STATEMENT_BUCKETS)
+
+    if _remote['client'] is not None:
+        flush_remote()
+
+# ---- Samples shared through Redis (Celery workers, web processes -> /metrics) ----
+
+REMOTE_HASH = 'metrics:samples'
+_remote = {'client': None, 'flushed': {}, 'flushed_at': 0.0}
+_flush_lock = threading.Lock()
+
+# A forked child (gunicorn or Celery worker) inherits its parent's samples; they
+# count as flushed so every child does not add them to the hash again
+os.register_at_fork(after_in_child = lambda: _remote.update(flushed = samples()))
+
+# Makes this process add its samples to the shared hash (after every task in
+# Celery workers, every REMOTE_FLUSH_SECONDS in web processes)
+def enable_remote(url):
+    import redis
+    _remote['client'] = redis.Redis.from_url(url)
+
+# Adds what changed since the last flush to the shared hash, unless the last
+# flush was less than `min_interval` seconds ago
+def flush_remote(min_interval = 0):
+    with _flush_lock:
+        if time.monotonic() - _remote['flushed_at'] < min_interval:
+            return
+        _remote['flushed_at'] = time.monotonic()
+
+        current = samples()
+        flushed = _remote['flushed']
+        pipe = _remote['client'].pipeline(transaction = False)
+        for key, value in current.items():
+            delta = value - flushed.get(key, 0)
+            if delta:
+                pipe.hincrbyfloat(REMOTE_HASH, key, delta)
+        try:
+            pipe.execute()
+            _remote['flushed'] = current
+        except Exception as e:
+            print("Error flushing metrics:", e)
+
+def remote_samples(url):
+    try:
+        import redis
+        raw = redis.Redis.from_url(url, socket_timeout = 1).hgetall(REMOTE_HASH)
+    except Exception as e:
+        print("Error reading shared metrics:", e)
+        return {}
+    return {key.decode(): float(value) for key, value in raw.items()}
+
+def _family(key):
+    name = key.split('{', 1)[0]
+    if name in FAMILIES:
+        return name
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in FAMILIES:
+            return name[:-len(suffix)]
+    return None
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+## Render Metrics
+# Prometheus text exposition of this process's samples plus `extra` (the shared
+# hash); series present in both are added up. What this process already flushed
+# to the hash is in `extra`, so only its changes since are added.
+def render_metrics(extra = None):
+    with _flush_lock:
+        flushed = _remote['flushed']
+        merged = {key: value - flushed.get(key, 0) for key, value in samples().items()}
+    for key, value in (extra or {}).items():
+        merged[key] = merged.get(key, 0) + value
+
+    by_family = {}
+    for key, value in merged.items():
+        family = _family(key)
+        if family:
+            by_family.setdefault(family, []).append((key, value))
+
+    lines = []
+    for family, (kind, description) in FAMILIES.items():
+        if family not in by_family:
+            continue
+        lines.append(f'# HELP {family} {description}')
+        lines.append(f'# TYPE {family} {kind}')
+        lines.extend(f'{key} {_format_value(value)}' for key, value in by_family[family])
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,170 @@
+# Schema migrations for existing databases. Creating the model tables only
+# creates missing ones, so indexes and columns added to existing tables are
+# applied here, once per database, in order.
+import logging
+import time
+from datetime import datetime
+from sqlalchemy import select, insert, inspect, text
+from sqlalchemy.exc import OperationalError
+from backend.models.table_models import db
+from backend.models.lot_search import create_search_index
+from backend.models.user_search import create_user_search_index
+from backend.models.geo import create_spatial_index
+from backend.models.rollups import rebuild_rollups
+
+# Records which migrations a database has already applied
+schema_migration = db.Table(
+    'schema_migration',
+    db.Column('name', db.String(100), primary_key = True),
+    db.Column('applied_at', db.DateTime, nullable = False)
+)
+
+# Ordered (name, function) pairs; functions receive a connection inside a transaction
+MIGRATIONS = []
+
+# PostgreSQL advisory lock key held while migrating (any constant shared by all processes)
+ADVISORY_LOCK_KEY = 0x5041524B      # 'PARK'
+# How long a process waits for another one's migrations before giving up
+LOCK_TIMEOUT_SECONDS = 600
+
+log = logging.getLogger(__name__)
+
+
+# Registers a migration step under a unique, never-renamed name
+def migration(name):
+    def register(fn):
+        MIGRATIONS.append((name, fn))
+        return fn
+    return register
+
+# Creates the named model indexes unless they already exist
+def _create_indexes(connection, *names):
+    indexes = {index.name: index for table in db.metadata.tables.values() for index in table.indexes}
+    for name in names:
+        indexes[name].create(connection, checkfirst = True)
+
+# Adds the named model columns to an existing table unless they are already there
+def _add_columns(connection, table_name, *names):
+    table = db.metadata.tables[table_name]
+    existing = {column['name'] for column in inspect(connection).get_columns(table_name)}
+    for name in names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        column_type = column.type.compile(dialect = connection.dialect)
+        connection.exec_driver_sql(f'ALTER TABLE {table_name} ADD COLUMN {name} {column_type}')
+
+@migration('0001_hot_path_indexes')
+def _hot_path_indexes(connection):
+    _create_indexes(
+        connection,
+        'ix_parking_spot_lot_status',
+        'ix_reservation_user_parking_time',
+        'ix_reservation_spot_parking_time',
+        'ix_reservation_parking_time',
+        'ix_parking_lot_created_at'
+    )
+
+@migration('0002_revenue_covering_index')
+def _revenue_covering_index(connection):
+    _create_indexes(connection, 'ix_reservation_spot_revenue')
+
+@migration('0003_lot_search_index')
+def _lot_search_index(connection):
+    create_search_index(connection)
+
+@migration('0004_user_search_index')
+def _user_search_index(connection):
+    create_user_search_index(connection)
+
+@migration('0005_lot_coordinates')
+def _lot_coordinates(connection):
+    _add_columns(connection, 'parking_lot', 'latitude', 'longitude')
+    _create_indexes(connection, 'ix_parking_lot_lat_lng')
+    create_spatial_index(connection)
+
+@migration('0006_spot_numbers')
+def _spot_numbers(connection):
+    _add_columns(connection, 'parking_spot', 'spot_no')
+    # Existing spots are numbered in id order, which is how the admin grid showed them
+    connection.execute(text(
+        """
+        UPDATE parking_spot SET spot_no = numbered.spot_no
+        FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY lot_id ORDER BY id) AS spot_no FROM parking_spot) AS numbered
+        WHERE parking_spot.id = numbered.id AND parking_spot.spot_no IS NULL
+        """
+    ))
+    _create_indexes(connection, 'uq_parking_spot_lot_spot_no')
+
+@migration('0007_reservation_leaving_time_index')
+def _reservation_leaving_time_index(connection):
+    _create_indexes(connection, 'ix_reservation_leaving_time')
+
+@migration('0008_daily_rollups')
+def _daily_rollups(connection):
+    # Tables come from db.create_all(); existing reservations are backfilled once
+    _create_indexes(connection, 'ix_daily_user_stats_user_day')
+    rebuild_rollups(connection)
+
+@migration('0009_user_search_postgresql')
+def _user_search_postgresql(connection):
+    # 0004 created only the SQLite index; PostgreSQL databases get theirs here
+    if connection.dialect.name == 'postgresql':
+        create_user_search_index(connection)
+
+# Takes the database-wide write lock for the rest of the transaction, so
+# processes starting together migrate one after the other. SQLite's BEGIN
+# IMMEDIATE waits busy_timeout per attempt; a long migration in another process
+# (e.g. the rollup backfill) is waited for up to LOCK_TIMEOUT_SECONDS.
+def _lock_schema(connection):
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': ADVISORY_LOCK_KEY})
+        return
+    if connection.dialect.name != 'sqlite':
+        return
+
+    deadline = time.monotonic() + LOCK_TIMEOUT_SECONDS
+    while True:
+        try:
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+            return
+        except OperationalError as e:
+            if 'locked' not in str(e) or time.monotonic() > deadline:
+                raise
+            log.info("Waiting for another process to finish migrating")
+
+# Names of the migrations the database has applied
+def _applied(connection):
+    if not inspect(connection).has_table(schema_migration.name):
+        return set()
+    return set(connection.execute(select(schema_migration.c.name)).scalars())
+
+## Upgrade Schema
+# Creates missing model tables and applies every pending migration to the
+# database bound to `engine`. An up-to-date database is left without taking a
+# lock; otherwise the schema lock is held for the whole upgrade and the tables
+# and migrations are checked again once it is held, since another process may
+# have migrated in the meantime.
+# Returns the names of the migrations applied in this call.
+def upgrade_schema(engine):
+    with engine.connect() as connection:
+        tables = set(inspect(connection).get_table_names())
+        if set(db.metadata.tables) <= tables and _applied(connection) >= {name for name, _ in MIGRATIONS}:
+            return []
+
+    applied_now = []
+    with engine.begin() as connection:
+        _lock_schema(connection)
+        db.metadata.create_all(connection)
+        applied = _applied(connection)
+
+        for name, fn in MIGRATIONS:
+            if name in applied:
+                continue
+
+            fn(connection)
+            connection.execute(insert(schema_migration).values(name = name, applied_at = datetime.utcnow()))
+            applied_now.append(name)
+            log.info("Applied migration %s", name)
+
+    return applied_now
@@ -0,0 +1,122 @@
+# Lot occupancy service: spot statistics for every lot from the spot rows or the
+# occupancy bitmaps, and a consistency check of the lot counters against the spot rows
+from flask import current_app
+from sqlalchemy import select, func, case
+from backend.models.table_models import db, ParkingLot, ParkingSpot
+from backend.models.occupancy_bitmap import get_occupancy
+
+
+# Subquery counting total and available spot rows per lot (optionally only some lots)
+def _spot_counts(lot_ids=None):
+    query = db.session.query(
+        ParkingSpot.lot_id.label('lot_id'),
+        func.count(ParkingSpot.id).label('spot_rows'),
+        func.sum(case((ParkingSpot.status == 'A', 1), else_=0)).label('free_rows')
+    )
+
+    if lot_ids is not None:
+        query = query.filter(ParkingSpot.lot_id.in_(lot_ids))
+
+    return query.group_by(ParkingSpot.lot_id).subquery()
+
+## Lots With Occupancy
+# Returns (lot, available_spots, occupied_spots) for every lot (or the given
+# ones). Free spots are counted on the occupancy bitmaps where those are
+# authoritative: in Redis (shared by every process) or with write-behind (one
+# process, queued reservations are on the bitmaps only). Otherwise each process
+# only sees its own releases, so the spot rows are counted in one grouped query.
+def lots_with_occupancy(lot_ids=None):
+    if not _bitmaps_authoritative():
+        counts = _spot_counts(lot_ids)
+        query = (
+            db.session.query(ParkingLot, func.coalesce(counts.c.free_rows, 0))
+            .outerjoin(counts, counts.c.lot_id == ParkingLot.id)
+            .order_by(ParkingLot.id)
+        )
+        if lot_ids is not None:
+            query = query.filter(ParkingLot.id.in_(lot_ids))
+
+        return [
+            (lot, available, lot.total_spots - available)
+            for lot, available in query.all()
+        ]
+
+    query = ParkingLot.query.order_by(ParkingLot.id)
+
+    if lot_ids is not None:
+        query = query.filter(ParkingLot.id.in_(lot_ids))
+
+    lots = query.all()
+    free = get_occupancy().free_counts([lot.id for lot in lots])
+
+    return [
+        (lot, free[lot.id], lot.total_spots - free[lot.id])
+        for lot in lots
+    ]
+
+def _bitmaps_authoritative():
+    return current_app.config.get('OCCUPANCY_ENGINE') == 'redis' or bool(current_app.config.get('WRITE_BEHIND'))
+
+## Free Spot Counts
+# {lot_id: free spots} for the given lots, from the same source as
+# lots_with_occupancy but without loading the lots themselves.
+def free_spot_counts(lot_ids):
+    if _bitmaps_authoritative():
+        return get_occupancy().free_counts(lot_ids)
+
+    # Answered from the (lot_id, status) index
+    free = dict(db.session.execute(
+        select(ParkingSpot.lot_id, func.count())
+        .where(ParkingSpot.lot_id.in_(lot_ids), ParkingSpot.status == 'A')
+        .group_by(ParkingSpot.lot_id)
+    ).all())
+    return {lot_id: free.get(lot_id, 0) for lot_id in lot_ids}
+
+## With Availability
+# Lot rows (mappings with an 'id') with available_spots from free_spot_counts,
+# so search and nearby results agree with the lot listings instead of reading
+# the ParkingLot counter. The order is kept.
+def with_availability(rows):
+    if not rows:
+        return []
+
+    free = free_spot_counts([row['id'] for row in rows])
+    return [{**row, 'available_spots': free[row['id']]} for row in rows]
+
+## Occupancy Consistency Check
+# Compares the counters stored on ParkingLot with the actual ParkingSpot rows.
+# With repair=True the counters are rewritten from the spot rows.
+def check_occupancy_consistency(repair=False):
+    counts = _spot_counts()
+    rows = (
+        db.session.query(
+            ParkingLot,
+            func.coalesce(counts.c.spot_rows, 0),
+            func.coalesce(counts.c.free_rows, 0)
+        )
+        .outerjoin(counts, counts.c.lot_id == ParkingLot.id)
+        .order_by(ParkingLot.id)
+        .all()
+    )
+
+    mismatches = []
+    for lot, spot_rows, free_rows in rows:
+        if lot.total_spots == spot_rows and lot.available_spots == free_rows:
+            continue
+
+        mismatches.append({
+            'lot_id': lot.id,
+            'total_spots': lot.total_spots,
+            'spot_rows': spot_rows,
+            'available_spots': lot.available_spots,
+            'free_rows': free_rows
+        })
+
+        if repair:
+            lot.total_spots = spot_rows
+            lot.available_spots = free_rows
+
+    if repair and mismatches:
+        db.session.commit()
+
+    return mismatches
@@ -0,0 +1,305 @@
+# Occupancy bitmaps: one bit per spot number per lot, loaded lazily from the spot
+# rows and kept in step by the allocator, so finding a free spot and counting free
+# spots no longer query parking_spot. The database stays authoritative: every
+# claim is still a conditional UPDATE, and a bitmap that disagrees is reloaded.
+# With OCCUPANCY_ENGINE=redis the bitmaps live in Redis (SETBIT / BITPOS /
+# BITCOUNT) and are shared by every app process.
+import threading
+from collections import defaultdict
+from itertools import groupby
+from flask import current_app
+from sqlalchemy import select, event
+from sqlalchemy.orm import Session
+from backend.models.table_models import db, ParkingSpot
+
+LOAD_BATCH_SIZE = 500           # lots per IN (...) when loading bitmaps
+MAX_BIT_RACES = 8               # Redis: retries after another process set the same bit
+MAX_LOAD_ATTEMPTS = 3           # loads discarded because a change raced them
+
+
+# Bitmap layout: bit (spot_no - 1), most significant bit first, is set when the
+# spot is occupied or does not exist. Padding bits past the highest spot number
+# are set as well, so free spots = 8 * len(bitmap) - popcount.
+
+def _set_bit(bitmap, index):
+    bitmap[index >> 3] |= 0x80 >> (index & 7)
+
+def _clear_bit(bitmap, index):
+    bitmap[index >> 3] &= ~(0x80 >> (index & 7)) & 0xFF
+
+# Index of the first clear bit, or None; skips full bytes at C speed
+def first_clear_bit(bitmap):
+    index = len(bitmap) - len(bitmap.lstrip(b'\xff'))
+    if index == len(bitmap):
+        return None
+    return index * 8 + 8 - (~bitmap[index] & 0xFF).bit_length()
+
+def count_clear_bits(bitmap):
+    return len(bitmap) * 8 - int.from_bytes(bitmap, 'big').bit_count()
+
+# Builds the bitmap of one lot from its (spot_no, status) rows, ordered by spot_no
+def bitmap_from_spots(spots):
+    if not spots:
+        return bytearray()
+
+    bitmap = bytearray(b'\xff' * ((spots[-1][0] + 7) // 8))
+    for spot_no, status in spots:
+        if status == 'A':
+            _clear_bit(bitmap, spot_no - 1)
+    return bitmap
+
+## Load Bitmaps
+# {lot_id: bitmap} for the given lots from their spot rows, in batched queries.
+# Lots without spots get an empty bitmap.
+def load_bitmaps(lot_ids):
+    lot_ids = list(lot_ids)
+    bitmaps = {lot_id: bytearray() for lot_id in lot_ids}
+
+    for start in range(0, len(lot_ids), LOAD_BATCH_SIZE):
+        rows = db.session.execute(
+            select(ParkingSpot.lot_id, ParkingSpot.spot_no, ParkingSpot.status)
+            .where(ParkingSpot.lot_id.in_(lot_ids[start:start + LOAD_BATCH_SIZE]))
+            .order_by(ParkingSpot.lot_id, ParkingSpot.spot_no)
+        ).all()
+        for lot_id, spots in groupby(rows, key = lambda row: row.lot_id):
+            bitmaps[lot_id] = bitmap_from_spots([(row.spot_no, row.status) for row in spots])
+
+    return bitmaps
+
+# Bitmaps of this process, guarded by one lock. The rows are read outside the
+# lock, so every mark and forget bumps the lot's change count (forgetting all
+# lots bumps the generation), and a load that overlapped one is discarded
+# instead of installing a bitmap that predates it. After MAX_LOAD_ATTEMPTS such
+# races the rows are read under the lock.
+class LocalOccupancy:
+    def __init__(self):
+        self.bitmaps = {}
+        self.changes = defaultdict(int)         # lot id -> marks and forgets so far
+        self.generation = 0                     # forgets of all lots so far
+        self.lock = threading.Lock()
+
+    def _load(self, lot_ids):
+        for _ in range(MAX_LOAD_ATTEMPTS):
+            with self.lock:
+                generation = self.generation
+                missing = {lot_id: self.changes[lot_id] for lot_id in lot_ids if lot_id not in self.bitmaps}
+            if not missing:
+                return
+
+            loaded = load_bitmaps(missing)
+            with self.lock:
+                if self.generation != generation:
+                    continue
+                for lot_id, bitmap in loaded.items():
+                    if self.changes[lot_id] == missing[lot_id]:
+                        self.bitmaps.setdefault(lot_id, bitmap)
+
+        with self.lock:
+            missing = [lot_id for lot_id in lot_ids if lot_id not in self.bitmaps]
+            if missing:
+                self.bitmaps.update(load_bitmaps(missing))
+
+    # Marks the lowest free spot taken and returns its number, or None if full
+    def claim(self, lot_id):
+        self._load([lot_id])
+        with self.lock:
+            bitmap = self.bitmaps.get(lot_id)
+            index = first_clear_bit(bitmap) if bitmap is not None else None
+            if index is None:
+                return None
+            _set_bit(bitmap, index)
+            return index + 1
+
+    def mark(self, lot_id, spot_no, taken):
+        with self.lock:
+            self.changes[lot_id] += 1
+            bitmap = self.bitmaps.get(lot_id)
+            if bitmap is None or spot_no > len(bitmap) * 8:
+                return
+            if taken:
+                _set_bit(bitmap, spot_no - 1)
+            else:
+                _clear_bit(bitmap, spot_no - 1)
+
+    def free_counts(self, lot_ids):
+        self._load(lot_ids)
+        with self.lock:
+            return {lot_id: count_clear_bits(self.bitmaps.get(lot_id, b'')) for lot_id in lot_ids}
+
+    # Drops the given lots (all if None); they are reloaded on next use
+    def forget(self, lot_ids = None):
+        with self.lock:
+            if lot_ids is None:
+                self.generation += 1
+                self.bitmaps.clear()
+            for lot_id in lot_ids or ():
+                self.changes[lot_id] += 1
+                self.bitmaps.pop(lot_id, None)
+
+    def memory_bytes(self):
+        return sum(len(bitmap) for bitmap in self.bitmaps.values())
+
+# Same bitmaps as Redis strings, one key per lot. Bits are only changed on keys
+# that exist, so a missing key is always rebuilt from the database. As in
+# LocalOccupancy, every mark and forget bumps the lot's version key (forgetting
+# all lots bumps the generation key) and LOAD_SCRIPT installs rows read before
+# such a change only if neither moved; a lot that keeps racing is served from
+# its freshly read rows for that call, without installing them.
+class RedisOccupancy:
+    MARK_SCRIPT = """
+    redis.call('INCR', KEYS[2])
+    if redis.call('EXISTS', KEYS[1]) == 1 and redis.call('STRLEN', KEYS[1]) * 8 > tonumber(ARGV[1]) then
+        return redis.call('SETBIT', KEYS[1], ARGV[1], ARGV[2])
+    end
+    return -1
+    """
+
+    LOAD_SCRIPT = """
+    if tonumber(redis.call('GET', KEYS[2]) or '0') == tonumber(ARGV[2])
+        and tonumber(redis.call('GET', KEYS[3]) or '0') == tonumber(ARGV[3]) then
+        redis.call('SET', KEYS[1], ARGV[1], 'NX')
+        return 1
+    end
+    return 0
+    """
+
+    def __init__(self, url, prefix = 'occupancy'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.generation_key = f'{prefix}-generation'
+        self.mark_script = self.client.register_script(self.MARK_SCRIPT)
+        self.load_script = self.client.register_script(self.LOAD_SCRIPT)
+
+    def _key(self, lot_id):
+        return f'{self.prefix}:{lot_id}'
+
+    # Outside the '{prefix}:*' keys that forget() scans for bitmaps
+    def _version_key(self, lot_id):
+        return f'{self.prefix}-version:{lot_id}'
+
+    # Loads the lots without a bitmap. Returns {lot_id: bitmap} of the lots whose
+    # loads were discarded MAX_LOAD_ATTEMPTS times, read from their rows.
+    def _load(self, lot_ids):
+        loaded = {}
+        for _ in range(MAX_LOAD_ATTEMPTS):
+            pipe = self.client.pipeline(transaction = False)
+            pipe.get(self.generation_key)
+            for lot_id in lot_ids:
+                pipe.exists(self._key(lot_id))
+                pipe.get(self._version_key(lot_id))
+            generation, *results = pipe.execute()
+            missing = {
+                lot_id: int(version or 0)
+                for lot_id, exists, version in zip(lot_ids, results[::2], results[1::2]) if not exists
+            }
+            if not missing:
+                return {}
+
+            loaded = load_bitmaps(missing)
+            pipe = self.client.pipeline(transaction = False)
+            for lot_id, bitmap in loaded.items():
+                self.load_script(
+                    keys = [self._key(lot_id), self._version_key(lot_id), self.generation_key],
+                    args = [bytes(bitmap), missing[lot_id], int(generation or 0)],
+                    client = pipe
+                )
+            lot_ids = [lot_id for lot_id, installed in zip(loaded, pipe.execute()) if not installed]
+            if not lot_ids:
+                return {}
+
+        return {lot_id: loaded[lot_id] for lot_id in lot_ids}
+
+    def claim(self, lot_id):
+        raced = self._load([lot_id])
+        if lot_id in raced:
+            # Not shared with other processes this time; the conditional UPDATE decides
+            index = first_clear_bit(raced[lot_id])
+            return None if index is None else index + 1
+
+        key = self._key(lot_id)
+        for _ in range(MAX_BIT_RACES):
+            pipe = self.client.pipeline(transaction = False)
+            pipe.bitpos(key, 0)
+            pipe.strlen(key)
+            index, length = pipe.execute()
+            if index < 0 or index >= length * 8:
+                return None
+            # SETBIT returns the old bit: 1 means another process got there first
+            if not self.client.setbit(key, index, 1):
+                return index + 1
+        return None
+
+    def mark(self, lot_id, spot_no, taken):
+        self.mark_script(keys = [self._key(lot_id), self._version_key(lot_id)],
+                         args = [spot_no - 1, 1 if taken else 0])
+
+    def free_counts(self, lot_ids):
+        raced = self._load(lot_ids)
+        pipe = self.client.pipeline(transaction = False)
+        for lot_id in lot_ids:
+            pipe.bitcount(self._key(lot_id))
+            pipe.strlen(self._key(lot_id))
+        results = pipe.execute()
+        counts = {
+            lot_id: results[2 * n + 1] * 8 - results[2 * n]
+            for n, lot_id in enumerate(lot_ids)
+        }
+        counts.update({lot_id: count_clear_bits(bitmap) for lot_id, bitmap in raced.items()})
+        return counts
+
+    def forget(self, lot_ids = None):
+        pipe = self.client.pipeline(transaction = True)
+        if lot_ids is None:
+            pipe.incr(self.generation_key)
+            lot_ids = [key.decode().rsplit(':', 1)[1] for key in self.client.scan_iter(f'{self.prefix}:*')]
+        for lot_id in lot_ids:
+            pipe.incr(self._version_key(lot_id))
+            pipe.delete(self._key(lot_id))
+        pipe.execute()
+
+# The app's occupancy engine, created on first use from OCCUPANCY_ENGINE ('memory' or 'redis')
+def get_occupancy():
+    occupancy = current_app.extensions.get('occupancy_engine')
+    if occupancy is None:
+        if current_app.config.get('OCCUPANCY_ENGINE') == 'redis':
+            occupancy = RedisOccupancy(current_app.config['OCCUPANCY_REDIS_URL'])
+        else:
+            occupancy = LocalOccupancy()
+        current_app.extensions['occupancy_engine'] = occupancy
+    return occupancy
+
+## Transaction Hooks
+# Bitmap changes follow the database transaction: releases and removals are
+# applied once it commits, and lots with claims made in a transaction that rolls
+# back are dropped (their claimed bits would otherwise stay set).
+
+def _queue(hook, callback):
+    db.session.info.setdefault(hook, []).append(callback)
+
+def after_commit(callback):
+    _queue('occupancy_after_commit', callback)
+
+def track_claim(lot_id):
+    occupancy = get_occupancy()
+    _queue('occupancy_after_rollback', lambda: occupancy.forget([lot_id]))
+
+def forget_after_commit(lot_id):
+    occupancy = get_occupancy()
+    after_commit(lambda: occupancy.forget([lot_id]))
+
+def _run(session, run_hook, drop_hook):
+    session.info.pop(drop_hook, None)
+    for callback in session.info.pop(run_hook, []):
+        try:
+            callback()
+        except Exception as e:
+            print("Error updating occupancy bitmap: ", e)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_after_commit(session):
+    _run(session, 'occupancy_after_commit', 'occupancy_after_rollback')
+
+@event.listens_for(Session, 'after_rollback')
+def _apply_after_rollback(session):
+    _run(session, 'occupancy_after_rollback', 'occupancy_after_commit')
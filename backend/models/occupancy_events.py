@@ -0,0 +1,219 @@
+# Live lot availability: mutations publish the new counters of the lots they
+# changed once committed, and /events/occupancy streams them to dashboards as
+# Server-Sent Events. The broker is in-process by default; with Redis, every app
+# process relays one shared pub/sub channel to its own subscribers.
+import json
+import logging
+import queue
+import threading
+import time
+from flask import current_app
+from backend.models.table_models import db
+from backend.models.occupancy import lots_with_occupancy
+
+SUBSCRIBER_QUEUE_SIZE = 256     # events buffered per client before it is resynced
+HEARTBEAT_SECONDS = 15          # comment line sent to idle clients to keep the connection open
+RECONNECT_MIN_SECONDS = 0.5     # first wait before the Redis listener reconnects, doubled per failure
+RECONNECT_MAX_SECONDS = 30
+
+log = logging.getLogger(__name__)
+
+
+# One connected client: a bounded queue of (event, data) pairs. A client that
+# falls behind is marked overflowed and gets a fresh snapshot instead.
+class Subscription:
+    def __init__(self, broker):
+        self.broker = broker
+        self.queue = queue.Queue(maxsize = SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        return self.queue.get(timeout = timeout)
+
+    # Makes the stream replace whatever it missed with a fresh snapshot; the
+    # message wakes it up if it is waiting
+    def resync(self):
+        self.overflowed = True
+        self.put(('resync', ''))
+
+    def drain(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+# Fans events out to the subscriptions of this process
+class InProcessBroker:
+    def __init__(self):
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        subscription = Subscription(self)
+        with self.lock:
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        return len(self.subscribers)
+
+    # Data is serialized once, however many clients receive it
+    def publish(self, event, payload):
+        self.deliver((event, json.dumps(payload)))
+
+    def deliver(self, message):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription.put(message)
+
+    def resync(self):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription.resync()
+
+# Publishes through a Redis channel; one listener thread per process delivers
+# what any process published to the local subscriptions. The listener
+# reconnects with backoff when Redis goes away, and every (re)connect resyncs
+# the local subscriptions, since events published meanwhile were lost.
+class RedisBroker(InProcessBroker):
+    def __init__(self, url, channel = 'occupancy'):
+        super().__init__()
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+        self.listener = None
+
+    def subscribe(self):
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(target = self._listen, daemon = True)
+                self.listener.start()
+        return super().subscribe()
+
+    def publish(self, event, payload):
+        self.client.publish(self.channel, json.dumps({'event': event, 'data': payload}))
+
+    def _listen(self):
+        delay = RECONNECT_MIN_SECONDS
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages = True)
+            try:
+                pubsub.subscribe(self.channel)
+                self.resync()
+                delay = RECONNECT_MIN_SECONDS
+                for message in pubsub.listen():
+                    self._relay(message)
+            except Exception:
+                log.exception("Occupancy event listener lost Redis, reconnecting in %.1fs", delay)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+
+    def _relay(self, message):
+        try:
+            body = json.loads(message['data'])
+            event, data = body['event'], json.dumps(body['data'])
+        except (ValueError, TypeError, KeyError):
+            log.warning("Ignoring malformed occupancy event: %r", message.get('data'))
+            return
+        self.deliver((event, data))
+
+# The app's broker, created on first use from EVENT_BROKER ('memory' or 'redis')
+def get_broker():
+    broker = current_app.extensions.get('occupancy_broker')
+    if broker is None:
+        if current_app.config.get('EVENT_BROKER') == 'redis':
+            broker = RedisBroker(current_app.config['EVENT_REDIS_URL'])
+        else:
+            broker = InProcessBroker()
+        current_app.extensions['occupancy_broker'] = broker
+    return broker
+
+# Counters of the given lots (all lots if None) as event payloads
+def lot_states(lot_ids = None):
+    return [
+        {
+            'id': lot.id, 'prime_location': lot.prime_location, 'address': lot.address,
+            'pincode': lot.pincode, 'price': lot.price, 'total_spots': lot.total_spots,
+            'available_spots': available, 'occupied_spots': occupied
+        }
+        for lot, available, occupied in lots_with_occupancy(lot_ids)
+    ]
+
+## Publish Lot Changes
+# Call after committing a change to these lots. Publishing is best effort: a
+# failure is logged and never fails the request that made the change.
+def publish_lots(lot_ids):
+    try:
+        broker = get_broker()
+        for state in lot_states(list(lot_ids)):
+            broker.publish('lot', state)
+    except Exception as e:
+        print("Error publishing lot update: ", e)
+
+def publish_lot_deleted(lot_id):
+    try:
+        get_broker().publish('lot_deleted', {'id': lot_id})
+    except Exception as e:
+        print("Error publishing lot deletion: ", e)
+
+def _format(event, data):
+    return f'event: {event}\ndata: {data}\n\n'
+
+# Current state of all lots; the session is released right away so idle
+# streams do not hold pooled connections
+def _snapshot():
+    try:
+        return _format('snapshot', json.dumps(lot_states()))
+    finally:
+        db.session.remove()
+
+## Event Stream
+# SSE body for one client: a snapshot of every lot, then lot / lot_deleted
+# deltas as they are published, and a heartbeat while idle. Subscribing before
+# the snapshot means no change between the two is lost.
+def event_stream():
+    subscription = get_broker().subscribe()
+    try:
+        yield 'retry: 3000\n\n'
+        yield _snapshot()
+
+        while True:
+            try:
+                event, data = subscription.get(timeout = HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+
+            if subscription.overflowed:
+                subscription.overflowed = False
+                subscription.drain()
+                yield _snapshot()
+                continue
+            if event == 'resync':
+                continue    # already resynced by an earlier snapshot
+
+            yield _format(event, data)
+    finally:
+        subscription.close()
@@ -0,0 +1,71 @@
+# Keyset (cursor) pagination: pages continue from the sort key of the last row
+# instead of an OFFSET, so every page costs one bounded index range scan
+import base64
+import json
+from datetime import datetime
+from flask import request
+from sqlalchemy import and_, or_, DateTime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+## Page Arguments
+# Reads `limit` and `cursor` from the query string. Raises ValueError if invalid.
+def page_args():
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+
+    if limit < 1:
+        raise ValueError('limit must be positive')
+
+    return min(limit, MAX_PAGE_SIZE), request.args.get('cursor')
+
+## Cursor Encoding
+# A cursor is the sort key of the last returned row as url-safe base64 JSON.
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor, columns):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError('Invalid cursor')
+
+    return [
+        datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+        for column, value in zip(columns, values)
+    ]
+
+# Rows strictly after `values` in (columns) order, e.g. a > x OR (a = x AND b > y)
+def _after(columns, values, descending):
+    clauses = []
+    for i, column in enumerate(columns):
+        beyond = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*[columns[j] == values[j] for j in range(i)], beyond))
+    return or_(*clauses)
+
+## Keyset Page
+# Returns (rows, next_cursor) for `query` ordered by `columns`. The last column
+# must be unique (normally the primary key). `key` maps a row to its sort values.
+def keyset_page(query, columns, limit, cursor=None, descending=False, key=None):
+    if cursor:
+        query = query.filter(_after(columns, decode_cursor(cursor, columns), descending))
+
+    ordering = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(*ordering).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        values = key(last) if key else [getattr(last, column.key) for column in columns]
+        next_cursor = encode_cursor(values)
+
+    return rows, next_cursor
@@ -0,0 +1,48 @@
+# Daily reminder queries: who has not booked today and which lots are new, as
+# set-based queries over half-open [start, end) time ranges that can use indexes
+from datetime import datetime, time, timedelta
+from sqlalchemy import select, exists
+from backend.models.table_models import db, User, ParkingLot, Reservation
+
+REMINDER_BATCH_SIZE = 1000   # users fetched per query while streaming recipients
+
+
+# [start, end) datetimes covering one calendar day
+def day_bounds(day):
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days = 1)
+
+# Lots created in [start, end), oldest first
+def lots_created_between(start, end):
+    return (
+        ParkingLot.query
+        .filter(ParkingLot.created_at >= start, ParkingLot.created_at < end)
+        .order_by(ParkingLot.id)
+        .all()
+    )
+
+## Reminder Recipients
+# Streams non-admin users as rows (id, full_name, email, missed_booking) in
+# batches of `batch_size`, keyset-paginated on id. missed_booking is a correlated
+# NOT EXISTS over ix_reservation_user_parking_time, so no id list is ever built in
+# Python. With include_all=False only users who missed a booking are returned.
+def reminder_recipients(start, end, include_all=False, batch_size=REMINDER_BATCH_SIZE):
+    booked = exists().where(
+        Reservation.user_id == User.id,
+        Reservation.parking_time >= start,
+        Reservation.parking_time < end
+    )
+    query = select(User.id, User.full_name, User.email, (~booked).label('missed_booking')).where(User.role != 'admin')
+    if not include_all:
+        query = query.where(~booked)
+
+    last_id = 0
+    while True:
+        batch = db.session.execute(
+            query.where(User.id > last_id).order_by(User.id).limit(batch_size)
+        ).all()
+        if not batch:
+            return
+
+        yield batch
+        last_id = batch[-1].id
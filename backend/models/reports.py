@@ -0,0 +1,92 @@
+# Reporting queries: reservation counts and revenue aggregated in SQL, read from
+# the daily rollups (backend/models/rollups.py) rather than every reservation
+from sqlalchemy import func
+from backend.models.table_models import db, User, ParkingLot, DailyUserStats, DailyLotStats
+
+
+## User Summary
+# Active/checked-out reservation counts and total spent for one user, one query
+# over the user's daily rollup rows.
+def user_summary(user_id):
+    active, checked_out, total_spent = db.session.query(
+        func.coalesce(func.sum(DailyUserStats.bookings - DailyUserStats.completed), 0),
+        func.coalesce(func.sum(DailyUserStats.completed), 0),
+        func.coalesce(func.sum(DailyUserStats.revenue), 0)
+    ).filter(DailyUserStats.user_id == user_id).one()
+
+    return {
+        'active_reservations': active,
+        'checked_out_reservations': checked_out,
+        'total_spent': total_spent
+    }
+
+## Revenue By Lot
+# Revenue and completed reservations per lot (lots without revenue included),
+# summed over one rollup row per lot and day.
+def revenue_by_lot():
+    rows = (
+        db.session.query(
+            ParkingLot.id,
+            ParkingLot.prime_location,
+            func.coalesce(func.sum(DailyLotStats.revenue), 0),
+            func.coalesce(func.sum(DailyLotStats.completed), 0)
+        )
+        .outerjoin(DailyLotStats, DailyLotStats.lot_id == ParkingLot.id)
+        .group_by(ParkingLot.id, ParkingLot.prime_location)
+        .order_by(ParkingLot.id)
+        .all()
+    )
+
+    return [
+        {'lot_id': lot_id, 'lot_name': name, 'revenue': revenue, 'completed_reservations': completed}
+        for lot_id, name, revenue, completed in rows
+    ]
+
+## Monthly User Activity
+# Bookings, spend and most-used lot for every user with reservations parked in
+# the days [start, end), in one grouped pass over the daily user rollups.
+# Returns dicts ordered by user id.
+def monthly_user_activity(start, end):
+    per_lot = (
+        db.session.query(
+            DailyUserStats.user_id.label('user_id'),
+            DailyUserStats.lot_id.label('lot_id'),
+            func.sum(DailyUserStats.bookings).label('bookings'),
+            func.sum(DailyUserStats.revenue).label('spent')
+        )
+        .filter(DailyUserStats.day >= start.date(), DailyUserStats.day < end.date())
+        .group_by(DailyUserStats.user_id, DailyUserStats.lot_id)
+        .subquery()
+    )
+
+    # Per-user totals and each lot's rank by bookings, computed over the per-lot groups
+    ranked = db.session.query(
+        per_lot.c.user_id,
+        per_lot.c.lot_id,
+        func.sum(per_lot.c.bookings).over(partition_by=per_lot.c.user_id).label('total_bookings'),
+        func.sum(per_lot.c.spent).over(partition_by=per_lot.c.user_id).label('total_spent'),
+        func.row_number().over(
+            partition_by=per_lot.c.user_id,
+            order_by=(per_lot.c.bookings.desc(), per_lot.c.lot_id)
+        ).label('rank')
+    ).subquery()
+
+    rows = (
+        db.session.query(
+            User.id, User.full_name, User.email,
+            ranked.c.total_bookings, ranked.c.total_spent, ParkingLot.prime_location
+        )
+        .join(ranked, ranked.c.user_id == User.id)
+        .join(ParkingLot, ParkingLot.id == ranked.c.lot_id)
+        .filter(ranked.c.rank == 1, User.role != 'admin')
+        .order_by(User.id)
+        .all()
+    )
+
+    return [
+        {
+            'user_id': user_id, 'full_name': full_name, 'email': email,
+            'total_bookings': bookings, 'total_spent': spent, 'most_used_lot': lot_name
+        }
+        for user_id, full_name, email, bookings, spent, lot_name in rows
+    ]
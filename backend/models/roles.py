@@ -0,0 +1,155 @@
+# Role-based access for routes: resolves the JWT identity's role through an
+# in-process LRU/TTL cache so the per-request check does not hit the database.
+# A role change or user deletion bumps a generation in the shared view cache;
+# every process checks it about once a second and drops its cached roles when
+# it moved, so a revoked admin loses access everywhere within that interval.
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import jsonify, current_app
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from backend.models.table_models import db, User
+from backend.models.caching import invalidate_roles, roles_generation
+
+ROLE_CACHE_SIZE = 10000  # user ids kept per process
+ROLE_CACHE_TTL = 300     # seconds before a cached role is re-read
+ROLE_GENERATION_CHECK = 1.0  # seconds between reads of the shared role generation
+
+
+# Thread-safe LRU cache of user_id -> role with a time-to-live per entry
+class RoleCache:
+    def __init__(self, maxsize = ROLE_CACHE_SIZE, ttl = ROLE_CACHE_TTL, check_interval = ROLE_GENERATION_CHECK):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._next_check = 0.0
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+
+            role, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+
+            self._entries.move_to_end(user_id)
+            return role
+
+    def set(self, user_id, role):
+        with self._lock:
+            self._entries[user_id] = (role, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last = False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # Clears the cache if the shared generation (read by `read_generation`)
+    # moved since the last check; checks at most every check_interval seconds.
+    # If it cannot be read, the cache is cleared (roles come from the database).
+    def sync(self, read_generation):
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+
+        try:
+            generation = read_generation()
+        except Exception as e:
+            print("Error reading role generation: ", e)
+            self.clear()
+            return
+
+        with self._lock:
+            if generation != self._generation:
+                self._entries.clear()
+                self._generation = generation
+
+role_cache = RoleCache()
+
+# Drop this process's cached role right away when a user's role changes or the
+# user is deleted through the ORM; other processes are told once it commits
+@event.listens_for(User, 'after_update')
+def _role_updated(mapper, connection, target):
+    if inspect(target).attrs.role.history.has_changes():
+        _invalidate_user_role(target)
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    _invalidate_user_role(target)
+
+def _invalidate_user_role(user):
+    role_cache.invalidate(user.id)
+    session = object_session(user)
+    if session is not None:
+        session.info['roles_changed'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _publish_role_changes(session):
+    if session.info.pop('roles_changed', False):
+        try:
+            invalidate_roles()
+        except Exception as e:
+            print("Error invalidating cached roles: ", e)
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_role_changes(session):
+    session.info.pop('roles_changed', None)
+
+## Get User Role
+# Returns the role of a user, reading the database only on a cache miss.
+# Returns None for unknown users (which are not cached).
+def get_user_role(user_id):
+    role_cache.sync(roles_generation)
+    role = role_cache.get(user_id)
+    if role is None:
+        role = db.session.query(User.role).filter(User.id == user_id).scalar()
+        if role is not None:
+            role_cache.set(user_id, role)
+
+    return role
+
+## Current User Id
+# JWT identity of the current request as an integer.
+def current_user_id():
+    return int(get_jwt_identity())
+
+## Role Required Decorator
+# Replaces @jwt_required() plus the manual User lookup on each route. With
+# JWT_ROLE_CLAIM enabled the 'role' claim issued at login is trusted instead.
+def role_required(role):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            verify_jwt_in_request()
+
+            user_role = None
+            if current_app.config.get('JWT_ROLE_CLAIM'):
+                user_role = get_jwt().get('role')
+            if user_role is None:
+                user_role = get_user_role(current_user_id())
+
+            if user_role != role:
+                return jsonify({'msg': f'{role.capitalize()}s only'}), 403
+
+            return view(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,145 @@
+# Daily rollups of reservations: per user and lot (daily_user_stats) and per lot
+# (daily_lot_stats), keyed by the UTC day a stay started. Reserve and release
+# add their changes in the same transaction as the reservation itself, so
+# reports read one row per day instead of every reservation. rebuild_rollups
+# recomputes a range of days from the reservations: the backfill for existing
+# data, and the nightly reconcile that repairs any drift.
+import calendar
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone
+from sqlalchemy import select, insert, delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+from backend.models.table_models import db, ParkingSpot, Reservation, DailyUserStats, DailyLotStats
+from backend.models.sql_helpers import epoch_seconds, utc_day
+
+STAT_COLUMNS = ('bookings', 'completed', 'revenue', 'parked_seconds')
+# (model, key columns) of every rollup
+ROLLUPS = (
+    (DailyUserStats, ('day', 'user_id', 'lot_id')),
+    (DailyLotStats, ('day', 'lot_id')),
+)
+RECONCILE_CHUNK_DAYS = 7        # days rebuilt per transaction (writers wait for each one)
+
+
+## Booking / Completion
+# Rollup changes of a new reservation and of a released one (whole seconds, as
+# rebuild_rollups computes them in SQL).
+def booking(user_id, lot_id, parking_time):
+    return {'user_id': user_id, 'lot_id': lot_id, 'parking_time': parking_time, 'bookings': 1}
+
+def completion(user_id, lot_id, parking_time, leaving_time, cost):
+    parked = calendar.timegm(leaving_time.utctimetuple()) - calendar.timegm(parking_time.utctimetuple())
+    return {'user_id': user_id, 'lot_id': lot_id, 'parking_time': parking_time,
+            'completed': 1, 'revenue': cost or 0, 'parked_seconds': parked}
+
+## Bump Rollups
+# Adds changes from booking() / completion() to both rollups in the current
+# transaction; the caller commits. Changes to the same row are merged first, so
+# a batch costs one upsert per rollup.
+def bump_rollups(changes):
+    totals = {model: defaultdict(lambda: dict.fromkeys(STAT_COLUMNS, 0)) for model, _ in ROLLUPS}
+    for change in changes:
+        values = {**change, 'day': change['parking_time'].date()}
+        for model, keys in ROLLUPS:
+            row = totals[model][tuple(values[key] for key in keys)]
+            for column in STAT_COLUMNS:
+                row[column] += change.get(column, 0)
+
+    dialect = db.session.get_bind().dialect.name
+    for model, keys in ROLLUPS:
+        if totals[model]:
+            db.session.execute(_upsert(dialect, model, keys), [
+                {**dict(zip(keys, key)), **row} for key, row in totals[model].items()
+            ])
+
+# INSERT ... ON CONFLICT DO UPDATE adding to a rollup row, built once per dialect
+# (a statement built per call misses SQLAlchemy's compiled cache and costs more
+# than executing it)
+_upserts = {}
+
+def _upsert(dialect, model, keys):
+    if (dialect, model) not in _upserts:
+        table = model.__table__
+        upsert = (postgresql if dialect == 'postgresql' else sqlite).insert(table)
+        _upserts[dialect, model] = upsert.on_conflict_do_update(
+            index_elements = list(keys),
+            set_ = {column: table.c[column] + upsert.excluded[column] for column in STAT_COLUMNS}
+        )
+    return _upserts[dialect, model]
+
+# Rollup rows of `keys` recomputed from the reservations started in [start_day, end_day)
+def _aggregate(connection, keys, start_day, end_day):
+    group = {
+        'day': utc_day(Reservation.parking_time, connection.dialect),
+        'user_id': Reservation.user_id,
+        'lot_id': ParkingSpot.lot_id,
+    }
+    columns = [group[key].label(key) for key in keys]
+    query = (
+        select(
+            *columns,
+            func.count(Reservation.id).label('bookings'),
+            func.count(Reservation.leaving_time).label('completed'),
+            func.coalesce(func.sum(Reservation.cost), 0).label('revenue'),
+            func.coalesce(func.sum(epoch_seconds(Reservation.leaving_time, connection.dialect)
+                                   - epoch_seconds(Reservation.parking_time, connection.dialect)), 0)
+                .label('parked_seconds')
+        )
+        .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+        .group_by(*[group[key] for key in keys])
+    )
+    if start_day is not None:
+        query = query.where(Reservation.parking_time >= datetime.combine(start_day, time()))
+    if end_day is not None:
+        query = query.where(Reservation.parking_time < datetime.combine(end_day, time()))
+    return connection.execute(query).all()
+
+## Rebuild Rollups
+# Recomputes both rollups for the days [start_day, end_day) (open-ended when
+# None) on `connection`, inside the caller's transaction. The old rows are
+# deleted first, which takes SQLite's write lock, so no release can commit
+# between reading the reservations and writing the new rows.
+# Returns how many rollup rows were wrong, missing or left over (the drift).
+def rebuild_rollups(connection, start_day = None, end_day = None):
+    drift = 0
+    for model, keys in ROLLUPS:
+        table = model.__table__
+        removed = delete(table).returning(*[table.c[name] for name in keys + STAT_COLUMNS])
+        if start_day is not None:
+            removed = removed.where(table.c.day >= start_day)
+        if end_day is not None:
+            removed = removed.where(table.c.day < end_day)
+
+        old = {tuple(row[:len(keys)]): tuple(row[len(keys):]) for row in connection.execute(removed)}
+        rows = _aggregate(connection, keys, start_day, end_day)
+        if rows:
+            connection.execute(insert(table), [dict(row._mapping) for row in rows])
+
+        new = {tuple(row[:len(keys)]): tuple(row[len(keys):]) for row in rows}
+        drift += sum(old.get(key) != value for key, value in new.items()) + len(old.keys() - new.keys())
+    return drift
+
+## Reconcile Rollups
+# Rebuilds the rollups of the last `days` days, or of the whole history when
+# None, RECONCILE_CHUNK_DAYS per transaction so writers are not held up for long.
+# Returns the days covered and the total drift found.
+def reconcile_rollups(days = None):
+    today = datetime.now(timezone.utc).date()
+    if days is None:
+        first = db.session.execute(select(func.min(Reservation.parking_time))).scalar()
+        start_day = first.date() if first else today
+    else:
+        start_day = today - timedelta(days = days - 1)
+
+    drift = 0
+    day = start_day
+    while day <= today:
+        # A full rebuild also drops rows before the first stay; the last chunk is
+        # open-ended, so stays started after midnight UTC are included
+        end_day = day + timedelta(days = RECONCILE_CHUNK_DAYS)
+        lower = None if days is None and day == start_day else day
+        drift += rebuild_rollups(db.session.connection(), lower, end_day if end_day <= today else None)
+        db.session.commit()
+        day = end_day
+
+    return {'start': start_day.isoformat(), 'days': (today - start_day).days + 1, 'drift': drift}
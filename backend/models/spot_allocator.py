@@ -0,0 +1,119 @@
+# Spot allocator: claims and frees parking spots with conditional UPDATEs so that
+# concurrent requests can never hand out the same spot or drift the lot counters
+from sqlalchemy import select, update, delete
+from backend.models.table_models import db, ParkingLot, ParkingSpot, Reservation
+from backend.models.occupancy_bitmap import get_occupancy, track_claim, after_commit
+
+# How many times a claim is retried after losing a race for a spot
+MAX_CLAIM_ATTEMPTS = 8
+
+
+## Shift Lot Counters
+# Adjusts the lot counters in SQL (never read-modify-write in Python).
+def shift_lot_counters(lot_id, available=0, total=0):
+    db.session.execute(
+        update(ParkingLot)
+        .where(ParkingLot.id == lot_id)
+        .values(
+            available_spots = ParkingLot.available_spots + available,
+            total_spots = ParkingLot.total_spots + total
+        )
+        .execution_options(synchronize_session = False)
+    )
+
+## Claim a Spot
+# Atomically marks one available spot in the lot as occupied and decrements the
+# lot's available counter. Returns the claimed spot id, or None if the lot is full.
+# The free spot comes from the lot's occupancy bitmap; the conditional UPDATE
+# still decides, so a stale bitmap costs a reload and retry, never a double booking.
+# Runs inside the caller's transaction; the caller commits.
+def claim_spot(lot_id):
+    occupancy = get_occupancy()
+    reloaded = False
+
+    for _ in range(MAX_CLAIM_ATTEMPTS):
+        spot_no = occupancy.claim(lot_id)
+
+        if spot_no is None:
+            # Another process may have freed spots; trust the bitmap once the counter agrees
+            available = db.session.execute(
+                select(ParkingLot.available_spots).where(ParkingLot.id == lot_id)
+            ).scalar()
+            if reloaded or not available:
+                return None
+            occupancy.forget([lot_id])
+            reloaded = True
+            continue
+
+        track_claim(lot_id)
+
+        # Only succeeds if nobody claimed the spot since the bitmap was loaded;
+        # otherwise the bitmap is stale (e.g. another process claimed it) and is reloaded
+        spot_id = db.session.execute(
+            update(ParkingSpot)
+            .where(ParkingSpot.lot_id == lot_id, ParkingSpot.spot_no == spot_no, ParkingSpot.status == 'A')
+            .values(status = 'O')
+            .returning(ParkingSpot.id)
+            .execution_options(synchronize_session = False)
+        ).scalar()
+
+        if spot_id is not None:
+            shift_lot_counters(lot_id, available=-1)
+            return spot_id
+        occupancy.forget([lot_id])
+
+    return None
+
+## Free a Spot
+# Marks an occupied spot available again and increments the lot counter; its
+# bit is cleared once the transaction commits.
+# Returns False if the spot was not occupied (already freed).
+def free_spot(spot_id, lot_id):
+    spot_no = db.session.execute(
+        update(ParkingSpot)
+        .where(ParkingSpot.id == spot_id, ParkingSpot.status == 'O')
+        .values(status = 'A')
+        .returning(ParkingSpot.spot_no)
+        .execution_options(synchronize_session = False)
+    ).scalar()
+
+    if spot_no is None:
+        return False
+
+    shift_lot_counters(lot_id, available=1)
+    occupancy = get_occupancy()
+    after_commit(lambda: occupancy.mark(lot_id, spot_no, taken=False))
+    return True
+
+## Close a Reservation
+# Sets leaving time and cost only if the reservation is still open, so two
+# concurrent releases of the same reservation cannot both succeed.
+def close_reservation(reservation_id, leaving_time, cost):
+    closed = db.session.execute(
+        update(Reservation)
+        .where(Reservation.id == reservation_id, Reservation.leaving_time.is_(None))
+        .values(leaving_time = leaving_time, cost = cost)
+        .execution_options(synchronize_session = False)
+    ).rowcount
+
+    return closed == 1
+
+## Remove a Free Spot
+# Deletes a spot only while it is still available and shrinks the lot counters.
+# Returns False if the spot was claimed in the meantime.
+def remove_free_spot(spot_id, lot_id):
+    spot_no = db.session.execute(
+        delete(ParkingSpot)
+        .where(ParkingSpot.id == spot_id, ParkingSpot.status == 'A')
+        .returning(ParkingSpot.spot_no)
+        .execution_options(synchronize_session = False)
+    ).scalar()
+
+    if spot_no is None:
+        return False
+
+    shift_lot_counters(lot_id, available=-1, total=-1)
+    # A deleted spot number stays taken in the bitmap
+    occupancy = get_occupancy()
+    after_commit(lambda: occupancy.mark(lot_id, spot_no, taken=True))
+    return True
@@ -0,0 +1,93 @@
+# Bulk provisioning of parking spots: lot creation and resizing insert or delete
+# spot rows in batched statements instead of one ORM object per spot
+from sqlalchemy import insert, select, delete, exists, func
+from backend.models.table_models import db, ParkingSpot, Reservation
+from backend.models.spot_allocator import shift_lot_counters
+from backend.models.occupancy_bitmap import forget_after_commit
+
+# Rows per executemany batch / ids per DELETE ... IN (...)
+SPOT_BATCH_SIZE = 5000
+
+
+## Parse Total Spots
+# A lot size from request data as an int. Raises ValueError for anything but a
+# non-negative whole number (numeric strings are accepted, booleans and
+# fractions are not).
+def parse_total_spots(value):
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError('total_spots must be a non-negative integer')
+    try:
+        total_spots = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('total_spots must be a non-negative integer')
+
+    if total_spots < 0:
+        raise ValueError('total_spots must be a non-negative integer')
+    return total_spots
+
+# First unused spot number after the highest one in the lot (read off the index)
+def next_spot_no(lot_id):
+    highest = db.session.execute(
+        select(func.max(ParkingSpot.spot_no)).where(ParkingSpot.lot_id == lot_id)
+    ).scalar()
+    return (highest or 0) + 1
+
+## Add Spots
+# Inserts `count` available spots for a lot in batched executemany statements,
+# numbered after the lot's highest spot number. Does not touch the lot counters;
+# runs inside the caller's transaction.
+def add_spots(lot_id, count):
+    forget_after_commit(lot_id)
+    spot_no = next_spot_no(lot_id)
+    end = spot_no + count
+    while spot_no < end:
+        batch = range(spot_no, min(end, spot_no + SPOT_BATCH_SIZE))
+        db.session.execute(insert(ParkingSpot), [{'lot_id': lot_id, 'status': 'A', 'spot_no': n} for n in batch])
+        spot_no = batch.stop
+
+## Remove Spots
+# Deletes `count` free spots without reservation history from a lot, highest numbers first.
+# Returns False (deleting nothing) if the lot does not have that many removable spots.
+def remove_spots(lot_id, count):
+    has_history = exists().where(Reservation.spot_id == ParkingSpot.id)
+    spot_ids = db.session.execute(
+        select(ParkingSpot.id)
+        .where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A', ~has_history)
+        .order_by(ParkingSpot.spot_no.desc())
+        .limit(count)
+    ).scalars().all()
+
+    if len(spot_ids) < count:
+        return False
+
+    forget_after_commit(lot_id)
+
+    removed = 0
+    for start in range(0, len(spot_ids), SPOT_BATCH_SIZE):
+        batch = spot_ids[start:start + SPOT_BATCH_SIZE]
+        removed += db.session.execute(
+            delete(ParkingSpot)
+            .where(ParkingSpot.id.in_(batch), ParkingSpot.status == 'A')
+            .execution_options(synchronize_session = False)
+        ).rowcount
+
+    # A spot was claimed between the select and the delete
+    if removed != count:
+        raise RuntimeError(f'Removed {removed} of {count} spots from lot {lot_id}')
+
+    return True
+
+## Resize Lot
+# Grows or shrinks a lot to `new_total` spots and shifts its counters to match.
+# Returns False if shrinking would remove occupied spots or spots with history.
+def resize_lot(lot, new_total):
+    delta = new_total - lot.total_spots
+    if delta > 0:
+        add_spots(lot.id, delta)
+    elif delta < 0 and not remove_spots(lot.id, -delta):
+        return False
+
+    if delta:
+        shift_lot_counters(lot.id, available=delta, total=delta)
+
+    return True
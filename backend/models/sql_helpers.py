@@ -0,0 +1,24 @@
+# SQL expressions that differ between SQLite and other databases, shared by the
+# analytics and the rollups. Only SQLAlchemy is imported here, so the schema
+# migrations can use them without loading NumPy.
+from sqlalchemy import cast, func, type_coerce
+from backend.models.table_models import db
+
+
+## Epoch Seconds
+# Whole epoch seconds of a DateTime column, computed by the database and
+# truncated like calendar.timegm (the rollups add Python-computed seconds to
+# them). SQLite's strftime rounds to milliseconds, so the fraction is cut off
+# the stored text first; PostgreSQL's cast to bigint rounds, so it is floored.
+# `dialect` defaults to the one of the session's connection.
+def epoch_seconds(column, dialect = None):
+    if (dialect or db.session.get_bind().dialect).name == 'sqlite':
+        return cast(func.strftime('%s', func.substr(column, 1, 19)), db.BigInteger)
+    return cast(func.floor(func.extract('epoch', column)), db.BigInteger)
+
+## UTC Day
+# Date of a DateTime column (stored in UTC), computed by the database
+def utc_day(column, dialect):
+    if dialect.name == 'sqlite':
+        return type_coerce(func.date(column), db.Date)
+    return cast(column, db.Date)
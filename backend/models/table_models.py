@@ -29,6 +29,10 @@ class User(db.Model):
 # ParkingLot model: stores lot details and pricing
 class ParkingLot(db.Model):
     __tablename__ = 'parking_lot'
+    __table_args__ = (
+        db.Index('ix_parking_lot_created_at', 'created_at'),  # new lots per day
+        db.Index('ix_parking_lot_lat_lng', 'latitude', 'longitude'),  # nearby lots without an R*Tree
+    )
 
     id = db.Column(db.Integer, primary_key = True)
     prime_location = db.Column(db.String(100), nullable = False)
@@ -37,19 +41,35 @@ class ParkingLot(db.Model):
     pincode = db.Column(db.String(10), nullable = False)
     available_spots = db.Column(db.Integer, nullable = False)
     total_spots = db.Column(db.Integer, nullable = False)
-    created_at = db.Column(db.DateTime, default = datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, default = lambda: datetime.now(timezone.utc))  # per insert, not at import
+    latitude = db.Column(db.Float, nullable = True)
+    longitude = db.Column(db.Float, nullable = True)
 
 # ParkingSpot model: stores individual spot status and lot association
 class ParkingSpot(db.Model):
     __tablename__ = 'parking_spot'
+    __table_args__ = (
+        db.Index('ix_parking_spot_lot_status', 'lot_id', 'status'),  # free-spot lookup and counts per lot
+        db.Index('uq_parking_spot_lot_spot_no', 'lot_id', 'spot_no', unique = True),  # spot by number, lot map
+    )
 
     id = db.Column(db.Integer, primary_key = True)
     lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), nullable = False)
+    spot_no = db.Column(db.Integer)  # 1-based number within the lot; never reused while the spot exists
     status = db.Column(db.String(1), default = "A")  # 'A' for available, 'O' for occupied
 
+    lot = db.relationship('ParkingLot')
+
 # Reservation model: stores booking info for each spot/user
 class Reservation(db.Model):
     __tablename__ = 'reservation'
+    __table_args__ = (
+        db.Index('ix_reservation_user_parking_time', 'user_id', 'parking_time'),  # user history, bookings per user/day
+        db.Index('ix_reservation_spot_parking_time', 'spot_id', 'parking_time'),  # latest reservation of a spot
+        db.Index('ix_reservation_parking_time', 'parking_time'),                  # bookings in a time range
+        db.Index('ix_reservation_spot_revenue', 'spot_id', 'leaving_time', 'cost'), # covers revenue per lot
+        db.Index('ix_reservation_leaving_time', 'leaving_time'),                  # stays overlapping a time range
+    )
 
     id = db.Column(db.Integer, primary_key = True)
     spot_id = db.Column(db.Integer, db.ForeignKey('parking_spot.id'))
@@ -58,3 +78,42 @@ class Reservation(db.Model):
     leaving_time = db.Column(db.DateTime, nullable = True)
     cost = db.Column(db.Integer, nullable = True)
     vehicle_no = db.Column(db.String(10), nullable = False)
+
+    spot = db.relationship('ParkingSpot')
+
+# ReportDelivery model: one row per user per scheduled report already emailed,
+# so re-running a report task skips users who already received it
+class ReportDelivery(db.Model):
+    __tablename__ = 'report_delivery'
+
+    report = db.Column(db.String(50), primary_key = True)  # e.g. 'monthly:2025-07'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key = True)
+    sent_at = db.Column(db.DateTime, nullable = False)
+
+# DailyUserStats model: per user, lot and UTC day a stay started, the bookings made,
+# stays completed, their revenue and time parked. Kept in step with reservations
+# by backend/models/rollups.py so reports read a few rows per user and month
+class DailyUserStats(db.Model):
+    __tablename__ = 'daily_user_stats'
+    __table_args__ = (
+        db.Index('ix_daily_user_stats_user_day', 'user_id', 'day'),  # one user's totals (user summary)
+    )
+
+    day = db.Column(db.Date, primary_key = True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key = True)
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), primary_key = True)
+    bookings = db.Column(db.Integer, nullable = False, default = 0)
+    completed = db.Column(db.Integer, nullable = False, default = 0)
+    revenue = db.Column(db.Integer, nullable = False, default = 0)
+    parked_seconds = db.Column(db.Integer, nullable = False, default = 0)
+
+# DailyLotStats model: the same figures per lot and day, for admin summaries
+class DailyLotStats(db.Model):
+    __tablename__ = 'daily_lot_stats'
+
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), primary_key = True)  # lot first: per-lot sums
+    day = db.Column(db.Date, primary_key = True)
+    bookings = db.Column(db.Integer, nullable = False, default = 0)
+    completed = db.Column(db.Integer, nullable = False, default = 0)
+    revenue = db.Column(db.Integer, nullable = False, default = 0)
+    parked_seconds = db.Column(db.Integer, nullable = False, default = 0)
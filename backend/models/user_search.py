@@ -0,0 +1,187 @@
+# Admin user search: an SQLite FTS5 index over name and email, kept in sync with
+# the user table by triggers. PostgreSQL uses a GIN index over the same words and
+# a lower-cased name index for autocomplete; other databases fall back to ILIKE.
+import re
+from sqlalchemy import text, or_, func, inspect
+from backend.models.table_models import db, User
+from backend.models.lot_search import match_query
+from backend.models.pagination import encode_cursor, decode_cursor, keyset_page
+
+AUTOCOMPLETE_LIMIT = 10
+
+# Same layout as parking_lot_fts; email addresses split into words at '@' and '.'
+FTS_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS user_fts USING fts5(
+        full_name, email,
+        content = 'user', content_rowid = 'id',
+        prefix = '1 2 3 4', tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_fts_insert AFTER INSERT ON user BEGIN
+        INSERT INTO user_fts (rowid, full_name, email) VALUES (new.id, new.full_name, new.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_fts_delete AFTER DELETE ON user BEGIN
+        INSERT INTO user_fts (user_fts, rowid, full_name, email) VALUES ('delete', old.id, old.full_name, old.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_fts_update AFTER UPDATE OF full_name, email ON user BEGIN
+        INSERT INTO user_fts (user_fts, rowid, full_name, email) VALUES ('delete', old.id, old.full_name, old.email);
+        INSERT INTO user_fts (rowid, full_name, email) VALUES (new.id, new.full_name, new.email);
+    END
+    """,
+    "INSERT INTO user_fts (user_fts) VALUES ('rebuild')",
+]
+
+# PostgreSQL: the name and email words (email split at '@' and '.') as a
+# tsvector; queries must use the same expression for the GIN index to apply
+PG_WORDS = (
+    "to_tsvector('simple'::regconfig, coalesce(full_name, '') || ' ' || translate(coalesce(email, ''), '@.', '  '))"
+)
+PG_SEARCH_INDEX = 'ix_user_search_words'
+PG_SCHEMA = [
+    f'CREATE INDEX IF NOT EXISTS {PG_SEARCH_INDEX} ON "user" USING gin ({PG_WORDS})',
+    # text_pattern_ops lets LIKE 'prefix%' use the index under any collation
+    'CREATE INDEX IF NOT EXISTS ix_user_full_name_prefix ON "user" (lower(full_name) text_pattern_ops)',
+]
+
+
+# Creates the FTS table and its triggers on SQLite, the word and prefix indexes
+# on PostgreSQL; a no-op elsewhere
+def create_user_search_index(connection):
+    if connection.dialect.name == 'sqlite':
+        statements = FTS_SCHEMA
+    elif connection.dialect.name == 'postgresql':
+        statements = PG_SCHEMA
+    else:
+        return
+
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+# Engines known to have the FTS index, so the catalog is checked only once
+_indexed_engines = set()
+
+def has_user_search_index():
+    engine = db.engine
+    if engine.url not in _indexed_engines:
+        if engine.dialect.name == 'sqlite':
+            exists = inspect(engine).has_table('user_fts')
+        elif engine.dialect.name == 'postgresql':
+            exists = any(index['name'] == PG_SEARCH_INDEX for index in inspect(engine).get_indexes('user'))
+        else:
+            exists = False
+        if not exists:
+            return False
+        _indexed_engines.add(engine.url)
+    return True
+
+# User input as a tsquery with the semantics of match_query: every word must
+# match as a prefix, e.g. "ann gm" -> "ann:* & gm:*"
+def _pg_match_query(search_query):
+    return ' & '.join(f'{word}:*' for word in re.findall(r'\w+', search_query))
+
+# LIKE pattern (escaped with backslashes) matching values that start with `prefix`
+def _prefix_pattern(prefix):
+    return re.sub(r'([\\%_])', r'\\\1', prefix) + '%'
+
+## Search Users
+# One keyset page of non-admin users whose name or email words start with the
+# words of `search_query`, in id order. Returns (rows, next_cursor); rows are
+# mappings with id, full_name, email, address and pincode.
+def search_users(search_query, limit, cursor=None):
+    if not has_user_search_index():
+        query = User.query.filter(
+            or_(User.full_name.ilike(f'%{search_query}%'), User.email.ilike(f'%{search_query}%')),
+            User.role != 'admin'
+        )
+        users, next_cursor = keyset_page(query, [User.id], limit, cursor)
+        return [_user_row(user) for user in users], next_cursor
+
+    if db.engine.dialect.name == 'postgresql':
+        match = _pg_match_query(search_query)
+        if not match:
+            return [], None
+        query = User.query.filter(
+            text(f"{PG_WORDS} @@ to_tsquery('simple'::regconfig, :match)").bindparams(match = match),
+            User.role != 'admin'
+        )
+        users, next_cursor = keyset_page(query, [User.id], limit, cursor)
+        return [_user_row(user) for user in users], next_cursor
+
+    match = match_query(search_query)
+    if not match:
+        return [], None
+
+    after = decode_cursor(cursor, [User.id])[0] if cursor else 0
+
+    # FTS5 walks matches in rowid order, so each page stops after limit + 1 rows
+    rows = db.session.execute(
+        text(
+            """
+            SELECT user.id, user.full_name, user.email, user.address, user.pincode
+            FROM user_fts
+            JOIN user ON user.id = user_fts.rowid
+            WHERE user_fts MATCH :match AND user_fts.rowid > :after AND user.role != 'admin'
+            ORDER BY user_fts.rowid
+            LIMIT :limit
+            """
+        ),
+        {'match': match, 'after': after, 'limit': limit + 1}
+    ).mappings().all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]['id']])
+
+    return [dict(row) for row in rows], next_cursor
+
+## Autocomplete Users
+# Ids and names of up to `limit` non-admin users whose name words (on
+# PostgreSQL and without an index: whose name) start with `prefix`, for
+# type-ahead. Like search_users it stops at the first matches.
+def autocomplete_users(prefix, limit=AUTOCOMPLETE_LIMIT):
+    if not has_user_search_index() or db.engine.dialect.name == 'postgresql':
+        # On PostgreSQL lower(full_name) LIKE 'prefix%' is answered from ix_user_full_name_prefix
+        users = (
+            db.session.query(User.id, User.full_name)
+            .filter(
+                func.lower(User.full_name).like(_prefix_pattern(prefix.lower()), escape = '\\'),
+                User.role != 'admin'
+            )
+            .order_by(User.id)
+            .limit(limit)
+            .all()
+        )
+        return [{'id': user_id, 'full_name': full_name} for user_id, full_name in users]
+
+    match = match_query(prefix)
+    if not match:
+        return []
+
+    rows = db.session.execute(
+        text(
+            """
+            SELECT user.id, user.full_name
+            FROM user_fts
+            JOIN user ON user.id = user_fts.rowid
+            WHERE user_fts MATCH :match AND user.role != 'admin'
+            ORDER BY user_fts.rowid
+            LIMIT :limit
+            """
+        ),
+        {'match': f'full_name : ({match})', 'limit': limit}
+    ).mappings().all()
+
+    return [dict(row) for row in rows]
+
+def _user_row(user):
+    return {
+        'id': user.id, 'full_name': user.full_name, 'email': user.email,
+        'address': user.address, 'pincode': user.pincode
+    }
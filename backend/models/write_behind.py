@@ -0,0 +1,506 @@
+# Write-behind mode for reservations (WRITE_BEHIND=true). /reserve and /release
+# are decided on the occupancy bitmaps and the in-memory reservation state,
+# appended to a local journal that is fsynced before the response (concurrent
+# requests share one fsync) and queued; a background thread applies the queue to
+# the reservation / parking_spot / parking_lot tables in one transaction every
+# WRITE_BEHIND_INTERVAL_MS. Journal entries the database has not seen (after a
+# crash) are replayed when the app starts serving again. An entry that cannot
+# be applied at all is moved to a dead-letter table so the ones behind it keep
+# flowing, and new reserves and releases are refused while the queue is full.
+# Reservation ids and the open reservations are tracked in this process, so the
+# mode needs a single app process; the journal is locked to enforce it.
+import atexit
+import json
+import logging
+import math
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import select, update, insert, func
+from sqlalchemy.exc import OperationalError
+from backend.models.table_models import db, ParkingLot, ParkingSpot, Reservation
+from backend.models.occupancy_bitmap import get_occupancy, forget_after_commit
+from backend.models.spot_allocator import shift_lot_counters
+from backend.models.rollups import bump_rollups, booking, completion
+from backend.models.metrics import inc
+
+try:
+    import fcntl
+except ImportError:             # Windows: the single-process lock is skipped
+    fcntl = None
+
+FLUSH_BATCH_SIZE = 1000         # journal entries per transaction
+MAX_QUEUE = 100000              # queued entries before reserves and releases are refused
+
+log = logging.getLogger(__name__)
+
+# Outcomes of a release
+RELEASED = 'released'
+NOT_FOUND = 'not_found'
+ALREADY_RELEASED = 'already_released'
+
+# Sequence number of the last journal entry applied to the database (one row)
+write_behind_checkpoint = db.Table(
+    'write_behind_checkpoint',
+    db.Column('id', db.Integer, primary_key = True),
+    db.Column('seq', db.Integer, nullable = False)
+)
+
+# Journal entries that could not be applied (e.g. no spot left for an
+# acknowledged reservation), kept for an operator to resolve
+write_behind_dead_letter = db.Table(
+    'write_behind_dead_letter',
+    db.Column('seq', db.Integer, primary_key = True),
+    db.Column('entry', db.Text, nullable = False),
+    db.Column('error', db.Text, nullable = False),
+    db.Column('failed_at', db.DateTime, nullable = False)
+)
+
+# Raised by reserve and release while MAX_QUEUE entries wait for the database
+class WriteBehindFull(Exception):
+    pass
+
+
+def _timestamp(value):
+    return value.isoformat()
+
+def _parse_time(value):
+    return datetime.fromisoformat(value)
+
+## Journal
+# Append-only file of JSON lines. Entries are written under the caller's lock and
+# made durable by sync(seq): whoever fsyncs first covers every entry written so
+# far, so requests arriving together share one fsync (group commit).
+class Journal:
+    def __init__(self, path, fsync = True):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True)
+        self.path = path
+        self.fsync = fsync
+        self.file = open(path, 'ab')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self.file.close()
+                raise RuntimeError(f'Write-behind journal {path} is in use by another process')
+
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.last_seq = 0
+        self.synced_seq = 0
+
+    # Entries of the file in order; a torn last line (crash mid-write) ends it
+    def read(self):
+        entries = []
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break
+        return entries
+
+    def append(self, entry):
+        line = json.dumps(entry, separators = (',', ':')).encode() + b'\n'
+        with self.lock:
+            self.file.write(line)
+            self.last_seq = entry['seq']
+
+    # Returns once the entry `seq` is on disk
+    def sync(self, seq):
+        with self.sync_lock:
+            if self.synced_seq >= seq:
+                return
+            with self.lock:
+                self.file.flush()
+                target = self.last_seq
+            if self.fsync:
+                os.fsync(self.file.fileno())
+            self.synced_seq = target
+
+    # Empties the file when every entry in it has reached the database
+    def truncate_through(self, seq):
+        with self.sync_lock, self.lock:
+            if self.last_seq == seq:
+                self.file.flush()
+                self.file.truncate(0)
+
+## Apply Entries
+# Writes journal entries to the tables in the current transaction, in order,
+# with one rollup upsert for the whole batch.
+# Returns the lots whose bitmaps must be rebuilt (a spot the bitmap handed out
+# was no longer free, e.g. the bitmap was rebuilt while the entry was queued).
+def apply_entries(entries):
+    stale_lots = set()
+    rollup_changes = []
+
+    for entry in entries:
+        if entry['op'] == 'reserve':
+            spot_id = db.session.execute(
+                update(ParkingSpot)
+                .where(ParkingSpot.lot_id == entry['lot_id'], ParkingSpot.spot_no == entry['spot_no'],
+                       ParkingSpot.status == 'A')
+                .values(status = 'O')
+                .returning(ParkingSpot.id)
+                .execution_options(synchronize_session = False)
+            ).scalar()
+
+            if spot_id is None:
+                # Any free spot of the lot keeps the acknowledged reservation
+                stale_lots.add(entry['lot_id'])
+                free_spot = (
+                    select(ParkingSpot.id)
+                    .where(ParkingSpot.lot_id == entry['lot_id'], ParkingSpot.status == 'A')
+                    .order_by(ParkingSpot.spot_no).limit(1).scalar_subquery()
+                )
+                spot_id = db.session.execute(
+                    update(ParkingSpot)
+                    .where(ParkingSpot.id == free_spot)
+                    .values(status = 'O')
+                    .returning(ParkingSpot.id)
+                    .execution_options(synchronize_session = False)
+                ).scalar()
+
+            # The reservation was acknowledged: fail the batch rather than drop it
+            # (flush then isolates the entry and dead-letters it)
+            if spot_id is None:
+                raise RuntimeError(f"No free spot for acknowledged write-behind reservation {entry}")
+
+            shift_lot_counters(entry['lot_id'], available=-1)
+            parking_time = _parse_time(entry['parking_time'])
+            db.session.execute(insert(Reservation).values(
+                id = entry['id'], spot_id = spot_id, user_id = entry['user_id'],
+                parking_time = parking_time, vehicle_no = entry['vehicle_no']
+            ))
+            rollup_changes.append(booking(entry['user_id'], entry['lot_id'], parking_time))
+
+        elif entry['op'] == 'release':
+            leaving_time = _parse_time(entry['leaving_time'])
+            closed = db.session.execute(
+                update(Reservation)
+                .where(Reservation.id == entry['id'], Reservation.leaving_time.is_(None))
+                .values(leaving_time = leaving_time, cost = entry['cost'])
+                .returning(Reservation.spot_id, Reservation.parking_time)
+                .execution_options(synchronize_session = False)
+            ).first()
+
+            if closed is None:
+                print("Error applying write-behind release: reservation not open", entry)
+                continue
+            spot_id = closed.spot_id
+            rollup_changes.append(completion(entry['user_id'], entry['lot_id'], closed.parking_time,
+                                             leaving_time, entry['cost']))
+
+            lot_id = db.session.execute(
+                update(ParkingSpot)
+                .where(ParkingSpot.id == spot_id, ParkingSpot.status == 'O')
+                .values(status = 'A')
+                .returning(ParkingSpot.lot_id)
+                .execution_options(synchronize_session = False)
+            ).scalar()
+            if lot_id is not None:
+                shift_lot_counters(lot_id, available=1)
+
+    bump_rollups(rollup_changes)
+    return stale_lots
+
+class WriteBehind:
+    def __init__(self, app, journal):
+        self.app = app
+        self.journal = journal
+        self.interval = app.config['WRITE_BEHIND_INTERVAL_MS'] / 1000
+        self.max_queue = app.config.get('WRITE_BEHIND_MAX_QUEUE') or MAX_QUEUE
+
+        self.lock = threading.RLock()           # state below and journal order
+        self.flush_lock = threading.RLock()     # one flush at a time (both reentrant for paused())
+        self.queue = []                         # entries not yet in the database
+        self.open_pending = {}                  # reservation id -> reserve entry, not yet inserted
+        self.closed_pending = set()             # reservation ids released, not yet updated
+        self.flushes = 0                        # bumped after every applied batch
+        self.seq = 0
+        self.next_id = 1
+        self.stopped = threading.Event()
+
+    # Queues the journal entries past the checkpoint and applies them, then picks
+    # up ids and numbering. Fails if the database cannot take them, so nothing is
+    # served from bitmaps that miss them.
+    def recover(self):
+        checkpoint = db.session.execute(select(write_behind_checkpoint.c.seq)).scalar()
+        if checkpoint is None:
+            checkpoint = 0
+            db.session.execute(insert(write_behind_checkpoint).values(id = 1, seq = 0))
+            db.session.commit()
+
+        entries = [entry for entry in self.journal.read() if entry['seq'] > checkpoint]
+        self.queue = entries
+        for entry in entries:
+            if entry['op'] == 'reserve':
+                self.open_pending[entry['id']] = entry
+            else:
+                self.closed_pending.add(entry['id'])
+
+        self.seq = max(checkpoint, entries[-1]['seq'] if entries else 0)
+        self.next_id = max([db.session.execute(select(func.max(Reservation.id))).scalar() or 0] +
+                           [entry['id'] for entry in entries if entry['op'] == 'reserve']) + 1
+        self.journal.last_seq = self.journal.synced_seq = self.seq
+
+        if entries:
+            self.drain()
+            if self.queue:
+                raise RuntimeError(f'Could not replay {len(self.queue)} write-behind journal entries')
+            get_occupancy().forget(list({entry['lot_id'] for entry in entries}))
+            log.info("Replayed %d write-behind journal entries", len(entries))
+        self.journal.truncate_through(self.seq)
+
+    def start(self):
+        threading.Thread(target = self._run, name = 'write-behind', daemon = True).start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.drain()
+
+    # Flushes what is queued and stops the flusher (at interpreter exit)
+    def stop(self):
+        self.stopped.set()
+        self.drain()
+
+    # Refuses new entries while the queue is full; called with self.lock held
+    def _check_room(self):
+        if len(self.queue) >= self.max_queue:
+            inc('write_behind_rejected_total')
+            raise WriteBehindFull(f'{len(self.queue)} write-behind entries are waiting for the database')
+
+    # Queues an entry; called with self.lock held. Returns its sequence number.
+    def _record(self, entry):
+        self.seq += 1
+        entry['seq'] = self.seq
+        self.journal.append(entry)
+        self.queue.append(entry)
+        return self.seq
+
+    ## Reserve
+    # Takes the lowest free spot of the lot on its bitmap and records the
+    # reservation. Returns the new reservation id, or None if the lot is full.
+    # Raises WriteBehindFull while the queue is full.
+    def reserve(self, user_id, lot_id, vehicle_no):
+        occupancy = get_occupancy()
+        with self.lock:
+            self._check_room()
+            spot_no = occupancy.claim(lot_id)
+            if spot_no is None:
+                return None
+
+            reservation_id = self.next_id
+            self.next_id += 1
+            entry = {
+                'op': 'reserve', 'id': reservation_id, 'user_id': user_id, 'lot_id': lot_id, 'spot_no': spot_no,
+                'vehicle_no': vehicle_no,
+                'parking_time': _timestamp(datetime.now(timezone.utc).replace(tzinfo = None))
+            }
+            seq = self._record(entry)
+            self.open_pending[reservation_id] = entry
+
+        self.journal.sync(seq)
+        return reservation_id
+
+    # (user_id, lot_id, spot_no, parking_time, released) of a reservation, or None
+    def _lookup(self, reservation_id):
+        entry = self.open_pending.get(reservation_id)
+        if entry is not None:
+            return entry['user_id'], entry['lot_id'], entry['spot_no'], _parse_time(entry['parking_time']), False
+
+        row = db.session.execute(
+            select(Reservation.user_id, ParkingSpot.lot_id, ParkingSpot.spot_no, Reservation.parking_time,
+                   Reservation.leaving_time)
+            .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+            .where(Reservation.id == reservation_id)
+        ).first()
+        if row is None:
+            return None
+        return row.user_id, row.lot_id, row.spot_no, row.parking_time, row.leaving_time is not None
+
+    ## Release
+    # Closes an open reservation of the user and frees its spot on the bitmap.
+    # Returns (outcome, cost, lot_id); cost and lot_id are None unless RELEASED.
+    # Raises WriteBehindFull while the queue is full.
+    def release(self, reservation_id, user_id):
+        while True:
+            # The database is read outside the lock; a batch applied meanwhile means reading again
+            with self.lock:
+                flushes = self.flushes
+            found = self._lookup(reservation_id)
+            if found is None or found[0] != user_id:
+                return NOT_FOUND, None, None
+            _, lot_id, spot_no, parking_time, released = found
+            price = db.session.execute(select(ParkingLot.price).where(ParkingLot.id == lot_id)).scalar()
+
+            # Started hours are charged, as in ReleaseSpot
+            leaving_time = datetime.now(timezone.utc).replace(tzinfo = None)
+            cost = math.ceil((leaving_time - parking_time).total_seconds() / 3600) * price
+
+            with self.lock:
+                if self.flushes != flushes:
+                    continue
+                if released or reservation_id in self.closed_pending:
+                    return ALREADY_RELEASED, None, None
+                self._check_room()
+
+                self.closed_pending.add(reservation_id)
+                get_occupancy().mark(lot_id, spot_no, taken=False)
+                seq = self._record({
+                    'op': 'release', 'id': reservation_id, 'user_id': user_id, 'lot_id': lot_id,
+                    'leaving_time': _timestamp(leaving_time), 'cost': cost
+                })
+                break
+
+        self.journal.sync(seq)
+        return RELEASED, cost, lot_id
+
+    ## Flush
+    # Applies up to FLUSH_BATCH_SIZE queued entries in one transaction and moves
+    # the checkpoint with them. Returns how many left the queue. While the
+    # database is locked or unreachable the batch stays queued for the next tick;
+    # an entry that cannot be applied at all is isolated by halving the batch and
+    # dead-lettered, so the entries behind it are not held up.
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                batch = self.queue[:FLUSH_BATCH_SIZE]
+            if not batch:
+                return 0
+
+            try:
+                batch = batch[:self._apply_isolating(batch)]
+            except Exception as e:
+                db.session.rollback()
+                log.warning("Error flushing write-behind journal, retrying: %s", e)
+                return 0
+
+            with self.lock:
+                del self.queue[:len(batch)]
+                for entry in batch:
+                    if entry['op'] == 'reserve':
+                        self.open_pending.pop(entry['id'], None)
+                    else:
+                        self.closed_pending.discard(entry['id'])
+                self.flushes += 1
+
+            self.journal.truncate_through(batch[-1]['seq'])
+            _invalidate(batch)
+            return len(batch)
+
+    # Applies the batch, or (after a failure other than the database being
+    # unavailable) its first half, recursively; a single failing entry is
+    # dead-lettered. Returns how many leading entries were handled.
+    def _apply_isolating(self, batch):
+        try:
+            for lot_id in apply_entries(batch):
+                forget_after_commit(lot_id)
+            db.session.execute(update(write_behind_checkpoint).values(seq = batch[-1]['seq']))
+            db.session.commit()
+            return len(batch)
+        except OperationalError:
+            raise
+        except Exception as e:
+            db.session.rollback()
+            if len(batch) > 1:
+                return self._apply_isolating(batch[:len(batch) // 2])
+            self._dead_letter(batch[0], e)
+            return 1
+
+    # Moves an entry that cannot be applied to the dead-letter table. Its lot's
+    # bitmap no longer matches the rows and is rebuilt.
+    def _dead_letter(self, entry, error):
+        db.session.execute(insert(write_behind_dead_letter).values(
+            seq = entry['seq'], entry = json.dumps(entry), error = str(error),
+            failed_at = datetime.now(timezone.utc).replace(tzinfo = None)
+        ))
+        forget_after_commit(entry['lot_id'])
+        db.session.execute(update(write_behind_checkpoint).values(seq = entry['seq']))
+        db.session.commit()
+
+        inc('write_behind_dead_letters_total', {'op': entry['op']})
+        log.error("Write-behind entry %s dead-lettered: %s", entry, error)
+
+    # Flushes until the queue is empty (or the database is unavailable). Runs in
+    # an app context of its own, whose session (Flask-SQLAlchemy scopes sessions
+    # per app context) is separate from the calling request's: whatever the
+    # request has staged is neither committed nor rolled back by the flush.
+    def drain(self):
+        with self.app.app_context():
+            while self.flush():
+                pass
+
+    def has_pending(self, user_id):
+        with self.lock:
+            return any(entry['user_id'] == user_id for entry in self.queue)
+
+# Cached views built on the rows just written
+def _invalidate(batch):
+    from backend.models.caching import invalidate_user, invalidate_lots
+    try:
+        for user_id in {entry['user_id'] for entry in batch}:
+            invalidate_user(user_id)
+        invalidate_lots()
+    except Exception as e:
+        print("Error invalidating cache after write-behind flush: ", e)
+
+def write_behind_enabled():
+    return bool(current_app.config.get('WRITE_BEHIND'))
+
+_start_lock = threading.Lock()
+
+# The app's write-behind state; the first call replays the journal and starts the flusher
+def get_write_behind():
+    write_behind = current_app.extensions.get('write_behind')
+    if write_behind is None:
+        app = current_app._get_current_object()
+        with _start_lock:
+            write_behind = app.extensions.get('write_behind')
+            if write_behind is None:
+                path = app.config.get('WRITE_BEHIND_JOURNAL') or os.path.join(app.instance_path, 'write_behind.journal')
+                write_behind = WriteBehind(app, Journal(path, app.config['WRITE_BEHIND_FSYNC']))
+                with app.app_context():
+                    write_behind.recover()
+                write_behind.start()
+                app.extensions['write_behind'] = write_behind
+    return write_behind
+
+# Applies what is queued before code that reads or rewrites the rows directly:
+# everything (lot edits and deletes, the consistency repair), or only when
+# `user_id` has queued changes (the user's own reservation views). No-op unless enabled.
+def drain_write_behind(user_id = None):
+    if not write_behind_enabled():
+        return
+    write_behind = get_write_behind()
+    if user_id is None or write_behind.has_pending(user_id):
+        write_behind.drain()
+
+## Write-Behind Paused
+# Applies everything queued and holds new reserves and releases until the
+# block (or decorated function) ends, for code that removes free spot rows: a
+# reservation queued in between would find its spot gone. No-op unless enabled.
+@contextmanager
+def write_behind_paused():
+    if not write_behind_enabled():
+        yield
+        return
+    write_behind = get_write_behind()
+    with write_behind.flush_lock, write_behind.lock:
+        write_behind.drain()
+        yield
+
+## Write-Behind Setup
+# With WRITE_BEHIND on, the web process starts write-behind on its first
+# request, so the journal is replayed before anything is served. Processes that
+# never serve requests (Celery workers, the reloader parent) leave it alone.
+def init_write_behind(app):
+    if not app.config.get('WRITE_BEHIND'):
+        return
+
+    @app.before_request
+    def _start_write_behind():
+        get_write_behind()
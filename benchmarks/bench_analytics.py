@@ -0,0 +1,90 @@
+# Benchmark: lot report and hourly occupancy timeline over a date range, row by
+# row in Python over Reservation objects vs the vectorized NumPy analytics, on a
+# generated database. Checks that both agree.
+#
+#   python -m benchmarks.bench_analytics --scale 1m --days 30 365
+import argparse
+import time
+from collections import defaultdict
+from datetime import timedelta
+import numpy as np
+from sqlalchemy.orm import joinedload
+from backend.models.table_models import db, ParkingLot, ParkingSpot, Reservation
+from backend.models.analytics import parse_range, lot_report, occupancy_timeline, load_intervals, _utc
+from benchmarks.common import make_app, generated_database
+
+
+# Row-by-row version of lot_report's bookings/revenue/occupied figures and the hourly timeline
+def row_by_row(start_s, end_s):
+    start, end = _utc(start_s), _utc(end_s)
+    now = _utc(time.time())
+    reservations = (
+        Reservation.query
+        .options(joinedload(Reservation.spot))
+        .filter(Reservation.parking_time < end)
+        .filter((Reservation.leaving_time.is_(None)) | (Reservation.leaving_time > start))
+        .all()
+    )
+
+    bookings, revenue, occupied = defaultdict(int), defaultdict(float), defaultdict(float)
+    timeline = defaultdict(lambda: defaultdict(float))
+    for reservation in reservations:
+        lot_id = reservation.spot.lot_id
+        leaving = reservation.leaving_time or now
+        if start <= reservation.parking_time < end:
+            bookings[lot_id] += 1
+            if reservation.leaving_time:
+                revenue[lot_id] += reservation.cost or 0
+
+        begin, finish = max(reservation.parking_time, start), min(leaving, end)
+        occupied[lot_id] += max(0, (finish - begin).total_seconds())
+
+        hour = begin.replace(minute=0, second=0, microsecond=0)
+        while hour < finish:
+            following = hour + timedelta(hours=1)
+            overlap = (min(finish, following) - max(begin, hour)).total_seconds()
+            timeline[lot_id][int((hour - start).total_seconds() // 3600)] += overlap / 3600
+            hour = following
+
+    return bookings, revenue, occupied, timeline
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', default='100k')
+    parser.add_argument('--db', help='existing database generated by benchmarks.datagen')
+    parser.add_argument('--days', type=int, nargs='+', default=[30, 365])
+    args = parser.parse_args()
+
+    app = make_app(args.db or generated_database(args.scale))
+    with app.app_context():
+        print(f"{'days':>5} {'rows':>9} {'row-by-row ms':>14} {'load ms':>9} {'report ms':>10} {'timeline ms':>12} bucket")
+        for days in args.days:
+            end = time.strftime('%Y-%m-%d', time.gmtime())
+            start = time.strftime('%Y-%m-%d', time.gmtime(time.time() - (days - 1) * 86400))
+            start_s, end_s = parse_range(start, end)
+
+            (bookings, revenue, occupied, timeline), slow_ms = timed(lambda: row_by_row(start_s, end_s))
+            intervals, load_ms = timed(lambda: load_intervals(start_s, end_s))
+            report, report_ms = timed(lambda: lot_report(start_s, end_s))
+            bucket = 'hour' if days <= 31 else 'day'
+            hourly, timeline_ms = timed(lambda: occupancy_timeline(start_s, end_s, bucket))
+
+            # Both ways agree (timeline compared as a whole; floats are rounded in the response)
+            for lot in report['lots']:
+                assert lot['bookings'] == bookings.get(lot['lot_id'], 0)
+                assert abs(lot['revenue'] - revenue.get(lot['lot_id'], 0)) < 0.01
+            slow_total = sum(sum(hours.values()) for hours in timeline.values())
+            fast_total = sum(sum(lot['occupied']) for lot in hourly['lots']) * hourly['bucket_seconds'] / 3600
+            assert abs(slow_total - fast_total) / max(slow_total, 1) < 1e-3, (slow_total, fast_total)
+
+            print(f"{days:>5} {len(intervals['start']):>9} {slow_ms:>14.1f} {load_ms:>9.1f} "
+                  f"{report_ms:>10.1f} {timeline_ms:>12.1f} {bucket}")
+
+
+if __name__ == '__main__':
+    main()
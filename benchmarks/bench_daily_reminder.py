@@ -0,0 +1,91 @@
+# Benchmark: "users without a booking today" as a Python id list fed into NOT IN
+# (old send_daily_reminder) vs the NOT EXISTS recipient stream in
+# backend/models/reminders.py. Checks the streamed recipients against the seeded
+# ground truth, including reservations just outside the day and admin accounts.
+#
+#   python -m benchmarks.bench_daily_reminder --users 10000 100000 --booked 0.6
+import argparse
+import random
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert, func
+from sqlalchemy.exc import OperationalError
+from backend.models.table_models import db, User, ParkingLot, ParkingSpot, Reservation
+from backend.models.reminders import day_bounds, reminder_recipients
+from benchmarks.common import make_app, time_call
+
+DAY = date(2025, 8, 1)
+
+
+# Returns the ids of non-admin users with no reservation on DAY
+def seed(users, booked_share, seed_value=7):
+    rng = random.Random(seed_value)
+    lot = ParkingLot(prime_location='Lot', price=10, address='a', pincode='1', total_spots=100, available_spots=100)
+    db.session.add(lot)
+    db.session.flush()
+    db.session.execute(insert(ParkingSpot), [{'lot_id': lot.id, 'status': 'A'}] * 100)
+
+    db.session.execute(insert(User), [
+        {'email': f'user{n}@example.com', 'password_hash': 'x', 'full_name': f'User {n}', 'address': 'a',
+         'pincode': '1', 'role': 'admin' if n % 1000 == 0 else 'user'}
+        for n in range(1, users + 1)
+    ])
+
+    start, end = day_bounds(DAY)
+    missed = set()
+    reservations = []
+    for user_id in range(1, users + 1):
+        if rng.random() < booked_share:
+            parked = start + timedelta(seconds=rng.randint(0, 86399))
+            reservations.append({'spot_id': rng.randint(1, 100), 'user_id': user_id, 'parking_time': parked,
+                                 'vehicle_no': 'KA01'})
+        else:
+            # Bookings just outside the day must not count
+            edge = rng.choice([start - timedelta(seconds=1), end])
+            reservations.append({'spot_id': rng.randint(1, 100), 'user_id': user_id, 'parking_time': edge,
+                                 'vehicle_no': 'KA01'})
+            if user_id % 1000:
+                missed.add(user_id)
+
+    db.session.execute(insert(Reservation), reservations)
+    db.session.commit()
+    return missed
+
+# Old implementation: booked ids pulled into Python, then NOT IN (...) with one parameter each
+def missed_old():
+    booked = [uid for (uid,) in db.session.query(Reservation.user_id)
+              .filter(func.date(Reservation.parking_time) == DAY).distinct().all()]
+    return {user.id for user in User.query.filter(~User.id.in_(booked)).all() if user.role == 'user'}
+
+def missed_new():
+    start, end = day_bounds(DAY)
+    return {row.id for batch in reminder_recipients(start, end) for row in batch}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--booked', type=float, default=0.6)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'users':>8} {'missed':>8} {'old ms':>10} {'new ms':>8}")
+    for users in args.users:
+        app = make_app()
+        with app.app_context():
+            expected = seed(users, args.booked)
+            assert missed_new() == expected, 'streamed recipients disagree with the seeded data'
+
+            try:
+                assert missed_old() == expected
+                old = f"{time_call(missed_old, args.repeat)['median_ms']:.1f}"
+            except OperationalError as e:
+                db.session.rollback()
+                old = 'error'
+                print(f"old query failed: {e.orig}")
+
+            new = time_call(missed_new, args.repeat)['median_ms']
+
+        print(f"{users:>8} {len(expected):>8} {old:>10} {new:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
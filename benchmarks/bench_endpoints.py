@@ -0,0 +1,159 @@
+# Micro-benchmarks of every API helper in backend/app.py, through the Flask test
+# client, and of each Celery task (run eagerly), on a generated database. Reports
+# latency percentiles and the SQL statements per call (X-SQL-Statements) and
+# saves the run as JSON for benchmarks.compare.
+#
+#   python -m benchmarks.bench_endpoints --scale 100k
+#   python -m benchmarks.bench_endpoints --db /tmp/parking-100k.db --repeat 50
+import argparse
+import contextlib
+import io
+import random
+import time
+from benchmarks.common import summarize, save_results, load_app, generated_database
+
+
+def _login(client, email, password):
+    response = client.post('/login', json={'email': email, 'password': password})
+    return {'Authorization': f"Bearer {response.json['access_token']}"}
+
+def _statements_run():
+    from backend.models.metrics import samples
+    return sum(value for key, value in samples().items() if key.startswith('sql_statements_total'))
+
+class Runner:
+    def __init__(self, client, repeat):
+        self.client = client
+        self.repeat = repeat
+        self.results = {}
+
+    # Times `call` `repeat` times, after an untimed `setup`. Statements per call come
+    # from X-SQL-Statements when `call` returns a response, else from the SQL
+    # counters. Output printed by the call (task logging) is swallowed.
+    def measure(self, name, call, repeat=None, setup=None):
+        samples, statements, errors = [], None, 0
+        for _ in range(repeat or self.repeat):
+            if setup:
+                setup()
+            before = _statements_run()
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                response = call()
+                samples.append((time.perf_counter() - start) * 1000)
+
+            if response is None:
+                statements = int(_statements_run() - before)
+            else:
+                if response.status_code >= 400:
+                    errors += 1
+                statements = int(response.headers.get('X-SQL-Statements', 0))
+
+        self.results[name] = {**summarize(samples), 'sql_statements': statements, 'errors': errors}
+        result = self.results[name]
+        print(f"{name:<42} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9} "
+              f"{statements:>6} {errors:>6}")
+
+def run_endpoints(runner, client, admin, user, context):
+    rng = random.Random(1)
+    lot_ids, lot_id, spot_no = context['lot_ids'], context['lot_id'], context['spot_no']
+
+    # Reads the whole body, so streamed responses are timed to their last byte
+    def get(url, headers):
+        def call():
+            response = client.get(url, headers=headers)
+            response.get_data()
+            response.close()
+            return response
+        return call
+
+    runner.measure('GET /lots', get('/lots', user))
+    runner.measure('GET /admin/parking_lots', get('/admin/parking_lots', admin))
+    runner.measure('GET /admin/registered_users', get('/admin/registered_users', admin))
+    runner.measure('GET /admin/summary', get('/admin/summary', admin))
+    runner.measure('GET /user/summary', get('/user/summary', user))
+    runner.measure('GET /my_reservations', get('/my_reservations', user))
+    runner.measure('GET /search_lots', get('/search_lots?search_query=metro', user))
+    runner.measure('GET /search_lots (rare)', get('/search_lots?search_query=banjara%20stadium', user))
+    runner.measure('GET /admin/search', get('/admin/search?search_query=kulk', admin))
+    runner.measure('GET /admin/users/autocomplete', get('/admin/users/autocomplete?q=pri', admin))
+    runner.measure('GET /lots/nearby', get('/lots/nearby?lat=12.97&lng=77.59', user))
+    runner.measure('GET /admin/lot_map/<lot_id>', get(f'/admin/lot_map/{lot_id}', admin))
+    runner.measure('GET /admin/spot/<spot_no>/<lot_id>', get(f'/admin/spot/{spot_no}/{lot_id}', admin))
+    runner.measure('GET /export_parking_csv/download', get('/export_parking_csv/download', user))
+
+    # Reserve, then release what was reserved
+    reservation_ids = []
+    def reserve():
+        response = client.post('/reserve', json={'lot_id': rng.choice(lot_ids), 'vehicle_no': 'KA01B1234'}, headers=user)
+        if response.status_code == 201:
+            reservation_ids.append(response.json['reservation_id'])
+        return response
+    runner.measure('POST /reserve', reserve)
+
+    pending = list(reservation_ids)
+    runner.measure('POST /release/<id>', lambda: client.post(f'/release/{pending.pop()}', headers=user),
+                   repeat=len(pending))
+
+def run_tasks(runner, app, user_id, task_repeat):
+    from tasks.reminder_tasks import celery_app, send_daily_reminder, send_monthly_user_report, \
+        export_user_parking_history
+    from backend.models.table_models import db, ReportDelivery
+
+    celery_app.conf.update(task_always_eager=True, task_eager_propagates=True, result_backend='cache+memory://')
+
+    # Deliveries are recorded; clear them so every run sends the whole month again
+    def clear_deliveries():
+        with app.app_context():
+            db.session.query(ReportDelivery).delete()
+            db.session.commit()
+
+    runner.measure('task send_daily_reminder', lambda: send_daily_reminder.delay() and None, repeat=task_repeat)
+    runner.measure('task send_monthly_user_report', lambda: send_monthly_user_report.delay() and None,
+                   repeat=task_repeat, setup=clear_deliveries)
+    runner.measure('task export_user_parking_history', lambda: export_user_parking_history.delay(user_id) and None,
+                   repeat=task_repeat)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', default='10k', help='datagen scale when --db is not given')
+    parser.add_argument('--db', help='existing database generated by benchmarks.datagen')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--task-repeat', type=int, default=3)
+    parser.add_argument('--output', help='JSON file (default: benchmarks/results/endpoints-<scale>-<revision>.json)')
+    args = parser.parse_args()
+
+    db_path = args.db or generated_database(args.scale)
+
+    app = load_app(db_path)
+    from sqlalchemy import func
+    from backend.models.table_models import db, User, ParkingLot, ParkingSpot, Reservation
+    from benchmarks.datagen import DATAGEN_PASSWORD
+
+    with app.app_context():
+        # The user with the longest history, a busy lot and one of its spots
+        user_id, = db.session.query(Reservation.user_id).group_by(Reservation.user_id)\
+            .order_by(func.count().desc()).first()
+        email = db.session.get(User, user_id).email
+        lot_ids = [lot_id for lot_id, in db.session.query(ParkingLot.id).filter(ParkingLot.available_spots > 0)]
+        lot_id = db.session.query(ParkingLot.id).order_by(ParkingLot.total_spots.desc()).first()[0]
+        spot_no = db.session.query(func.max(ParkingSpot.spot_no)).filter(ParkingSpot.lot_id == lot_id).scalar()
+        counts = {model.__tablename__: db.session.query(func.count(model.id)).scalar()
+                  for model in (User, ParkingLot, ParkingSpot, Reservation)}
+
+    client = app.test_client()
+    admin = _login(client, 'admin@gmail.com', 'admin123')
+    user = _login(client, email, DATAGEN_PASSWORD)
+
+    runner = Runner(client, args.repeat)
+    print(counts)
+    print(f"{'case':<42} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'sql':>6} {'errors':>6}")
+    run_endpoints(runner, client, admin, user, {'lot_ids': lot_ids, 'lot_id': lot_id, 'spot_no': spot_no})
+    run_tasks(runner, app, user_id, args.task_repeat)
+
+    scale = args.scale if args.db is None else str(counts['reservation'])
+    path = save_results(f'endpoints-{scale}', runner.results, {'counts': counts, 'repeat': args.repeat}, args.output)
+    print(f"Saved {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# Benchmark: parking history export built in one io.StringIO from ORM objects (old
+# export_user_parking_history) vs the streamed export in backend/models/history_export.py.
+# Reports wall time, peak Python memory (tracemalloc) and output size.
+#
+#   python -m benchmarks.bench_history_export --rows 100000 1000000
+import argparse
+import csv
+import io
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload
+from backend.models.table_models import db, User, ParkingLot, ParkingSpot, Reservation
+from backend.models.history_export import HEADER, spooled_export
+from benchmarks.common import make_app
+
+START = datetime(2020, 1, 1)
+
+
+def seed(rows, spots=200):
+    db.session.add(User(email='fleet@example.com', password_hash='x', full_name='Fleet', address='a', pincode='1'))
+    lot = ParkingLot(prime_location='Depot', price=10, address='Ring Road', pincode='560001',
+                     total_spots=spots, available_spots=spots)
+    db.session.add(lot)
+    db.session.flush()
+    db.session.execute(insert(ParkingSpot), [{'lot_id': lot.id, 'status': 'A'}] * spots)
+
+    batch = []
+    for n in range(rows):
+        parked = START + timedelta(minutes=3 * n)
+        batch.append({'spot_id': n % spots + 1, 'user_id': 1, 'parking_time': parked,
+                      'leaving_time': parked + timedelta(minutes=95), 'cost': 40, 'vehicle_no': 'KA01'})
+        if len(batch) == 50000:
+            db.session.execute(insert(Reservation), batch)
+            batch = []
+
+    if batch:
+        db.session.execute(insert(Reservation), batch)
+    db.session.commit()
+
+# Old implementation: every reservation loaded as an ORM object, CSV built in memory
+def export_stringio(user_id):
+    reservations = (
+        Reservation.query
+        .filter_by(user_id=user_id)
+        .options(joinedload(Reservation.spot).joinedload(ParkingSpot.lot))
+        .order_by(Reservation.parking_time.desc())
+        .all()
+    )
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(HEADER)
+    for r in reservations:
+        writer.writerow([
+            r.id, r.spot.id, r.parking_time.strftime('%Y-%m-%d %H:%M'),
+            r.leaving_time.strftime('%Y-%m-%d %H:%M') if r.leaving_time else '-',
+            (r.leaving_time - r.parking_time).total_seconds() // 60 if r.leaving_time else '-',
+            r.cost, r.spot.lot.prime_location
+        ])
+    return len(output.getvalue().encode())
+
+# Size of the spooled export; the spool is not read back into memory
+def export_spooled(user_id, compress):
+    with spooled_export(user_id, compress) as spool:
+        return spool.seek(0, io.SEEK_END)
+
+# fn returns the output size in bytes. Returns (seconds, peak MiB, output bytes)
+def measure(fn):
+    db.session.expunge_all()
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024), size
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'variant':>10} {'seconds':>8} {'peak MiB':>9} {'output MiB':>11}")
+    for rows in args.rows:
+        app = make_app()
+        with app.app_context():
+            seed(rows)
+            variants = [
+                ('stringio', lambda: export_stringio(1)),
+                ('spooled', lambda: export_spooled(1, False)),
+                ('gzip', lambda: export_spooled(1, True)),
+            ]
+            for name, fn in variants:
+                elapsed, peak, size = measure(fn)
+                print(f"{rows:>9} {name:>10} {elapsed:>8.2f} {peak:>9.1f} {size / (1024 * 1024):>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
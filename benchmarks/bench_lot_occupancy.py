@@ -0,0 +1,68 @@
+# Benchmark: per-lot COUNT queries (old GetAllLots) vs one grouped COUNT query
+# (lots_with_occupancy with the memory engine) vs the occupancy bitmaps (its Redis
+# and write-behind path, bitmaps already loaded)
+#
+#   python -m benchmarks.bench_lot_occupancy --lots 10 100 500 1000
+import argparse
+import random
+from sqlalchemy import insert
+from backend.models.table_models import db, ParkingLot, ParkingSpot
+from backend.models.occupancy import lots_with_occupancy, check_occupancy_consistency
+from backend.models.occupancy_bitmap import get_occupancy
+from benchmarks.common import make_app, time_call
+
+
+# Fills the database with `lot_count` lots of `spots_per_lot` spots each
+def seed(lot_count, spots_per_lot, seed_value=42):
+    rng = random.Random(seed_value)
+    for i in range(lot_count):
+        lot = ParkingLot(prime_location=f'Lot {i}', price=10, address=f'Street {i}', pincode='560001',
+                         total_spots=spots_per_lot, available_spots=spots_per_lot)
+        db.session.add(lot)
+        db.session.flush()
+
+        rows = [{'lot_id': lot.id, 'spot_no': n, 'status': 'O' if rng.random() < 0.3 else 'A'}
+                for n in range(1, spots_per_lot + 1)]
+        db.session.execute(insert(ParkingSpot), rows)
+        lot.available_spots = sum(1 for row in rows if row['status'] == 'A')
+
+    db.session.commit()
+
+# Old implementation: one COUNT per lot
+def n_plus_one():
+    for lot in ParkingLot.query.all():
+        ParkingSpot.query.filter_by(lot_id=lot.id, status='A').count()
+
+# Spot rows counted per lot in one query
+def grouped():
+    lots_with_occupancy()
+
+# Free spots counted on the bitmaps
+def bitmaps():
+    lots = ParkingLot.query.order_by(ParkingLot.id).all()
+    get_occupancy().free_counts([lot.id for lot in lots])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lots', type=int, nargs='+', default=[10, 100, 500, 1000])
+    parser.add_argument('--spots', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'lots':>6} {'n+1 median ms':>15} {'grouped median ms':>18} {'bitmap median ms':>17}")
+    for lot_count in args.lots:
+        app = make_app()
+        with app.app_context():
+            seed(lot_count, args.spots)
+            assert not check_occupancy_consistency(), 'seeded counters disagree with spot rows'
+
+            old = time_call(n_plus_one, args.repeat)
+            new = time_call(grouped, args.repeat)
+            bitmaps()
+            bitmap = time_call(bitmaps, args.repeat)
+
+        print(f"{lot_count:>6} {old['median_ms']:>15} {new['median_ms']:>18} {bitmap['median_ms']:>17}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# Benchmark: creating a lot's spots one ORM object at a time (old CreateParkingLot)
+# vs the batched inserts in backend/models/spot_provisioning.py
+#
+#   python -m benchmarks.bench_lot_provisioning --sizes 100 1000 10000 50000
+import argparse
+import time
+from backend.models.table_models import db, ParkingLot, ParkingSpot
+from backend.models.occupancy import check_occupancy_consistency
+from backend.models.spot_provisioning import add_spots, resize_lot
+from benchmarks.common import make_app
+
+
+def new_lot(size):
+    lot = ParkingLot(prime_location='Garage', price=10, address='Ring Road', pincode='560001',
+                     total_spots=size, available_spots=size)
+    db.session.add(lot)
+    db.session.flush()
+    return lot
+
+# Old implementation: one ParkingSpot instance per spot
+def create_orm_loop(size):
+    lot = new_lot(size)
+    for _ in range(size):
+        db.session.add(ParkingSpot(lot_id=lot.id, status='A'))
+    db.session.commit()
+
+def create_bulk(size):
+    lot = new_lot(size)
+    add_spots(lot.id, size)
+    db.session.commit()
+    return lot.id
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 50000])
+    args = parser.parse_args()
+
+    print(f"{'spots':>7} {'orm loop ms':>12} {'bulk ms':>9} {'grow x2 ms':>11} {'shrink /2 ms':>13}")
+    for size in args.sizes:
+        app = make_app()
+        with app.app_context():
+            loop_ms, _ = timed(create_orm_loop, size)
+            bulk_ms, lot_id = timed(create_bulk, size)
+
+            lot = db.session.get(ParkingLot, lot_id)
+            grow_ms, _ = timed(lambda: (resize_lot(lot, size * 2), db.session.commit()))
+            lot = db.session.get(ParkingLot, lot_id)
+            shrink_ms, _ = timed(lambda: (resize_lot(lot, size // 2), db.session.commit()))
+
+            assert not check_occupancy_consistency(), 'counters disagree with spot rows after resize'
+
+        print(f"{size:>7} {loop_ms:>12.1f} {bulk_ms:>9.1f} {grow_ms:>11.1f} {shrink_ms:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
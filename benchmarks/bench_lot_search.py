@@ -0,0 +1,57 @@
+# Benchmark: lot search with three ILIKE '%q%' filters (old SearchLots, full table
+# scan) vs the FTS5 index in backend/models/lot_search.py, as the lot count grows.
+#
+#   python -m benchmarks.bench_lot_search --lots 1000 10000 100000
+import argparse
+import random
+from sqlalchemy import insert, or_
+from backend.models.table_models import db, ParkingLot
+from backend.models.migrations import upgrade_schema
+from backend.models.lot_search import search_lots
+from benchmarks.common import make_app, time_call
+
+AREAS = ['Indiranagar', 'Koramangala', 'Whitefield', 'Jayanagar', 'Malleshwaram', 'Hebbal', 'Yelahanka',
+         'Marathahalli', 'Banashankari', 'Electronic City', 'Rajajinagar', 'Basavanagudi']
+KINDS = ['Metro', 'Mall', 'Market', 'Tech Park', 'Stadium', 'Hospital', 'Station', 'Plaza']
+ROADS = ['MG Road', 'Brigade Road', 'Ring Road', 'Hosur Road', 'Old Airport Road', 'Bellary Road']
+QUERIES = ['kora', 'tech park', '5600', 'whitefield metro', 'hosur']
+
+
+def seed(lots, seed_value=3):
+    rng = random.Random(seed_value)
+    db.session.execute(insert(ParkingLot), [
+        {'prime_location': f'{rng.choice(AREAS)} {rng.choice(KINDS)} {n}', 'price': 10,
+         'address': f'{rng.randint(1, 999)} {rng.choice(ROADS)}', 'pincode': f'560{rng.randint(0, 999):03d}',
+         'total_spots': 10, 'available_spots': 10}
+        for n in range(lots)
+    ])
+    db.session.commit()
+
+# Old implementation
+def search_like(search_query):
+    return ParkingLot.query.filter(or_(
+        ParkingLot.prime_location.ilike(f'%{search_query}%'),
+        ParkingLot.address.ilike(f'%{search_query}%'),
+        ParkingLot.pincode.ilike(f'%{search_query}%')
+    )).all()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lots', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'lots':>8} {'query':>18} {'ilike ms':>9} {'fts ms':>8} {'fts hits':>9}")
+    for lots in args.lots:
+        app = make_app()
+        with app.app_context():
+            upgrade_schema(db.engine)
+            seed(lots)
+            for query in QUERIES:
+                like = time_call(lambda: search_like(query), args.repeat)['median_ms']
+                fts = time_call(lambda: search_lots(query), args.repeat)['median_ms']
+                print(f"{lots:>8} {query:>18} {like:>9} {fts:>8} {len(search_lots(query)):>9}")
+
+
+if __name__ == '__main__':
+    main()
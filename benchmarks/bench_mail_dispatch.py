@@ -0,0 +1,133 @@
+# Checks and times tasks/mail_dispatch.send_messages against a local SMTP
+# stand-in (the standard library's smtpd, Python 3.11 or older): one connection
+# per chunk with the configured chunk sizes, reconnect with backoff after a
+# dropped connection, giving up after the retries, per-message failures for a
+# refused recipient or an invalid message, and throughput by chunk size.
+#
+#   python -m benchmarks.bench_mail_dispatch --messages 300
+import argparse
+import os
+import tempfile
+import threading
+import time
+import warnings
+from benchmarks.common import load_app
+
+with warnings.catch_warnings():
+    warnings.simplefilter('ignore', DeprecationWarning)
+    import asyncore
+    import smtpd
+
+
+# Refuses recipients containing 'refuse' at RCPT (a permanent, per-message
+# failure) and drops the connection at DATA while the server has drops left
+# (a transient failure)
+class StandInChannel(smtpd.SMTPChannel):
+    def smtp_RCPT(self, arg):
+        if arg and 'refuse' in arg:
+            self.push('550 5.1.1 No such user')
+            return
+        super().smtp_RCPT(arg)
+
+    def smtp_DATA(self, arg):
+        if self.smtp_server.drops > 0:
+            self.smtp_server.drops -= 1
+            self.close()
+            return
+        super().smtp_DATA(arg)
+
+# Counts the messages received on each connection (the client uses one at a time)
+class StandInServer(smtpd.SMTPServer):
+    channel_class = StandInChannel
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), None, decode_data = True)
+        self.port = self.socket.getsockname()[1]
+        self.connections = []
+        self.drops = 0
+
+    def handle_accepted(self, conn, addr):
+        self.connections.append(0)
+        super().handle_accepted(conn, addr)
+
+    def process_message(self, peer, mailfrom, rcpttos, data, **kwargs):
+        self.connections[-1] += 1
+
+    def reset(self, drops = 0):
+        self.connections = []
+        self.drops = drops
+
+def messages(count, refused = ()):
+    from flask_mail import Message
+    return [
+        Message(subject = 'Bench', recipients = ['refuse@example.com' if n in refused else f'user{n}@example.com'],
+                body = f'Message {n}')
+        for n in range(count)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type = int, default = 300)
+    args = parser.parse_args()
+
+    server = StandInServer()
+    threading.Thread(target = asyncore.loop, kwargs = {'timeout': 0.01}, daemon = True).start()
+
+    app = load_app(os.path.join(tempfile.mkdtemp(prefix = 'parking-bench-'), 'mail.db'))
+    from backend.models import mail
+    from flask_mail import Message
+    from tasks.mail_dispatch import send_messages
+    app.config.update(MAIL_SERVER = '127.0.0.1', MAIL_PORT = server.port, MAIL_USE_TLS = False, MAIL_USE_SSL = False,
+                      MAIL_USERNAME = None, MAIL_PASSWORD = None, MAIL_SUPPRESS_SEND = False)
+    mail.init_app(app)
+
+    with app.app_context():
+        # One connection per chunk, chunks of batch_size
+        sent_to = []
+        server.reset()
+        totals = send_messages(messages(250), batch_size = 100,
+                               on_sent = lambda message: sent_to.append(message.recipients[0]))
+        assert totals == {'sent': 250, 'failed': 0}, totals
+        assert server.connections == [100, 100, 50], server.connections
+        assert len(sent_to) == 250
+        print('chunks: 250 messages in chunks of 100 ->', server.connections)
+
+        # A dropped connection is reopened after the backoff and the rest of the chunk resent
+        server.reset(drops = 2)
+        start = time.perf_counter()
+        totals = send_messages(messages(10), batch_size = 100, max_retries = 3, backoff = 0.05)
+        elapsed = time.perf_counter() - start
+        assert totals == {'sent': 10, 'failed': 0}, totals
+        assert server.connections == [0, 0, 10], server.connections
+        assert elapsed >= 0.05 + 0.1, elapsed
+        print(f'retry: 2 dropped connections, 10 sent after {elapsed * 1000:.0f} ms of backoff ->', server.connections)
+
+        # Retries run out: the rest of the chunk counts as failed
+        server.reset(drops = 10)
+        totals = send_messages(messages(10), batch_size = 100, max_retries = 2, backoff = 0.01)
+        assert totals == {'sent': 0, 'failed': 10}, totals
+        assert len(server.connections) == 3, server.connections
+        print('give up: 3 connections dropped ->', totals)
+
+        # Refused recipients and invalid messages fail alone; the connection goes on
+        server.reset()
+        batch = messages(5, refused = {1, 3}) + [Message(subject = 'Bench', recipients = [], body = 'none')]
+        totals = send_messages(batch, batch_size = 100)
+        assert totals == {'sent': 3, 'failed': 3}, totals
+        assert server.connections == [3], server.connections
+        print('permanent: 2 refused recipients, 1 message without recipients ->', totals)
+
+        # Throughput by chunk size (one connection per message vs pooled)
+        print(f"{'chunk size':>10} {'messages':>9} {'connections':>12} {'ms':>9} {'msg/s':>8}")
+        for batch_size in (1, 10, 100):
+            server.reset()
+            start = time.perf_counter()
+            totals = send_messages(messages(args.messages), batch_size = batch_size)
+            elapsed = time.perf_counter() - start
+            assert totals['sent'] == args.messages, totals
+            print(f'{batch_size:>10} {args.messages:>9} {len(server.connections):>12} '
+                  f'{elapsed * 1000:>9.1f} {args.messages / elapsed:>8.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# Benchmark: k-nearest lots with free spots via the R*Tree in backend/models/geo.py
+# vs a brute-force scan of every lot. Lots are clustered around cities with some
+# scattered in between; a share of them is full. Free spots are counted from the
+# spot rows like the app does, so each lot gets SPOTS_PER_LOT of them. Results are
+# checked against the brute force for every query point.
+#
+#   python -m benchmarks.bench_nearby_lots --lots 50000 --queries 200 --k 10
+import argparse
+import random
+import statistics
+import time
+from sqlalchemy import insert
+from backend.models.table_models import db, ParkingLot, ParkingSpot
+from backend.models.migrations import upgrade_schema
+from backend.models.geo import nearest_available_lots, haversine_km, MAX_RADIUS_KM
+from benchmarks.common import make_app
+
+CITIES = [(12.97, 77.59), (19.08, 72.88), (28.61, 77.21), (13.08, 80.27), (17.39, 78.49),
+          (22.57, 88.36), (18.52, 73.86), (23.02, 72.57), (26.91, 75.79), (9.93, 76.27)]
+SPOTS_PER_LOT = 4
+
+
+def _point(rng):
+    if rng.random() < 0.8:
+        lat, lng = rng.choice(CITIES)
+        return lat + rng.gauss(0, 0.08), lng + rng.gauss(0, 0.08)
+    return rng.uniform(8, 30), rng.uniform(70, 90)
+
+def seed(lots, full_share=0.3, seed_value=11):
+    rng = random.Random(seed_value)
+    rows, spots = [], []
+    for n in range(lots):
+        lat, lng = _point(rng)
+        available = 0 if rng.random() < full_share else rng.randint(1, SPOTS_PER_LOT)
+        rows.append({'id': n + 1, 'prime_location': f'Lot {n}', 'price': 10, 'address': 'a', 'pincode': '1',
+                     'total_spots': SPOTS_PER_LOT, 'available_spots': available, 'latitude': lat, 'longitude': lng})
+        spots.extend({'lot_id': n + 1, 'spot_no': spot_no, 'status': 'A' if spot_no <= available else 'O'}
+                     for spot_no in range(1, SPOTS_PER_LOT + 1))
+    for start in range(0, lots, 10000):
+        db.session.execute(insert(ParkingLot), rows[start:start + 10000])
+    for start in range(0, len(spots), 50000):
+        db.session.execute(insert(ParkingSpot), spots[start:start + 50000])
+    db.session.commit()
+
+# Old-style alternative: every lot with free spots read and sorted in Python
+def nearest_brute_force(lat, lng, k):
+    lots = db.session.query(ParkingLot.id, ParkingLot.latitude, ParkingLot.longitude)\
+        .filter(ParkingLot.available_spots > 0, ParkingLot.latitude.is_not(None)).all()
+    distances = sorted((round(haversine_km(lat, lng, a, b), 3), lot_id) for lot_id, a, b in lots)
+    return [(d, lot_id) for d, lot_id in distances if d <= MAX_RADIUS_KM][:k]
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lots', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    app = make_app()
+    rng = random.Random(99)
+    with app.app_context():
+        upgrade_schema(db.engine)
+        seed(args.lots)
+
+        rtree_ms, brute_ms = [], []
+        for _ in range(args.queries):
+            lat, lng = _point(rng)
+            elapsed, nearest = _timed(lambda: nearest_available_lots(lat, lng, args.k))
+            rtree_ms.append(elapsed)
+            elapsed, expected = _timed(lambda: nearest_brute_force(lat, lng, args.k))
+            brute_ms.append(elapsed)
+            assert [(lot['distance_km'], lot['id']) for lot in nearest] == expected, (lat, lng)
+
+    def summary(samples):
+        samples = sorted(samples)
+        return f"{statistics.median(samples):>8.2f} {samples[int(len(samples) * 0.95) - 1]:>8.2f}"
+
+    print(f"{args.lots} lots, k={args.k}, {args.queries} queries (results match brute force)")
+    print(f"{'variant':>12} {'p50 ms':>8} {'p95 ms':>8}")
+    print(f"{'rtree':>12} {summary(rtree_ms)}")
+    print(f"{'brute force':>12} {summary(brute_ms)}")
+
+
+if __name__ == '__main__':
+    main()
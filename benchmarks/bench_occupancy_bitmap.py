@@ -0,0 +1,70 @@
+# Benchmark: free-spot count and free-spot lookup for one lot on the spot rows
+# (COUNT / indexed SELECT, as before) vs the lot's occupancy bitmap, plus the
+# bitmap's size. Lots fill from the low spot numbers, so the first free spot is
+# deep in the lot.
+#
+#   python -m benchmarks.bench_occupancy_bitmap --spots 1000 10000 50000 --occupied 0.9
+import argparse
+from sqlalchemy import select, update, func
+from backend.models.table_models import db, ParkingLot, ParkingSpot
+from backend.models.migrations import upgrade_schema
+from backend.models.spot_provisioning import add_spots
+from backend.models.occupancy_bitmap import get_occupancy, first_clear_bit, count_clear_bits
+from benchmarks.common import make_app, time_call
+
+
+def seed(spots, occupied_share):
+    lot = ParkingLot(prime_location='Mall', price=10, address='a', pincode='1', total_spots=spots, available_spots=spots)
+    db.session.add(lot)
+    db.session.flush()
+    add_spots(lot.id, spots)
+    db.session.execute(
+        update(ParkingSpot)
+        .where(ParkingSpot.lot_id == lot.id, ParkingSpot.spot_no <= int(spots * occupied_share))
+        .values(status = 'O')
+    )
+    db.session.commit()
+    return lot.id
+
+def count_rows(lot_id):
+    return db.session.execute(
+        select(func.count()).where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A')
+    ).scalar()
+
+def first_free_row(lot_id):
+    return db.session.execute(
+        select(ParkingSpot.id).where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A')
+        .order_by(ParkingSpot.id).limit(1)
+    ).scalar()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--spots', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--occupied', type=float, default=0.9)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'spots':>7} {'count rows ms':>14} {'count bitmap ms':>16} {'find row ms':>12} "
+          f"{'find bitmap ms':>15} {'load ms':>8} {'bitmap bytes':>13}")
+    for spots in args.spots:
+        app = make_app()
+        with app.app_context():
+            upgrade_schema(db.engine)
+            lot_id = seed(spots, args.occupied)
+            occupancy = get_occupancy()
+
+            load = time_call(lambda: (occupancy.forget([lot_id]), occupancy.free_counts([lot_id])), 5)
+            bitmap = occupancy.bitmaps[lot_id]
+            assert count_clear_bits(bitmap) == count_rows(lot_id)
+
+            count_sql = time_call(lambda: count_rows(lot_id), args.repeat)
+            count_bitmap = time_call(lambda: occupancy.free_counts([lot_id]), args.repeat)
+            find_sql = time_call(lambda: first_free_row(lot_id), args.repeat)
+            find_bitmap = time_call(lambda: first_clear_bit(bitmap), args.repeat)
+
+        print(f"{spots:>7} {count_sql['median_ms']:>14} {count_bitmap['median_ms']:>16} {find_sql['median_ms']:>12} "
+              f"{find_bitmap['median_ms']:>15} {load['median_ms']:>8} {len(bitmap):>13}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# Load test: thousands of clients connected to /events/occupancy on a threaded
+# werkzeug server, all receiving the same stream of lot events. Reports connect
+# time, publish (fan-out) cost, end-to-end delivery latency and lost events.
+#
+#   python -m benchmarks.bench_occupancy_stream --clients 1000 3000 --events 50 --rate 10
+import argparse
+import json
+import os
+import selectors
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+# The app module configures itself from the environment on import
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='parking-bench-'), 'bench.db')
+os.environ['CACHE_TYPE'] = 'SimpleCache'
+os.environ['EVENT_BROKER'] = 'memory'
+os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret-key-benchmark-secret-key')
+os.environ.setdefault('APP_SECRET_KEY', 'benchmark-app-secret')
+
+from werkzeug.serving import make_server, ThreadedWSGIServer
+from flask_jwt_extended import create_access_token
+from backend.app import app
+from backend.models.table_models import db, User
+from backend.models.occupancy_events import get_broker
+
+
+class Client:
+    def __init__(self, port, token):
+        self.sock = socket.create_connection(('127.0.0.1', port))
+        self.sock.setblocking(False)
+        self.sock.sendall(
+            f'GET /events/occupancy HTTP/1.0\r\nHost: localhost\r\nAuthorization: Bearer {token}\r\n\r\n'.encode()
+        )
+        self.buffer = b''
+        self.headers_done = False
+        self.snapshot = False
+        self.latencies = {}
+
+    # Parses complete events out of the buffer
+    def feed(self, data, now):
+        self.buffer += data
+        if not self.headers_done:
+            head, sep, rest = self.buffer.partition(b'\r\n\r\n')
+            if not sep:
+                return
+            self.headers_done, self.buffer = True, rest
+
+        *events, self.buffer = self.buffer.split(b'\n\n')
+        for raw in events:
+            fields = dict(line.split(': ', 1) for line in raw.decode().split('\n') if ': ' in line)
+            if fields.get('event') == 'snapshot':
+                self.snapshot = True
+            elif fields.get('event') == 'lot':
+                payload = json.loads(fields['data'])
+                self.latencies[payload['seq']] = (now - payload['sent_at']) * 1000
+
+# Reads from every client socket until `stop` is set
+def pump(clients, stop):
+    selector = selectors.DefaultSelector()
+    for client in clients:
+        selector.register(client.sock, selectors.EVENT_READ, client)
+    while not stop.is_set():
+        for key, _ in selector.select(timeout=0.05):
+            try:
+                data = key.fileobj.recv(65536)
+            except BlockingIOError:
+                continue
+            if data:
+                key.data.feed(data, time.time())
+            else:
+                selector.unregister(key.fileobj)
+
+def percentile(samples, share):
+    return samples[min(len(samples) - 1, int(len(samples) * share))]
+
+def run(server_port, token, clients_count, events, rate):
+    start = time.perf_counter()
+    clients = [Client(server_port, token) for _ in range(clients_count)]
+    stop = threading.Event()
+    reader = threading.Thread(target=pump, args=(clients, stop), daemon=True)
+    reader.start()
+
+    while not all(client.snapshot for client in clients):
+        time.sleep(0.05)
+    connect_s = time.perf_counter() - start
+
+    publish_ms = []
+    with app.app_context():
+        broker = get_broker()
+        for seq in range(events):
+            began = time.perf_counter()
+            broker.publish('lot', {'id': 0, 'available_spots': seq, 'seq': seq, 'sent_at': time.time()})
+            publish_ms.append((time.perf_counter() - began) * 1000)
+            time.sleep(1 / rate)
+
+    deadline = time.time() + 10
+    while time.time() < deadline and any(len(client.latencies) < events for client in clients):
+        time.sleep(0.1)
+    stop.set()
+    reader.join()
+
+    latencies = sorted(ms for client in clients for ms in client.latencies.values())
+    lost = clients_count * events - len(latencies)
+    for client in clients:
+        client.sock.close()
+
+    print(f"{clients_count:>8} {connect_s:>10.2f} {statistics.median(publish_ms):>11.2f} "
+          f"{percentile(latencies, 0.5):>8.1f} {percentile(latencies, 0.95):>8.1f} "
+          f"{percentile(latencies, 0.99):>8.1f} {lost:>6}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, nargs='+', default=[1000, 3000])
+    parser.add_argument('--events', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=10, help='events per second')
+    args = parser.parse_args()
+
+    with app.app_context():
+        user = User(email='stream@example.com', full_name='Stream', address='a', pincode='1', role='user')
+        user.hash_password('x')
+        db.session.add(user)
+        db.session.commit()
+        token = create_access_token(identity=str(user.id), additional_claims={'role': user.role})
+
+    ThreadedWSGIServer.request_queue_size = 4096
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"{'clients':>8} {'connect s':>10} {'publish ms':>11} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'lost':>6}")
+    for clients_count in args.clients:
+        run(server.server_port, token, clients_count, args.events, args.rate)
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# Benchmark: monthly user report, admin revenue per lot and user summary computed
+# from the reservations (previous reports.py queries) vs read from the daily
+# rollups, on a generated database. Also times the full backfill and the
+# nightly 3-day reconcile. Checks that both ways agree.
+#
+#   python -m benchmarks.bench_rollups --scale 1m
+import argparse
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, case
+from backend.models.table_models import db, User, ParkingLot, ParkingSpot, Reservation
+from backend.models.reports import user_summary, revenue_by_lot, monthly_user_activity
+from backend.models.rollups import reconcile_rollups
+from benchmarks.common import make_app, generated_database, time_call
+
+
+# Previous implementations, aggregating the reservations on every call
+def revenue_by_lot_raw():
+    return (
+        db.session.query(ParkingLot.id, ParkingLot.prime_location,
+                         func.coalesce(func.sum(Reservation.cost), 0), func.count(Reservation.id))
+        .outerjoin(ParkingSpot, ParkingSpot.lot_id == ParkingLot.id)
+        .outerjoin(Reservation, (Reservation.spot_id == ParkingSpot.id) & Reservation.leaving_time.is_not(None))
+        .group_by(ParkingLot.id, ParkingLot.prime_location)
+        .order_by(ParkingLot.id)
+        .all()
+    )
+
+def monthly_user_activity_raw(start, end):
+    per_lot = (
+        db.session.query(Reservation.user_id.label('user_id'), ParkingSpot.lot_id.label('lot_id'),
+                         func.count(Reservation.id).label('bookings'),
+                         func.coalesce(func.sum(Reservation.cost), 0).label('spent'))
+        .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+        .filter(Reservation.parking_time >= start, Reservation.parking_time < end)
+        .group_by(Reservation.user_id, ParkingSpot.lot_id)
+        .subquery()
+    )
+    ranked = db.session.query(
+        per_lot.c.user_id, per_lot.c.lot_id,
+        func.sum(per_lot.c.bookings).over(partition_by=per_lot.c.user_id).label('total_bookings'),
+        func.sum(per_lot.c.spent).over(partition_by=per_lot.c.user_id).label('total_spent'),
+        func.row_number().over(partition_by=per_lot.c.user_id,
+                               order_by=(per_lot.c.bookings.desc(), per_lot.c.lot_id)).label('rank')
+    ).subquery()
+    return (
+        db.session.query(User.id, ranked.c.total_bookings, ranked.c.total_spent, ParkingLot.prime_location)
+        .join(ranked, ranked.c.user_id == User.id)
+        .join(ParkingLot, ParkingLot.id == ranked.c.lot_id)
+        .filter(ranked.c.rank == 1, User.role != 'admin')
+        .order_by(User.id)
+        .all()
+    )
+
+def user_summary_raw(user_id):
+    return db.session.query(
+        func.coalesce(func.sum(case((Reservation.leaving_time.is_(None), 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Reservation.leaving_time.is_not(None), 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Reservation.leaving_time.is_not(None), Reservation.cost), else_=0)), 0)
+    ).filter(Reservation.user_id == user_id).one()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', default='100k')
+    parser.add_argument('--db', help='existing database generated by benchmarks.datagen')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    app = make_app(args.db or generated_database(args.scale))
+    with app.app_context():
+        backfill = time_call(reconcile_rollups, 1)
+        nightly = time_call(lambda: reconcile_rollups(3), args.repeat)
+        assert reconcile_rollups()['drift'] == 0
+
+        month_end = datetime.now(timezone.utc).replace(tzinfo=None, day=1, hour=0, minute=0, second=0, microsecond=0)
+        month_start = (month_end - timedelta(days=1)).replace(day=1)
+        busiest = db.session.query(Reservation.user_id).group_by(Reservation.user_id) \
+            .order_by(func.count().desc()).limit(1).scalar()
+
+        # Both ways agree
+        assert [tuple(row) for row in revenue_by_lot_raw()] == \
+            [(lot['lot_id'], lot['lot_name'], lot['revenue'], lot['completed_reservations']) for lot in revenue_by_lot()]
+        assert [tuple(row) for row in monthly_user_activity_raw(month_start, month_end)] == \
+            [(row['user_id'], row['total_bookings'], row['total_spent'], row['most_used_lot'])
+             for row in monthly_user_activity(month_start, month_end)]
+        assert tuple(user_summary_raw(busiest)) == tuple(user_summary(busiest).values())
+
+        cases = {
+            'revenue_by_lot': (revenue_by_lot_raw, revenue_by_lot),
+            'monthly_user_activity': (lambda: monthly_user_activity_raw(month_start, month_end),
+                                      lambda: monthly_user_activity(month_start, month_end)),
+            'user_summary (busiest user)': (lambda: user_summary_raw(busiest), lambda: user_summary(busiest)),
+        }
+        print(f"{'query':<30} {'reservations ms':>16} {'rollups ms':>11}")
+        for name, (raw, rolled) in cases.items():
+            print(f"{name:<30} {time_call(raw, args.repeat)['median_ms']:>16} {time_call(rolled, args.repeat)['median_ms']:>11}")
+        print(f"{'backfill (all history)':<30} {backfill['median_ms']:>16}")
+        print(f"{'reconcile (last 3 days)':<30} {nightly['median_ms']:>16}")
+
+
+if __name__ == '__main__':
+    main()
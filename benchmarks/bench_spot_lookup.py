@@ -0,0 +1,79 @@
+# Benchmark: spot lookup by number in one big lot — the old GetSpotData (every
+# spot of the lot loaded, indexed in Python) vs the (lot_id, spot_no) index —
+# and the lot map as one JSON object per spot vs the RLE / bitmap encodings.
+#
+#   python -m benchmarks.bench_spot_lookup --spots 10000 50000
+import argparse
+import json
+import random
+from sqlalchemy import update
+from backend.models.table_models import db, ParkingLot, ParkingSpot
+from backend.models.migrations import upgrade_schema
+from backend.models.spot_provisioning import add_spots
+from backend.models.lot_map import lot_map
+from benchmarks.common import make_app, time_call
+
+
+def seed(spots, occupied_share=0.6, seed_value=3):
+    lot = ParkingLot(prime_location='Stadium', price=10, address='a', pincode='1',
+                     total_spots=spots, available_spots=spots)
+    db.session.add(lot)
+    db.session.flush()
+    add_spots(lot.id, spots)
+
+    # Occupancy in runs, like a lot filling up from the entrance with some churn
+    rng = random.Random(seed_value)
+    occupied = [n for n in range(1, spots + 1) if rng.random() < occupied_share * (1.5 - n / spots)]
+    for start in range(0, len(occupied), 5000):
+        db.session.execute(
+            update(ParkingSpot)
+            .where(ParkingSpot.lot_id == lot.id, ParkingSpot.spot_no.in_(occupied[start:start + 5000]))
+            .values(status = 'O')
+        )
+    db.session.commit()
+    return lot.id
+
+# Old implementation
+def spot_by_position(lot_id, spot_no):
+    spots = ParkingSpot.query.filter_by(lot_id=lot_id).order_by(ParkingSpot.id).all()
+    return spots[spot_no - 1]
+
+def spot_by_number(lot_id, spot_no):
+    return ParkingSpot.query.filter_by(lot_id=lot_id, spot_no=spot_no).first()
+
+# What a per-spot JSON grid would cost
+def map_as_objects(lot_id):
+    spots = ParkingSpot.query.filter_by(lot_id=lot_id).order_by(ParkingSpot.spot_no).all()
+    return json.dumps([{'spot_id': spot.id, 'spot_no': spot.spot_no, 'status': spot.status} for spot in spots])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--spots', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'spots':>7} {'variant':>16} {'median ms':>10} {'bytes':>9}")
+    for spots in args.spots:
+        app = make_app()
+        with app.app_context():
+            upgrade_schema(db.engine)
+            lot_id = seed(spots)
+            spot_no = spots * 3 // 4
+            assert spot_by_position(lot_id, spot_no).id == spot_by_number(lot_id, spot_no).id
+            db.session.remove()
+
+            rows = [
+                ('lookup all', lambda: spot_by_position(lot_id, spot_no), None),
+                ('lookup indexed', lambda: spot_by_number(lot_id, spot_no), None),
+                ('map objects', lambda: map_as_objects(lot_id), map_as_objects(lot_id)),
+                ('map rle', lambda: json.dumps(lot_map(lot_id)), json.dumps(lot_map(lot_id))),
+                ('map bitmap', lambda: json.dumps(lot_map(lot_id, 'bitmap')), json.dumps(lot_map(lot_id, 'bitmap'))),
+            ]
+            for name, fn, body in rows:
+                median = time_call(lambda: (fn(), db.session.remove()), args.repeat)['median_ms']
+                size = len(body) if body else '-'
+                print(f"{spots:>7} {name:>16} {median:>10} {size:>9}")
+
+
+if __name__ == '__main__':
+    main()
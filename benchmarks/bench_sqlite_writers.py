@@ -0,0 +1,135 @@
+# Benchmark: concurrent reserve/release writers plus summary readers in separate
+# processes (like Flask workers and Celery tasks sharing one SQLite file), with the
+# previous default connection settings vs backend/models/storage.py (WAL + pragmas).
+# Reports committed writes/s, reads/s and the share of operations that failed with
+# "database is locked".
+#
+#   python -m benchmarks.bench_sqlite_writers --writers 8 --readers 4 --seconds 10
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from backend.models.table_models import db, ParkingLot, ParkingSpot, Reservation
+from backend.models.spot_provisioning import add_spots
+from backend.models.spot_allocator import claim_spot, free_spot, close_reservation
+from backend.models.occupancy import lots_with_occupancy
+from backend.models.reports import revenue_by_lot
+from backend.models.storage import apply_sqlite_pragmas
+from benchmarks.common import make_app
+
+LOTS = 20
+SPOTS = 50
+
+
+def seed(db_path, history=50000):
+    app = make_app(db_path)
+    with app.app_context():
+        for i in range(LOTS):
+            lot = ParkingLot(prime_location=f'Lot {i}', price=10, address='a', pincode='1',
+                             total_spots=SPOTS, available_spots=SPOTS)
+            db.session.add(lot)
+            db.session.flush()
+            add_spots(lot.id, SPOTS)
+
+        # Closed history so the readers' aggregates take a realistic amount of time
+        db.session.execute(insert(Reservation), [
+            {'spot_id': n % (LOTS * SPOTS) + 1, 'user_id': n % 500 + 1, 'parking_time': datetime(2024, 1, 1),
+             'leaving_time': datetime(2024, 1, 1, 2), 'cost': 20, 'vehicle_no': 'KA01'}
+            for n in range(history)
+        ])
+        db.session.commit()
+
+def _app(db_path, tuned):
+    app = make_app(db_path)
+    if tuned:
+        with app.app_context():
+            db.engine.dispose()
+            apply_sqlite_pragmas(db.engine)
+    return app
+
+# Worker process: runs `role` operations until `deadline`, returns (ok, locked)
+def worker(db_path, tuned, role, deadline, seed_value, results):
+    app = _app(db_path, tuned)
+    rng = random.Random(seed_value)
+    ok = locked = 0
+
+    with app.app_context():
+        while time.time() < deadline:
+            try:
+                if role == 'writer':
+                    lot_id = rng.randint(1, LOTS)
+                    spot_id = claim_spot(lot_id)
+                    if not spot_id:
+                        db.session.rollback()
+                        continue
+                    reservation = Reservation(user_id=1, spot_id=spot_id, parking_time=datetime.utcnow(), vehicle_no='KA01')
+                    db.session.add(reservation)
+                    db.session.commit()
+
+                    close_reservation(reservation.id, datetime.utcnow(), 10)
+                    free_spot(spot_id, lot_id)
+                    db.session.commit()
+                else:
+                    revenue_by_lot()
+                    lots_with_occupancy()
+                    db.session.rollback()
+                ok += 1
+            except OperationalError as e:
+                db.session.rollback()
+                if 'locked' not in str(e.orig):
+                    raise
+                locked += 1
+
+    results.put((role, ok, locked))
+
+def run(tuned, writers, readers, seconds):
+    db_path = os.path.join(tempfile.mkdtemp(prefix='parking-bench-'), 'bench.db')
+    seed(db_path)
+    if tuned:
+        # journal_mode=WAL is stored in the file; switch it once before the workers start
+        _app(db_path, True)
+
+    results = multiprocessing.Queue()
+    deadline = time.time() + 2 + seconds
+    roles = ['writer'] * writers + ['reader'] * readers
+    processes = [
+        multiprocessing.Process(target=worker, args=(db_path, tuned, role, deadline, n, results))
+        for n, role in enumerate(roles)
+    ]
+    for process in processes:
+        process.start()
+    totals = {'writer': [0, 0], 'reader': [0, 0]}
+    for _ in processes:
+        role, ok, locked = results.get()
+        totals[role][0] += ok
+        totals[role][1] += locked
+    for process in processes:
+        process.join()
+
+    # Workers spend up to 2 s starting up; throughput is measured over `seconds`
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'writes/s':>9} {'reads/s':>8} {'write locked %':>15} {'read locked %':>14}")
+    for name, tuned in (('default', False), ('wal', True)):
+        totals = run(tuned, args.writers, args.readers, args.seconds)
+        rates = []
+        for role in ('writer', 'reader'):
+            ok, locked = totals[role]
+            rates.append((ok / args.seconds, 100 * locked / max(ok + locked, 1)))
+        print(f"{name:>8} {rates[0][0]:>9.1f} {rates[1][0]:>8.1f} {rates[0][1]:>15.2f} {rates[1][1]:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# Benchmark: admin/user summaries computed by loading reservations into Python
+# (old GetAdminSummary/GetUserSummary) vs backend/models/reports.py (daily rollups)
+#
+#   python -m benchmarks.bench_summaries --reservations 10000 100000 500000
+import argparse
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from backend.models.table_models import db, ParkingLot, ParkingSpot, Reservation
+from backend.models.reports import user_summary, revenue_by_lot
+from backend.models.rollups import rebuild_rollups
+from benchmarks.common import make_app, time_call
+
+START = datetime(2024, 1, 1)
+
+
+def seed(reservations, lots=20, spots=100, users=1000, seed_value=42):
+    rng = random.Random(seed_value)
+    for i in range(lots):
+        lot = ParkingLot(prime_location=f'Lot {i}', price=10 + i, address='Ring Road', pincode='560001',
+                         total_spots=spots, available_spots=spots)
+        db.session.add(lot)
+        db.session.flush()
+        db.session.execute(insert(ParkingSpot), [{'lot_id': lot.id, 'status': 'A'}] * spots)
+
+    batch = []
+    for n in range(reservations):
+        parked = START + timedelta(minutes=n)
+        closed = rng.random() < 0.95
+        batch.append({
+            'spot_id': rng.randint(1, lots * spots),
+            'user_id': rng.randint(1, users),
+            'parking_time': parked,
+            'leaving_time': parked + timedelta(hours=2) if closed else None,
+            'cost': rng.randint(10, 200) if closed else None,
+            'vehicle_no': 'KA01'
+        })
+        if len(batch) == 10000:
+            db.session.execute(insert(Reservation), batch)
+            batch = []
+
+    if batch:
+        db.session.execute(insert(Reservation), batch)
+    rebuild_rollups(db.session.connection())
+    db.session.commit()
+
+# Old implementations: every reservation row materialized in Python
+def admin_revenue_python():
+    return sum(res.cost for res in Reservation.query.all() if res.leaving_time)
+
+def user_summary_python(user_id):
+    reservations = Reservation.query.filter_by(user_id=user_id).all()
+    return sum(res.cost for res in reservations if res.leaving_time)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reservations', type=int, nargs='+', default=[10000, 100000, 500000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'reservations':>12} {'admin py ms':>12} {'admin sql ms':>13} {'user py ms':>11} {'user sql ms':>12}")
+    for count in args.reservations:
+        app = make_app()
+        with app.app_context():
+            seed(count)
+            sql_total = sum(lot['revenue'] for lot in revenue_by_lot())
+            assert sql_total == admin_revenue_python(), 'SQL revenue disagrees with the Python sum'
+
+            admin_py = time_call(admin_revenue_python, args.repeat)
+            admin_sql = time_call(revenue_by_lot, args.repeat)
+            user_py = time_call(lambda: user_summary_python(7), args.repeat)
+            user_sql = time_call(lambda: user_summary(7), args.repeat)
+
+        print(f"{count:>12} {admin_py['median_ms']:>12} {admin_sql['median_ms']:>13} "
+              f"{user_py['median_ms']:>11} {user_sql['median_ms']:>12}")
+
+
+if __name__ == '__main__':
+    main()
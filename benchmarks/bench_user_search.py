@@ -0,0 +1,63 @@
+# Benchmark: admin user search as ILIKE '%q%' on full_name (old SearchUsers) vs
+# the FTS5 index in backend/models/user_search.py, first page of 50, plus the
+# autocomplete lookup. Common prefixes stop early either way; rare names show
+# the full scan.
+#
+#   python -m benchmarks.bench_user_search --users 100000 500000
+import argparse
+import random
+from sqlalchemy import insert
+from backend.models.table_models import db, User
+from backend.models.migrations import upgrade_schema
+from backend.models.pagination import keyset_page
+from backend.models.user_search import search_users, autocomplete_users
+from benchmarks.common import make_app, time_call
+
+FIRST = ['Aarav', 'Vivaan', 'Aditya', 'Ananya', 'Diya', 'Ishaan', 'Kavya', 'Meera', 'Rohan', 'Saanvi',
+         'Arjun', 'Priya', 'Rahul', 'Sneha', 'Vikram', 'Neha', 'Karthik', 'Pooja', 'Siddharth', 'Lakshmi']
+LAST = ['Sharma', 'Iyer', 'Reddy', 'Nair', 'Gupta', 'Kumar', 'Rao', 'Patel', 'Menon', 'Singh',
+        'Das', 'Joshi', 'Pillai', 'Shetty', 'Hegde', 'Bhat', 'Kulkarni', 'Naidu', 'Verma', 'Chopra']
+# Common first-name prefix, surname prefix, one rare name, the shared email domain
+QUERIES = ['ar', 'kulk', 'zubin', 'example']
+
+
+def seed(users, seed_value=5):
+    rng = random.Random(seed_value)
+    rows = []
+    for n in range(users):
+        first, last = rng.choice(FIRST), rng.choice(LAST)
+        rows.append({'email': f'{first.lower()}.{last.lower()}{n}@example.com', 'password_hash': 'x',
+                     'full_name': f'{first} {last}', 'address': 'a', 'pincode': '1',
+                     'role': 'admin' if n % 10000 == 0 else 'user'})
+    rows[users // 2 + 1]['full_name'] = 'Zubin Mehta'
+    for start in range(0, users, 50000):
+        db.session.execute(insert(User), rows[start:start + 50000])
+    db.session.commit()
+
+# Old implementation
+def search_like(search_query):
+    query = User.query.filter(User.full_name.ilike(f'%{search_query}%'), User.role != 'admin')
+    return keyset_page(query, [User.id], 50)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, nargs='+', default=[100000, 500000])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'users':>8} {'query':>8} {'ilike ms':>9} {'fts ms':>8} {'autocomplete ms':>16} {'hits':>5}")
+    for users in args.users:
+        app = make_app()
+        with app.app_context():
+            upgrade_schema(db.engine)
+            seed(users)
+            for query in QUERIES:
+                like = time_call(lambda: search_like(query), args.repeat)['median_ms']
+                fts = time_call(lambda: search_users(query, 50), args.repeat)['median_ms']
+                suggest = time_call(lambda: autocomplete_users(query), args.repeat)['median_ms']
+                hits = len(search_users(query, 50)[0])
+                print(f"{users:>8} {query:>8} {like:>9} {fts:>8} {suggest:>16} {hits:>5}")
+
+
+if __name__ == '__main__':
+    main()
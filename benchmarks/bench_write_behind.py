@@ -0,0 +1,62 @@
+# Benchmark: reserve/release throughput with a commit per request (SQLite
+# synchronous=NORMAL, the default, and FULL, which fsyncs every commit) vs
+# write-behind (journal fsynced per group of requests, tables written in group
+# commits). Each mode runs benchmarks.load_reserve in its own process on a copy
+# of the same generated database.
+#
+#   python -m benchmarks.bench_write_behind --scale 10k --threads 16 --duration 10
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from benchmarks.common import generated_database, save_results
+
+MODES = {
+    'commit (synchronous=NORMAL)': {'SQLITE_SYNCHRONOUS': 'NORMAL'},
+    'commit (synchronous=FULL)': {'SQLITE_SYNCHRONOUS': 'FULL'},
+    'write-behind': {'SQLITE_SYNCHRONOUS': 'NORMAL', 'WRITE_BEHIND': 'true'},
+}
+
+
+def run_mode(name, env_overrides, source_db, args, workdir):
+    db_path = os.path.join(workdir, f'{len(os.listdir(workdir))}.db')
+    shutil.copy(source_db, db_path)
+    output = db_path + '.json'
+    env = {**os.environ, 'WRITE_BEHIND': 'false', 'WRITE_BEHIND_JOURNAL': db_path + '.journal',
+           'WRITE_BEHIND_INTERVAL_MS': str(args.interval), **env_overrides}
+
+    subprocess.run([sys.executable, '-m', 'benchmarks.load_reserve', '--db', db_path, '--threads', str(args.threads),
+                    '--duration', str(args.duration), '--output', output], env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    with open(output) as f:
+        return json.load(f)['results']
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', default='10k')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--interval', type=int, default=5, help='WRITE_BEHIND_INTERVAL_MS')
+    args = parser.parse_args()
+
+    source_db = generated_database(args.scale)
+    workdir = tempfile.mkdtemp(prefix='parking-write-behind-')
+
+    results = {}
+    print(f"{'mode':<30} {'ops/s':>8} {'reserve p50':>12} {'reserve p99':>12} {'release p50':>12} {'release p99':>12}")
+    for name, env_overrides in MODES.items():
+        result = run_mode(name, env_overrides, source_db, args, workdir)
+        results[name] = result
+        print(f"{name:<30} {result['throughput']['ops_per_s']:>8} {result['reserve']['p50_ms']:>12} "
+              f"{result['reserve']['p99_ms']:>12} {result['release']['p50_ms']:>12} {result['release']['p99_ms']:>12}")
+
+    path = save_results('write_behind', results, {'scale': args.scale, 'threads': args.threads,
+                                                  'duration': args.duration, 'interval_ms': args.interval})
+    print(f"Saved {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# Shared helpers for the benchmark scripts: throwaway app/database, the real app
+# on a generated database, timing summaries and JSON results
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from flask import Flask
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+# Creates a Flask app bound to a fresh SQLite database in a temp directory
+def make_app(db_path=None, engine_options=None):
+    from backend.models.table_models import db
+
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='parking-bench-'), 'bench.db')
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if engine_options:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+
+    return app
+
+# Runs fn `repeat` times and returns timing stats in milliseconds
+def time_call(fn, repeat=20):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    samples.sort()
+    return {
+        'min_ms': round(samples[0], 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'max_ms': round(samples[-1], 3)
+    }
+
+# p50/p95/p99 and friends (ms) of a list of samples in milliseconds
+def summarize(samples_ms):
+    samples = sorted(samples_ms)
+    if not samples:
+        return {'count': 0}
+
+    def at(share):
+        return round(samples[min(len(samples) - 1, int(len(samples) * share))], 3)
+
+    return {
+        'count': len(samples),
+        'min_ms': round(samples[0], 3),
+        'p50_ms': at(0.50),
+        'p95_ms': at(0.95),
+        'p99_ms': at(0.99),
+        'max_ms': round(samples[-1], 3),
+        'mean_ms': round(statistics.fmean(samples), 3)
+    }
+
+# Short hash of the checked-out commit ('+dirty' with local changes), or 'unknown'
+def git_revision():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True).stdout.strip()
+        return revision + ('+dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+## Save Results
+# Writes a benchmark run as JSON, by default to benchmarks/results/<name>-<revision>.json,
+# so runs on different commits can be compared with benchmarks.compare.
+def save_results(name, results, meta=None, output=None):
+    revision = git_revision()
+    payload = {
+        'benchmark': name,
+        'meta': {
+            'revision': revision,
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'machine': platform.machine(),
+            **(meta or {})
+        },
+        'results': results
+    }
+
+    if output is None:
+        output = os.path.join(RESULTS_DIR, f'{name}-{revision}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(payload, f, indent=2)
+    return output
+
+# Generates a database for `scale` with benchmarks.datagen in a child process
+# (keeping backend unimported here, see load_app) and returns its path
+def generated_database(scale, seed_value=7):
+    db_path = os.path.join(tempfile.mkdtemp(prefix='parking-bench-'), f'parking-{scale}.db')
+    subprocess.run([sys.executable, '-m', 'benchmarks.datagen', '--scale', str(scale), '--db', db_path,
+                    '--seed', str(seed_value)], check=True)
+    return db_path
+
+## Load App
+# Imports the real application (backend.app) against an existing database file,
+# with a cache that does not hide query cost and mail delivery suppressed.
+# Importing any backend module creates that app from the environment, so this
+# must run before anything from backend is imported in the process.
+def load_app(db_path, cache_type='NullCache'):
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['CACHE_TYPE'] = cache_type
+    os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret-key-benchmark-secret-key')
+    os.environ.setdefault('APP_SECRET_KEY', 'benchmark-app-secret')
+
+    from backend.app import app
+    from backend.models import mail
+    # bench_endpoints reads the statements per call from X-SQL-Statements
+    app.config.update(MAIL_SUPPRESS_SEND=True, MAIL_DEFAULT_SENDER='bench@example.com', SQL_HEADERS=True)
+    mail.init_app(app)
+    return app
@@ -0,0 +1,57 @@
+# Compares two saved benchmark runs (benchmarks/results/*.json) case by case and
+# flags regressions: a latency percentile that grew, or throughput that dropped,
+# by more than --threshold percent. Exits with status 1 if any case regressed.
+#
+#   python -m benchmarks.compare benchmarks/results/endpoints-100k-a1b2c3d.json \
+#       benchmarks/results/endpoints-100k-e4f5a6b.json --threshold 10
+import argparse
+import json
+import sys
+
+LATENCY_KEYS = ('p50_ms', 'p95_ms', 'p99_ms')
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+# (case, metric, before, after, change %, regressed) for every metric both runs have
+def compare(before, after, threshold, keys=LATENCY_KEYS):
+    rows = []
+    for case, old in before['results'].items():
+        new = after['results'].get(case)
+        if not isinstance(old, dict) or not isinstance(new, dict):
+            continue
+
+        # Latencies should not grow; throughput should not drop
+        metrics = [(key, 1) for key in keys] + [('ops_per_s', -1), ('sql_statements', 1)]
+        for key, direction in metrics:
+            if not old.get(key) or new.get(key) is None:
+                continue
+            change = (new[key] - old[key]) / old[key] * 100
+            rows.append((case, key, old[key], new[key], round(change, 1), change * direction > threshold))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10, help='percent change counted as a regression')
+    parser.add_argument('--metric', nargs='+', default=list(LATENCY_KEYS), help='latency keys to compare')
+    args = parser.parse_args()
+
+    before, after = load(args.before), load(args.after)
+    print(f"{before['meta'].get('revision')} -> {after['meta'].get('revision')} ({before['benchmark']})")
+    rows = compare(before, after, args.threshold, args.metric)
+
+    print(f"{'case':<42} {'metric':<15} {'before':>10} {'after':>10} {'change':>8}")
+    for case, key, old, new, change, regressed in rows:
+        print(f"{case:<42} {key:<15} {old:>10} {new:>10} {change:>+7}% {'REGRESSION' if regressed else ''}")
+
+    regressions = [row for row in rows if row[-1]]
+    print(f"{len(regressions)} regression(s) over {args.threshold}%")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
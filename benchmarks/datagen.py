@@ -0,0 +1,160 @@
+# Seeded synthetic data for benchmarks and load tests: users, lots clustered
+# around cities, numbered spots and a year of reservation history, with a share
+# of reservations still open. The same seed and scale always produce the same
+# rows (times are relative to when they are generated). Every generated user
+# logs in with DATAGEN_PASSWORD.
+#
+#   python -m benchmarks.datagen --scale 100k --db /tmp/parking-100k.db
+import argparse
+import math
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert, func
+from werkzeug.security import generate_password_hash
+from backend.models.table_models import db, User, ParkingLot, ParkingSpot, Reservation
+from backend.models.migrations import upgrade_schema
+from backend.models.rollups import rebuild_rollups
+from benchmarks.common import make_app
+
+# Reservations per scale; users, lots and spots grow with it
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+DATAGEN_PASSWORD = 'password'
+INSERT_BATCH = 10_000
+OPEN_SHARE = 0.3                # share of spots with an open reservation
+HISTORY_DAYS = 365
+
+FIRST = ['Aarav', 'Vivaan', 'Aditya', 'Ananya', 'Diya', 'Ishaan', 'Kavya', 'Meera', 'Rohan', 'Saanvi',
+         'Arjun', 'Priya', 'Rahul', 'Sneha', 'Vikram', 'Neha', 'Karthik', 'Pooja', 'Siddharth', 'Lakshmi']
+LAST = ['Sharma', 'Iyer', 'Reddy', 'Nair', 'Gupta', 'Kumar', 'Rao', 'Patel', 'Menon', 'Singh',
+        'Das', 'Joshi', 'Pillai', 'Shetty', 'Hegde', 'Bhat', 'Kulkarni', 'Naidu', 'Verma', 'Chopra']
+AREAS = ['Indiranagar', 'Koramangala', 'Whitefield', 'Jayanagar', 'Malleshwaram', 'Hebbal', 'Marathahalli',
+         'Bandra', 'Andheri', 'Powai', 'Connaught Place', 'Saket', 'Adyar', 'T Nagar', 'Banjara Hills']
+KINDS = ['Metro Parking', 'Mall Parking', 'Market Lot', 'Stadium Lot', 'Tech Park Parking', 'Station Parking']
+CITIES = [(12.97, 77.59, '560'), (19.08, 72.88, '400'), (28.61, 77.21, '110'), (13.08, 80.27, '600'),
+          (17.39, 78.49, '500')]
+
+
+# Counts of each table for `reservations` reservations
+def plan(reservations):
+    return {
+        'users': max(50, reservations // 20),
+        'lots': max(10, reservations // 2_000),
+        'reservations': reservations,
+    }
+
+def _bulk_insert(model, rows):
+    for start in range(0, len(rows), INSERT_BATCH):
+        db.session.execute(insert(model), rows[start:start + INSERT_BATCH])
+
+def _users(rng, count, password_hash):
+    return [
+        {'email': f'user{n}@example.com', 'password_hash': password_hash,
+         'full_name': f'{rng.choice(FIRST)} {rng.choice(LAST)}', 'address': f'{n} {rng.choice(AREAS)} Road',
+         'pincode': f'{rng.choice(CITIES)[2]}{rng.randint(0, 99):03d}', 'role': 'user'}
+        for n in range(count)
+    ]
+
+def _lots(rng, count, now):
+    rows = []
+    for n in range(count):
+        lat, lng, pin = rng.choice(CITIES)
+        spots = rng.randint(20, 200)
+        rows.append({
+            'prime_location': f'{rng.choice(AREAS)} {rng.choice(KINDS)} {n}', 'price': rng.randrange(10, 61, 5),
+            'address': f'{rng.randint(1, 200)} {rng.choice(AREAS)} Main Road', 'pincode': f'{pin}{rng.randint(0, 99):03d}',
+            'total_spots': spots, 'available_spots': spots,
+            'created_at': now - timedelta(days=rng.randint(0, HISTORY_DAYS), minutes=rng.randint(0, 1439)),
+            'latitude': lat + rng.gauss(0, 0.05), 'longitude': lng + rng.gauss(0, 0.05),
+        })
+    return rows
+
+## Generate
+# Fills the database bound to the current app. Returns the row counts.
+def generate(reservations, seed_value=7):
+    rng = random.Random(seed_value)
+    now = datetime.utcnow().replace(microsecond=0)
+    sizes = plan(reservations)
+
+    password_hash = generate_password_hash(DATAGEN_PASSWORD)
+    _bulk_insert(User, _users(rng, sizes['users'], password_hash))
+    user_ids = db.session.execute(db.select(User.id).where(User.role == 'user')).scalars().all()
+
+    lot_rows = _lots(rng, sizes['lots'], now)
+    _bulk_insert(ParkingLot, lot_rows)
+    lots = db.session.execute(db.select(ParkingLot.id, ParkingLot.total_spots, ParkingLot.price)).all()
+
+    # Spots are numbered per lot; a share of each lot is occupied right now
+    spot_rows = []
+    for lot in lots:
+        taken = set(rng.sample(range(1, lot.total_spots + 1), int(lot.total_spots * OPEN_SHARE)))
+        spot_rows.extend({'lot_id': lot.id, 'spot_no': n, 'status': 'O' if n in taken else 'A'}
+                         for n in range(1, lot.total_spots + 1))
+    _bulk_insert(ParkingSpot, spot_rows)
+    db.session.execute(
+        db.update(ParkingLot).values(available_spots = ParkingLot.total_spots - db.select(func.count())
+            .where(ParkingSpot.lot_id == ParkingLot.id, ParkingSpot.status == 'O').scalar_subquery())
+    )
+
+    spots = db.session.execute(db.select(ParkingSpot.id, ParkingSpot.status, ParkingLot.price)
+                               .join(ParkingLot, ParkingLot.id == ParkingSpot.lot_id)).all()
+    occupied = [spot for spot in spots if spot.status == 'O']
+
+    # One open reservation per occupied spot, the rest is closed history
+    reservation_rows = []
+    for spot in occupied[:reservations]:
+        reservation_rows.append({
+            'spot_id': spot.id, 'user_id': rng.choice(user_ids), 'vehicle_no': f'KA{rng.randint(1, 99):02d}{rng.randint(1000, 9999)}',
+            'parking_time': now - timedelta(minutes=rng.randint(5, 720)), 'leaving_time': None, 'cost': None,
+        })
+    for _ in range(reservations - len(reservation_rows)):
+        spot = rng.choice(spots)
+        parked = now - timedelta(days=rng.uniform(0.5, HISTORY_DAYS))
+        hours = rng.uniform(0.2, 8)
+        reservation_rows.append({
+            'spot_id': spot.id, 'user_id': rng.choice(user_ids), 'vehicle_no': f'KA{rng.randint(1, 99):02d}{rng.randint(1000, 9999)}',
+            'parking_time': parked, 'leaving_time': parked + timedelta(hours=hours), 'cost': math.ceil(hours) * spot.price,
+        })
+    reservation_rows.sort(key = lambda row: row['parking_time'])
+    _bulk_insert(Reservation, reservation_rows)
+    # Bulk inserts bypass the incremental rollup updates
+    rebuild_rollups(db.session.connection())
+
+    db.session.commit()
+    return {'users': len(user_ids), 'lots': len(lots), 'spots': len(spots),
+            'open_reservations': min(len(occupied), reservations), 'reservations': reservations}
+
+# Scale name ('100k') or a plain number of reservations
+def parse_scale(value):
+    return SCALES[value.lower()] if value.lower() in SCALES else int(value)
+
+## Build Database
+# Creates a fresh SQLite database at `db_path` (or a temp file) holding the
+# generated data and returns (path, counts).
+def build_database(reservations, db_path=None, seed_value=7):
+    if db_path and os.path.exists(db_path):
+        raise FileExistsError(f'{db_path} already exists; generate into a new file')
+
+    app = make_app(db_path)
+    with app.app_context():
+        upgrade_schema(db.engine)
+        counts = generate(reservations, seed_value)
+        path = db.engine.url.database
+        db.engine.dispose()
+    return path, counts
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', default='10k', help=f"{', '.join(SCALES)} or a number of reservations")
+    parser.add_argument('--db', help='SQLite file to create (default: a temp file)')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    path, counts = build_database(parse_scale(args.scale), args.db, args.seed)
+    print(f"{counts} in {time.perf_counter() - start:.1f}s -> {path}")
+
+
+if __name__ == '__main__':
+    main()
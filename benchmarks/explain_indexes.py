@@ -0,0 +1,134 @@
+# Query-plan check: builds a database with the pre-index schema, runs the schema
+# migrations, fills it with data and asserts via EXPLAIN QUERY PLAN that every hot
+# query is answered from its index instead of a table scan or a sort.
+#
+#   python -m benchmarks.explain_indexes
+from datetime import datetime, timedelta
+from sqlalchemy import text, select, insert, update, func, and_, or_
+from backend.models.table_models import db, ParkingLot, ParkingSpot, Reservation, DailyUserStats, DailyLotStats
+from backend.models.migrations import upgrade_schema
+from backend.models.rollups import rebuild_rollups
+from benchmarks.common import make_app
+
+NOW = datetime(2025, 8, 1, 12, 0)
+
+# Hot queries and the index each one must use. None of them may sort in a
+# temporary B-tree (checked for every plan).
+HOT_QUERIES = [
+    (
+        # spot_allocator.claim_free_spot: the bitmap picked spot_no, the row is claimed only if still free
+        'free spot claim',
+        update(ParkingSpot)
+        .where(ParkingSpot.lot_id == 1, ParkingSpot.spot_no == 17, ParkingSpot.status == 'A')
+        .values(status='O')
+        .returning(ParkingSpot.id),
+        'uq_parking_spot_lot_spot_no'
+    ),
+    (
+        'spot statuses of a lot (lot map, bitmap load)',
+        select(ParkingSpot.spot_no, ParkingSpot.status).where(ParkingSpot.lot_id == 1).order_by(ParkingSpot.spot_no),
+        'uq_parking_spot_lot_spot_no'
+    ),
+    (
+        'free spots per lot',
+        select(func.count()).where(ParkingSpot.lot_id == 1, ParkingSpot.status == 'A'),
+        'ix_parking_spot_lot_status'
+    ),
+    (
+        # GetUserReservations: keyset page after (parking_time, id) of the previous page's last row
+        'user reservation history page',
+        select(Reservation.id)
+        .where(Reservation.user_id == 7,
+               or_(Reservation.parking_time < NOW,
+                   and_(Reservation.parking_time == NOW, Reservation.id < 5000)))
+        .order_by(Reservation.parking_time.desc(), Reservation.id.desc())
+        .limit(21),
+        'ix_reservation_user_parking_time'
+    ),
+    (
+        'latest reservation of a spot',
+        select(Reservation).where(Reservation.spot_id == 3).order_by(Reservation.parking_time.desc()).limit(1),
+        'ix_reservation_spot_parking_time'
+    ),
+    (
+        'bookings in a day',
+        select(Reservation.user_id).where(Reservation.parking_time >= NOW, Reservation.parking_time < NOW + timedelta(days=1)),
+        'ix_reservation_parking_time'
+    ),
+    (
+        'lots created in a day',
+        select(ParkingLot.id).where(ParkingLot.created_at >= NOW, ParkingLot.created_at < NOW + timedelta(days=1)),
+        'ix_parking_lot_created_at'
+    ),
+    (
+        # reports.user_summary
+        'rollup: one user\'s totals',
+        select(func.sum(DailyUserStats.bookings), func.sum(DailyUserStats.revenue)).where(DailyUserStats.user_id == 7),
+        'ix_daily_user_stats_user_day'
+    ),
+    (
+        # reports.monthly_user_stats and the reconcile's per-chunk delete
+        'rollup: user rows in a month',
+        select(DailyUserStats.user_id, DailyUserStats.lot_id)
+        .where(DailyUserStats.day >= NOW.date() - timedelta(days=30), DailyUserStats.day < NOW.date()),
+        'sqlite_autoindex_daily_user_stats_1'
+    ),
+    (
+        # reports.revenue_by_lot: one lot's rows are contiguous in the primary key
+        'rollup: one lot\'s revenue',
+        select(func.sum(DailyLotStats.revenue)).where(DailyLotStats.lot_id == 1),
+        'sqlite_autoindex_daily_lot_stats_1'
+    ),
+]
+
+# Recreates the situation of an old instance/parking.db: tables without indexes
+def drop_model_indexes():
+    for table in db.metadata.tables.values():
+        for index in table.indexes:
+            db.session.execute(text(f'DROP INDEX IF EXISTS {index.name}'))
+    db.session.commit()
+
+def seed(lots=20, spots=200, reservations=20000):
+    for i in range(lots):
+        lot = ParkingLot(prime_location=f'Lot {i}', price=10, address='Ring Road', pincode='560001',
+                         total_spots=spots, available_spots=spots, created_at=NOW - timedelta(days=i))
+        db.session.add(lot)
+        db.session.flush()
+        db.session.execute(insert(ParkingSpot), [{'lot_id': lot.id, 'spot_no': n, 'status': 'A'} for n in range(1, spots + 1)])
+
+    rows = [{
+        'spot_id': 1 + n % (lots * spots),
+        'user_id': 1 + n % 500,
+        'parking_time': NOW - timedelta(minutes=37 * n),
+        'vehicle_no': 'KA01'
+    } for n in range(reservations)]
+    db.session.execute(insert(Reservation), rows)
+    rebuild_rollups(db.session.connection())
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+
+def query_plan(statement):
+    compiled = statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {compiled}')).all()
+    return ' | '.join(row[-1] for row in rows)
+
+def main():
+    app = make_app()
+    with app.app_context():
+        drop_model_indexes()
+        applied = upgrade_schema(db.engine)
+        print(f"Migrations applied: {applied}")
+        seed()
+
+        failures = 0
+        for name, statement, index_name in HOT_QUERIES:
+            plan = query_plan(statement)
+            ok = index_name in plan and 'TEMP B-TREE FOR ORDER BY' not in plan
+            failures += not ok
+            print(f"[{'OK' if ok else 'FAIL'}] {name}: {plan}")
+
+        assert not failures, f'{failures} hot queries do not use their index'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+# Load driver: concurrent users reserve spots in random lots and release what they
+# hold, against a generated database (in-process, through the Flask test client)
+# or a running server (--url, same generated database behind it). Reports
+# p50/p95/p99 per operation and throughput, and saves the run as JSON.
+#
+#   python -m benchmarks.load_reserve --scale 100k --threads 16 --duration 30
+#   python -m benchmarks.load_reserve --url http://localhost:5000 --threads 64 --duration 60
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from benchmarks.common import summarize, save_results, load_app, generated_database
+
+# Accounts made by benchmarks.datagen (not imported: it would load backend before load_app)
+DATAGEN_USERS = 'user{}@example.com'
+DATAGEN_PASSWORD = 'password'
+VEHICLES = ['KA01AB1234', 'MH02CD5678', 'DL03EF9012', 'TN04GH3456']
+
+
+# Sends requests through the Flask test client; one per thread
+class TestClientTransport:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_json(silent=True) or {}
+
+# Sends requests to a running server
+class HttpTransport:
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json', **(headers or {})})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read() or b'{}')
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read() or b'{}')
+
+def login(transport, email):
+    status, body = transport.request('POST', '/login', {'email': email, 'password': DATAGEN_PASSWORD})
+    if status != 200:
+        raise RuntimeError(f'Login failed for {email}: {status} {body}')
+    return {'Authorization': f"Bearer {body['access_token']}"}
+
+def lot_ids_of(transport, headers):
+    status, body = transport.request('GET', '/lots', headers=headers)
+    lots = body['items'] if isinstance(body, dict) else body
+    return [lot['id'] for lot in lots]
+
+# One simulated user: reserves while holding fewer than `hold` spots (or with
+# probability `reserve_share`), otherwise releases its oldest reservation
+def worker(transport, email, lot_ids, args, seed_value, stats, lock):
+    rng = random.Random(seed_value)
+    headers = login(transport, email)
+    held = []
+    samples = {'reserve': [], 'release': []}
+    outcomes = {}
+    deadline = time.perf_counter() + args.duration
+
+    while time.perf_counter() < deadline:
+        if not held or (len(held) < args.hold and rng.random() < args.reserve_share):
+            op = 'reserve'
+            start = time.perf_counter()
+            status, body = transport.request('POST', '/reserve', {'lot_id': rng.choice(lot_ids),
+                                                                  'vehicle_no': rng.choice(VEHICLES)}, headers)
+            if status == 201:
+                held.append(body['reservation_id'])
+        else:
+            op = 'release'
+            start = time.perf_counter()
+            status, body = transport.request('POST', f'/release/{held.pop(0)}', headers=headers)
+        samples[op].append((time.perf_counter() - start) * 1000)
+        outcomes[f'{op} {status}'] = outcomes.get(f'{op} {status}', 0) + 1
+
+    # Leave the spots as they were found
+    for reservation_id in held:
+        transport.request('POST', f'/release/{reservation_id}', headers=headers)
+
+    with lock:
+        for op, values in samples.items():
+            stats['samples'][op].extend(values)
+        for key, count in outcomes.items():
+            stats['outcomes'][key] = stats['outcomes'].get(key, 0) + count
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', default='10k', help='datagen scale when neither --db nor --url is given')
+    parser.add_argument('--db', help='existing database generated by benchmarks.datagen')
+    parser.add_argument('--url', help='drive a running server instead of the in-process app')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10, help='seconds')
+    parser.add_argument('--hold', type=int, default=3, help='most reservations a user holds at once')
+    parser.add_argument('--reserve-share', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='JSON file (default: benchmarks/results/load_reserve-<revision>.json)')
+    args = parser.parse_args()
+
+    if args.url:
+        transports = [HttpTransport(args.url) for _ in range(args.threads)]
+    else:
+        app = load_app(args.db or generated_database(args.scale, args.seed))
+        transports = [TestClientTransport(app) for _ in range(args.threads)]
+
+    lot_ids = lot_ids_of(transports[0], login(transports[0], DATAGEN_USERS.format(0)))
+    stats = {'samples': {'reserve': [], 'release': []}, 'outcomes': {}}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=worker, args=(transport, DATAGEN_USERS.format(n), lot_ids, args,
+                                              args.seed + n, stats, lock))
+        for n, transport in enumerate(transports)
+    ]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    results = {op: summarize(values) for op, values in stats['samples'].items()}
+    operations = sum(len(values) for values in stats['samples'].values())
+    results['throughput'] = {'ops': operations, 'seconds': round(elapsed, 2), 'ops_per_s': round(operations / elapsed, 1)}
+    results['outcomes'] = stats['outcomes']
+
+    print(f"{'op':<8} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for op in ('reserve', 'release'):
+        result = results[op]
+        if result['count']:
+            print(f"{op:<8} {result['count']:>7} {result['p50_ms']:>9} {result['p95_ms']:>9} "
+                  f"{result['p99_ms']:>9} {result['max_ms']:>9}")
+    print(f"{operations} ops in {elapsed:.1f}s = {results['throughput']['ops_per_s']} ops/s; {stats['outcomes']}")
+
+    meta = {'threads': args.threads, 'duration': args.duration, 'hold': args.hold,
+            'reserve_share': args.reserve_share, 'target': args.url or 'in-process', 'lots': len(lot_ids)}
+    path = save_results('load_reserve', results, meta, args.output)
+    print(f"Saved {path}")
+
+
+if __name__ == '__main__':
+    main()
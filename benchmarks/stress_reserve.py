@@ -0,0 +1,179 @@
+# Stress test: many threads reserve and release spots in the same lots at once
+# through the real /reserve and /release endpoints (Flask test client, one per
+# thread), so rollups, cache invalidation, event publishing and, with
+# --write-behind, the journal all run. The run fails if any spot is ever handed
+# out twice, the lot counters, bitmaps or rollups drift, the cached /lots view
+# goes stale or a change was not published.
+#
+#   python -m benchmarks.stress_reserve --threads 16 --ops 200 --spots 50
+#   python -m benchmarks.stress_reserve --write-behind
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from benchmarks.common import load_app
+
+ADMIN = {'email': 'admin@gmail.com', 'password': 'admin123'}
+PASSWORD = 'password'
+
+
+def login(client, email, password):
+    response = client.post('/login', json={'email': email, 'password': password})
+    return {'Authorization': f"Bearer {response.json['access_token']}"}
+
+# Creates `lot_count` lots of `spots` spots and one account per thread
+def seed(client, lot_count, spots, users):
+    admin = login(client, ADMIN['email'], ADMIN['password'])
+    for i in range(lot_count):
+        response = client.post('/admin/parking_lot', headers=admin, json={
+            'prime_location': f'Busy {i}', 'price': 10, 'address': 'Ring Road', 'pincode': '560001', 'total_spots': spots
+        })
+        assert response.status_code == 201, response.json
+
+    for n in range(1, users + 1):
+        client.post('/register', json={'email': f'stress{n}@example.com', 'password': PASSWORD,
+                                       'full_name': f'Stress {n}', 'address': 'a', 'pincode': '1'})
+
+    return [lot['id'] for lot in client.get('/admin/parking_lots', headers=admin).json['items']]
+
+# Counts the events published to this process's broker
+class EventCounter:
+    def __init__(self):
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def put(self, message):
+        with self.lock:
+            self.counts[message[0]] = self.counts.get(message[0], 0) + 1
+
+# Worker loop: reserve, sometimes release one of its own reservations
+def worker(app, lot_ids, ops, n, stats, lock):
+    rng = random.Random(n)
+    client = app.test_client()
+    headers = login(client, f'stress{n}@example.com', PASSWORD)
+    held = []
+    local = {'reserved': 0, 'full': 0, 'released': 0, 'busy': 0, 'errors': 0}
+
+    for _ in range(ops):
+        if held and rng.random() < 0.4:
+            response = client.post(f'/release/{held.pop(rng.randrange(len(held)))}', headers=headers)
+            outcome = 'released' if response.status_code == 200 else None
+        else:
+            response = client.post('/reserve', headers=headers,
+                                   json={'lot_id': rng.choice(lot_ids), 'vehicle_no': 'KA01'})
+            outcome = None
+            if response.status_code == 201:
+                held.append(response.json['reservation_id'])
+                outcome = 'reserved'
+            elif response.status_code == 400:
+                outcome = 'full'
+
+        if response.status_code == 503:
+            outcome = 'busy'     # write-behind queue full
+        if outcome is None:
+            outcome = 'errors'
+            print("Worker error:", response.status_code, response.json)
+        local[outcome] += 1
+
+    with lock:
+        for key, value in local.items():
+            stats[key] += value
+
+# Asserts no spot has two open reservations and everything derived from the
+# rows (counters, bitmaps, rollups, the cached lot list) matches them
+def verify(client, stats, events):
+    from sqlalchemy import func
+    from backend.models.table_models import db, ParkingLot, ParkingSpot, Reservation
+    from backend.models.occupancy import check_occupancy_consistency
+    from backend.models.occupancy_bitmap import get_occupancy
+    from backend.models.rollups import reconcile_rollups
+
+    double_booked = (
+        db.session.query(Reservation.spot_id)
+        .filter(Reservation.leaving_time.is_(None))
+        .group_by(Reservation.spot_id)
+        .having(func.count(Reservation.id) > 1)
+        .all()
+    )
+    assert not double_booked, f'double-booked spots: {double_booked}'
+
+    open_reservations = Reservation.query.filter(Reservation.leaving_time.is_(None)).count()
+    occupied = ParkingSpot.query.filter_by(status='O').count()
+    assert open_reservations == occupied, f'{open_reservations} open reservations vs {occupied} occupied spots'
+    assert Reservation.query.count() == stats['reserved'], 'acknowledged reservations missing from the table'
+
+    mismatches = check_occupancy_consistency()
+    assert not mismatches, f'lot counters drifted: {mismatches}'
+
+    lots = ParkingLot.query.all()
+    bitmap_free = get_occupancy().free_counts([lot.id for lot in lots])
+    drifted = {lot.id: bitmap_free[lot.id] for lot in lots if bitmap_free[lot.id] != lot.available_spots}
+    assert not drifted, f'occupancy bitmaps drifted: {drifted}'
+
+    # Rebuilding the rollups from the reservations finds nothing to repair
+    drift = reconcile_rollups()['drift']
+    assert drift == 0, f'{drift} rollup rows drifted'
+
+    # The cached lot list was invalidated by every change
+    headers = login(client, 'stress1@example.com', PASSWORD)
+    body = client.get('/lots', headers=headers).json
+    cached = {lot['id']: lot['available_spots'] for lot in (body['items'] if isinstance(body, dict) else body)}
+    assert cached == {lot.id: lot.available_spots for lot in lots}, f'stale /lots: {cached}'
+
+    published = events.counts.get('lot', 0)
+    assert published == stats['reserved'] + stats['released'], \
+        f"{published} lot events for {stats['reserved'] + stats['released']} changes"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--ops', type=int, default=200)
+    parser.add_argument('--lots', type=int, default=2)
+    parser.add_argument('--spots', type=int, default=50)
+    parser.add_argument('--write-behind', action='store_true', help='run with WRITE_BEHIND=true')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='parking-stress-')
+    if args.write_behind:
+        os.environ.update(WRITE_BEHIND='true', WRITE_BEHIND_JOURNAL=os.path.join(directory, 'write_behind.journal'))
+    app = load_app(os.path.join(directory, 'stress.db'), cache_type='SimpleCache')
+
+    from backend.models.occupancy_events import get_broker
+    from backend.models.write_behind import drain_write_behind
+
+    client = app.test_client()
+    lot_ids = seed(client, args.lots, args.spots, args.threads)
+    events = EventCounter()
+    with app.app_context():
+        broker = get_broker()
+        with broker.lock:
+            broker.subscribers.add(events)
+
+    stats = {'reserved': 0, 'full': 0, 'released': 0, 'busy': 0, 'errors': 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=worker, args=(app, lot_ids, args.ops, n, stats, lock))
+        for n in range(1, args.threads + 1)
+    ]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        drain_write_behind()
+        verify(client, stats, events)
+
+    total = args.threads * args.ops
+    print(f"{total} operations in {elapsed:.2f}s ({total / elapsed:.0f} ops/s): {stats}")
+    assert not stats['errors'], f"{stats['errors']} requests failed"
+    print("OK: no spot was double-booked; counters, bitmaps, rollups, cached lots and events match spot rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,10 @@
 # Celery app configuration for background tasks and scheduling
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_init, task_prerun, task_postrun
 from backend import flask_app
+from backend.models.table_models import db
+from backend.models.metrics import task_started, task_finished, enable_remote
 
 
 # Factory function to create and configure the Celery app
@@ -11,7 +14,7 @@ def make_celery(app):
         'vehicle_parking',
         broker='redis://localhost:6379/0',
         backend='redis://localhost:6379/0',
-        include=['tasks.reminder_tasks']  # Import tasks for scheduling
+        include=['tasks.reminder_tasks', 'tasks.rollup_tasks']  # Import tasks for scheduling
     )
 
     # Set timezone and UTC handling
@@ -31,6 +34,12 @@ def make_celery(app):
             'schedule': crontab(hour=20, minute=1, day_of_month=27)  # Monthly on 27th
             # 'schedule': crontab(minute = '*')     # For testing: every minute
         },
+
+        'reconcile-daily-rollups': {
+            'task': 'tasks.rollup_tasks.reconcile_daily_rollups',
+            'schedule': crontab(hour=6, minute=0),  # Daily at 06:00 IST (00:30 UTC), after the UTC day closes
+            'kwargs': {'days': 3}
+        },
     }
 
     # Attach Flask app context to Celery for DB and config access
@@ -39,4 +48,27 @@ def make_celery(app):
     return celery_app
 
 # Create the global Celery app instance
-celery_app = make_celery(flask_app)
\ No newline at end of file
+celery_app = make_celery(flask_app)
+
+# Forked worker processes must not reuse database connections pooled by the parent
+@worker_process_init.connect
+def reset_db_connections(**kwargs):
+    with flask_app.app_context():
+        db.engine.dispose(close=False)
+
+# Task metrics of worker processes are shared through Redis so /metrics can report them
+@worker_process_init.connect
+def share_task_metrics(**kwargs):
+    try:
+        enable_remote(flask_app.config['METRICS_REDIS_URL'])
+    except Exception as e:
+        print("Task metrics stay local:", e)
+
+# Time every task and count its SQL statements (see backend/models/metrics.py)
+@task_prerun.connect
+def start_task_metrics(task_id=None, **kwargs):
+    task_started(task_id)
+
+@task_postrun.connect
+def record_task_metrics(task_id=None, task=None, state=None, **kwargs):
+    task_finished(task_id, task.name, state)
@@ -0,0 +1,67 @@
+// Live lot availability from /events/occupancy (Server-Sent Events).
+// EventSource cannot send the Authorization header, so the stream is read with
+// fetch. Reconnects with a growing delay; every connection starts with a snapshot.
+
+const STREAM_URL = 'http://127.0.0.1:5000/events/occupancy'
+const MAX_RETRY_MS = 30000
+
+// handlers: { snapshot(lots), lot(lot), lot_deleted({ id }) }
+// Returns a function that closes the stream.
+export function subscribeOccupancy(handlers) {
+  const controller = new AbortController()
+  let retryMs = 1000
+
+  const dispatch = (block) => {
+    let event = 'message'
+    const data = []
+    for (const line of block.split('\n')) {
+      if (line.startsWith('event:')) event = line.slice(6).trim()
+      else if (line.startsWith('data:')) data.push(line.slice(5).trim())
+      else if (line.startsWith('retry:')) retryMs = Number(line.slice(6)) || retryMs
+    }
+    if (data.length && handlers[event]) handlers[event](JSON.parse(data.join('\n')))
+  }
+
+  const connect = async () => {
+    try {
+      const response = await fetch(STREAM_URL, {
+        headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+        signal: controller.signal,
+      })
+      if (response.status === 401 || response.status === 403) return
+      if (!response.ok) throw new Error(`stream responded ${response.status}`)
+
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      retryMs = 1000
+      for (;;) {
+        const { value, done } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const blocks = buffer.split('\n\n')
+        buffer = blocks.pop()
+        blocks.forEach(dispatch)
+      }
+    } catch (err) {
+      if (controller.signal.aborted) return
+    }
+    if (!controller.signal.aborted) {
+      setTimeout(connect, retryMs)
+      retryMs = Math.min(retryMs * 2, MAX_RETRY_MS)
+    }
+  }
+
+  connect()
+  return () => controller.abort()
+}
+
+// Copies the live counters onto matching lots in place
+export function applyLotCounters(lots, update) {
+  const lot = lots.find((item) => item.id === update.id)
+  if (lot) {
+    lot.available_spots = update.available_spots
+    lot.total_spots = update.total_spots
+  }
+  return lot
+}
@@ -0,0 +1,95 @@
+# Mail dispatch pipeline: sends many messages over a reused SMTP connection per
+# batch, and retries transient SMTP failures with exponential backoff
+import smtplib
+import time
+from itertools import islice
+from flask import current_app
+from flask_mail import BadHeaderError
+from backend.models import mail
+
+MAIL_BATCH_SIZE = 100       # messages sent over one SMTP connection
+MAIL_MAX_RETRIES = 3        # reconnect attempts per batch
+MAIL_RETRY_BACKOFF = 2.0    # seconds before the first retry, doubled each time
+
+# A message that cannot be sent as built (no sender, no or blank recipients)
+class InvalidMessage(ValueError):
+    pass
+
+# Failures that concern a single message; the connection stays usable
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, BadHeaderError, InvalidMessage)
+
+
+# Yields lists of up to `size` items from any iterable (generators stay lazy)
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+# Checks what Flask-Mail would otherwise only assert (skipped under python -O)
+def validate_message(message):
+    sender = message.sender[1] if isinstance(message.sender, tuple) else message.sender
+    if not sender:
+        raise InvalidMessage('The message has no sender and MAIL_DEFAULT_SENDER is not set')
+    if not message.send_to or not all(str(address).strip() for address in message.send_to):
+        raise InvalidMessage('The message has no recipients')
+
+# Sends one batch over a single connection. A broken connection is reopened and
+# the remaining messages retried with backoff. Returns (sent, failed).
+def _send_batch(batch, max_retries, backoff, on_sent):
+    sent = 0
+    failed = 0
+    position = 0
+    attempt = 0
+
+    while position < len(batch):
+        try:
+            with mail.connect() as connection:
+                while position < len(batch):
+                    message = batch[position]
+                    try:
+                        validate_message(message)
+                        connection.send(message)
+                        sent += 1
+                        if on_sent:
+                            on_sent(message)
+                    except PERMANENT_ERRORS as e:
+                        failed += 1
+                        print(f"Failed to send email to {', '.join(message.recipients)}: {e}")
+                    position += 1
+
+        except (smtplib.SMTPException, OSError) as e:
+            if position >= len(batch):
+                break  # everything went out; only closing the connection failed
+
+            attempt += 1
+            if attempt > max_retries:
+                failed += len(batch) - position
+                print(f"Giving up on {len(batch) - position} emails after {max_retries} retries: {e}")
+                break
+
+            delay = backoff * 2 ** (attempt - 1)
+            print(f"SMTP error ({e}), retrying {len(batch) - position} emails in {delay:.1f}s")
+            time.sleep(delay)
+
+    return sent, failed
+
+## Send Messages
+# Sends an iterable of Messages in chunks, one SMTP connection per chunk.
+# `on_sent(message)` is called after each message is accepted by the server.
+# Returns a dict with sent/failed counts.
+def send_messages(messages, batch_size=None, max_retries=None, backoff=None, on_sent=None):
+    config = current_app.config
+    batch_size = batch_size or config.get('MAIL_BATCH_SIZE', MAIL_BATCH_SIZE)
+    max_retries = max_retries if max_retries is not None else config.get('MAIL_MAX_RETRIES', MAIL_MAX_RETRIES)
+    backoff = backoff if backoff is not None else config.get('MAIL_RETRY_BACKOFF', MAIL_RETRY_BACKOFF)
+
+    totals = {'sent': 0, 'failed': 0}
+    for batch in chunked(messages, batch_size):
+        sent, failed = _send_batch(batch, max_retries, backoff, on_sent)
+        totals['sent'] += sent
+        totals['failed'] += failed
+
+    return totals
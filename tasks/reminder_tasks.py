@@ -1,58 +1,44 @@
 # Celery tasks for reminders, monthly reports, and CSV export
+import logging
 from datetime import datetime, timezone, timedelta, date
-from backend.models.table_models import db, User, Reservation, ParkingLot, ParkingSpot
-from sqlalchemy import func
+from backend.models.table_models import db, User, ReportDelivery
+from backend.models.reports import monthly_user_activity
+from backend.models.reminders import day_bounds, lots_created_between, reminder_recipients
+from backend.models.history_export import has_history, attachment_export, export_filename, export_mimetype
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from flask_mail import Message
 from backend.models import mail
+from tasks.mail_dispatch import send_messages, chunked
+from celery import group
+from celery.result import GroupResult
 from celery_app import celery_app
-import io
-import csv
 
 # Get Flask app context from Celery for DB access
 flask_app = celery_app.flask_app
 
-def user_not_visited_mail(user):
-    """
-    Send a reminder email to a user who has not booked a parking slot today.
-    """
-    msg = Message(
-        subject="Parking Slot Reminder",
+log = logging.getLogger(__name__)
+
+# One daily email per user: the "no booking today" reminder and the lots created
+# today merged into a single digest instead of one email per event
+def daily_digest_mail(user, missed_booking, new_lots):
+    sections = []
+    if missed_booking:
+        sections.append(
+            "You haven’t booked any parking slot today. \n"
+            "Please make a reservation to avoid inconvenience."
+        )
+    if new_lots:
+        lot_lines = "\n".join(f"- {lot.prime_location}, {lot.address}" for lot in new_lots)
+        sections.append(f"New parking lots have been created today:\n{lot_lines}")
+
+    body = "\n\n".join([f"Hello {user.full_name},", *sections, "– Parking App Team"])
+
+    return Message(
+        subject="Parking Slot Reminder" if missed_booking else "New Parking Lot Created",
         recipients=[user.email],
-        body=f"""
-Hello {user.full_name},
-
-You haven’t booked any parking slot today. 
-Please make a reservation to avoid inconvenience.
-
-– Parking App Team
-""".strip()
+        body=body
     )
-    try:
-        mail.send(msg)
-        print(f"Reminder email sent to {user.email}")
-    except Exception as e:
-        print(f"Failed to send email to {user.email}: {e}")
-
-def new_lot_created_mail(user):
-    """
-    Send a notification email to all users when a new parking lot is created.
-    """
-    msg = Message(
-        subject="New Parking Lot Created",
-        recipients=[user.email],
-        body=f"""
-Hello {user.full_name},
-
-New parking lot has been created. 
-
-– Parking App Team
-""".strip()
-    )
-    try:
-        mail.send(msg)
-        print(f"Reminder email sent to {user.email}")
-    except Exception as e:
-        print(f"Failed to send email to {user.email}: {e}")
 
 @celery_app.task
 # Daily scheduled task: Remind users who haven't booked and notify about new lots
@@ -61,178 +47,192 @@ def send_daily_reminder():
         today_utc = datetime.now(timezone.utc).date()
         # today_utc = date(2025, 8, 1) # Test run
         print(f"Running reminder check for {today_utc}")
+        start, end = day_bounds(today_utc)
 
-    # --- 1. Find users who DID NOT book today ---
-        booked_user_ids = db.session.query(Reservation.user_id)\
-            .filter(func.date(Reservation.parking_time) == today_utc)\
-            .distinct().all()
-
-        booked_user_ids = [uid for (uid,) in booked_user_ids]
-
-        users_without_booking = User.query.filter(~User.id.in_(booked_user_ids)).all()
-
-        if users_without_booking:
-            print("Users without a reservation today:")
-            for user in users_without_booking:
-                if user.role == 'user':
-                    print(f"{user.full_name} ({user.email}) did NOT book a slot today.")
-                    user_not_visited_mail(user)
-        else:
-            print("All users have booked today.")
-
-    # --- 2. Notify users about new parking lots created today ---
-        new_lots = ParkingLot.query.filter(
-            func.date(ParkingLot.created_at) == today_utc
-        ).all()
+    # --- 1. Find parking lots created today ---
+        new_lots = lots_created_between(start, end)
 
         if new_lots:
             print("New parking lots added today:")
-
-            all_users = User.query.filter(User.role != 'admin').all()
-            
             for lot in new_lots:
                 print(f"Lot: {lot.prime_location} (ID: {lot.id})")
-
-                for user in all_users:
-                    new_lot_created_mail(user)
         else:
             print("No new parking lots created today.")
 
+    # --- 2. Stream recipients: everyone if there are new lots, else users who did NOT book today ---
+        missed = 0
+
+        def digests():
+            nonlocal missed
+            for batch in reminder_recipients(start, end, include_all = bool(new_lots)):
+                for user in batch:
+                    missed += user.missed_booking
+                    yield daily_digest_mail(user, user.missed_booking, new_lots)
+
+    # --- 3. One digest per user, sent over pooled SMTP connections ---
+        totals = send_messages(digests())
+        print(f"{missed} users without a reservation today.")
+        print(f"Daily digest: {totals['sent']} sent, {totals['failed']} failed")
+
+# Users per fan-out task; each task sends its batch over one SMTP connection
+REPORT_BATCH_SIZE = 100
+
+# First instant of a 'YYYY-MM' period and of the month after it
+def _month_bounds(period):
+    start = datetime.strptime(period, '%Y-%m')
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+# HTML monthly report for one row of monthly_user_activity()
+def monthly_report_mail(activity, month_label):
+    html_body = f"""
+    <h2>Monthly Parking Activity Report</h2>
+    <p>Hello <b>{activity['full_name']}</b>, here is your report for <b>{month_label}</b>.</p>
+    <ul>
+        <li>Total Reservations: <b>{activity['total_bookings']}</b></li>
+        <li>Most Used Parking Lot: <b>{activity['most_used_lot']}</b></li>
+        <li>Total Spent: ₹<b>{activity['total_spent']}</b></li>
+    </ul>
+    <p>Thanks for using our Parking System!</p>
+    """
+
+    return Message(
+        subject="Monthly Parking Report",
+        recipients=[activity['email']],
+        html=html_body
+    )
+
 @celery_app.task
-# Monthly scheduled task: Send users a summary report of their parking activity
-def send_monthly_user_report():
+# Monthly scheduled task: compute every user's activity for last month (or `period`,
+# 'YYYY-MM') in one query, then fan the emails out to workers in batches
+def send_monthly_user_report(period=None):
     with flask_app.app_context():
-        today = datetime.now(timezone.utc).date()
-        today = date(2025, 8, 1) # Test Run
-        first_day_of_month = today.replace(day=1)
-        last_month = first_day_of_month - timedelta(days=1)
-        first_day_last_month = last_month.replace(day=1)
-        last_day_last_month = last_month
-
-        print(f"Generating reports for: {first_day_last_month} to {last_day_last_month}")
-
-        users = User.query.filter(User.role != 'admin').all()
-
-        for user in users:
-            reservations = (
-                db.session.query(Reservation)
-                .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
-                .join(ParkingLot, ParkingLot.id == ParkingSpot.lot_id)
-                .filter(
-                    Reservation.user_id == user.id,
-                    func.date(Reservation.parking_time) >= first_day_last_month,
-                    func.date(Reservation.parking_time) <= last_day_last_month
-                )
-                .all()
-            )
+        if period is None:
+            today = datetime.now(timezone.utc).date()
+            # today = date(2025, 8, 1) # Test run
+            period = (today.replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+
+        start, end = _month_bounds(period)
+        print(f"Generating reports for: {start.date()} to {(end - timedelta(days=1)).date()}")
+
+        activity = monthly_user_activity(start, end)
+        delivered = set(db.session.execute(
+            select(ReportDelivery.user_id).where(ReportDelivery.report == f'monthly:{period}')
+        ).scalars())
+        pending = [row for row in activity if row['user_id'] not in delivered]
+
+        summary = {'period': period, 'users': len(activity), 'already_sent': len(activity) - len(pending)}
+        if not pending:
+            print(f"No monthly reports left to send for {period}")
+            return summary
+
+        # One task per batch; the saved group result tracks progress across workers
+        result = group(
+            send_monthly_report_batch.s(period, batch) for batch in chunked(pending, REPORT_BATCH_SIZE)
+        ).apply_async()
+        result.save()
+
+        summary.update(batches=len(result.results), group_id=result.id)
+        print(f"Monthly reports for {period}: {len(pending)} users in {len(result.results)} batches (group {result.id})")
+        return summary
+
+# Records one emailed report as soon as the server accepted it, so a worker that
+# dies mid-batch does not send it again on retry. A row already there (another
+# worker sent it too) is kept; any other failed insert is logged and only risks
+# a duplicate email, so the rest of the batch is still sent.
+def record_delivery(report, user_id):
+    try:
+        db.session.execute(
+            insert(ReportDelivery).values(report=report, user_id=user_id, sent_at=datetime.now(timezone.utc))
+        )
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+    except SQLAlchemyError:
+        db.session.rollback()
+        log.exception("Could not record %s delivery for user %s", report, user_id)
 
-            if not reservations:
-                continue
-
-            total_bookings = len(reservations)
-            total_cost = sum(r.cost for r in reservations if r.cost)
-
-            # Count most used lot by name
-            lot_counter = {}
-            for r in reservations:
-                lot = (
-                    db.session.query(ParkingLot)
-                    .join(ParkingSpot, ParkingSpot.lot_id == ParkingLot.id)
-                    .filter(ParkingSpot.id == r.spot_id)
-                    .first()
-                )
-                if lot:
-                    lot_name = lot.prime_location
-                    lot_counter[lot_name] = lot_counter.get(lot_name, 0) + 1
-
-            most_used_lot = max(lot_counter, key=lot_counter.get)
-
-            print("\nHello This Is send_monthly_user_report function\n")
-
-            # --- Create HTML Report for user ---
-            html_body = f"""
-            <h2>Monthly Parking Activity Report</h2>
-            <p>Hello <b>{user.full_name}</b>, here is your report for <b>{first_day_last_month.strftime('%B %Y')}</b>.</p>
-            <ul>
-                <li>Total Reservations: <b>{total_bookings}</b></li>
-                <li>Most Used Parking Lot: <b>{most_used_lot}</b></li>
-                <li>Total Spent: ₹<b>{total_cost}</b></li>
-            </ul>
-            <p>Thanks for using our Parking System!</p>
-            """
+@celery_app.task
+# Fan-out worker: render and send one batch of monthly reports, skipping users who
+# already received this period's report and recording each delivery as it is sent
+def send_monthly_report_batch(period, activity):
+    with flask_app.app_context():
+        report = f'monthly:{period}'
+        month_label = datetime.strptime(period, '%Y-%m').strftime('%B %Y')
 
-            try:
-                print("\nInside that try function btw\n")
-                msg = Message(
-                    subject="Monthly Parking Report",
-                    recipients=[user.email],
-                    html=html_body
-                )
-                mail.send(msg)
-                print(f"Monthly report sent to {user.email}")
-            except Exception as e:
-                print(f"Failed to send report to {user.email}: {e}")
+        delivered = set(db.session.execute(
+            select(ReportDelivery.user_id).where(
+                ReportDelivery.report == report,
+                ReportDelivery.user_id.in_([row['user_id'] for row in activity])
+            )
+        ).scalars())
+        pending = [row for row in activity if row['user_id'] not in delivered]
+
+        user_by_email = {row['email']: row['user_id'] for row in pending}
+        totals = send_messages(
+            (monthly_report_mail(row, month_label) for row in pending),
+            on_sent=lambda message: record_delivery(report, user_by_email[message.recipients[0]])
+        )
+
+        totals['skipped'] = len(activity) - len(pending)
+        print(f"Monthly reports {period} batch: {totals['sent']} sent, {totals['failed']} failed, {totals['skipped']} already sent")
+        return totals
+
+## Monthly Report Progress
+# Batch completion and delivery counts for a group id returned by send_monthly_user_report
+def monthly_report_progress(group_id):
+    result = GroupResult.restore(group_id, app=celery_app)
+    if result is None:
+        return None
+
+    done = [task.result for task in result.results if task.successful()]
+    return {
+        'batches': len(result.results),
+        'completed': result.completed_count(),
+        'sent': sum(totals['sent'] for totals in done),
+        'failed': sum(totals['failed'] for totals in done)
+    }
 
 @celery_app.task
-# On-demand task: Export a user's parking history as a CSV and email it
-def export_user_parking_history(user_id):
+# On-demand task: Export a user's parking history as a CSV (gzip if `compress`) and email it
+def export_user_parking_history(user_id, compress=False):
     try:
         with flask_app.app_context():
             print("USER ID: ", user_id)
-            user = User.query.get(int(user_id))
+            user = db.session.get(User, int(user_id))
 
             if not user:
                 print(f"No user found with id {user_id}")
                 return
 
-            reservations = (
-                Reservation.query
-                .filter_by(user_id=user.id)
-                .order_by(Reservation.parking_time.desc())
-                .all()
-            )
-
-            if not reservations:
+            if not has_history(user.id):
                 print(f"No reservations for {user.email}")
                 return
 
-            # Prepare CSV file for user's parking history
-            output = io.StringIO()
-            writer = csv.writer(output)
-            writer.writerow([
-                'Slot ID', 'Spot ID', 'Parking Time', 'Checkout Time',
-                'Duration (mins)', 'Cost (Rs)', 'Lot Name'
-            ])
-
-            for r in reservations:
-                spot = ParkingSpot.query.get(r.spot_id)
-                lot = ParkingLot.query.get(spot.lot_id)
-
-                parking_time = r.parking_time.strftime('%Y-%m-%d %H:%M')
-                leaving_time = r.leaving_time.strftime('%Y-%m-%d %H:%M') if r.leaving_time else '-'
-                duration = (r.leaving_time - r.parking_time).total_seconds() // 60 if r.leaving_time else '-'
-
-                writer.writerow([
-                    r.id,
-                    spot.id,
-                    parking_time,
-                    leaving_time,
-                    duration,
-                    r.cost,
-                    lot.prime_location
-                ])
-
+            # Rows stream into a spooled buffer. Only an attachment within
+            # EXPORT_ATTACHMENT_MAX_BYTES is read into memory (gzipped if the CSV is
+            # larger); a bigger history gets a link to the streamed download instead.
+            export, compressed = attachment_export(user.id, compress, flask_app.config['EXPORT_ATTACHMENT_MAX_BYTES'])
             try:
-                msg = Message(
-                    subject="Your Parking History Report (CSV)",
-                    recipients=[user.email],
-                    body=f"Hi {user.full_name},\n\nPlease find your parking history report."
-                )
-                msg.attach("parking_history.csv", "text/csv", output.getvalue())
+                if export is None:
+                    msg = Message(
+                        subject="Your Parking History Report (CSV)",
+                        recipients=[user.email],
+                        body=f"Hi {user.full_name},\n\nYour parking history is too large to attach. "
+                             f"Sign in and download it from {flask_app.config['API_URL']}/export_parking_csv/download?gzip=1"
+                    )
+                else:
+                    msg = Message(
+                        subject="Your Parking History Report (CSV)",
+                        recipients=[user.email],
+                        body=f"Hi {user.full_name},\n\nPlease find your parking history report."
+                    )
+                    with export:
+                        msg.attach(export_filename(compressed), export_mimetype(compressed), export.read())
                 mail.send(msg)
-                print(f"CSV report sent to {user.email}")
+                print(f"CSV report sent to {user.email}" + (" (download link)" if export is None else ""))
             except Exception as e:
                 print(f"Failed to send CSV to {user.email}: {e}")
 
     except Exception as e:
-        print("Error: ", e)
\ No newline at end of file
+        print("Error: ", e)
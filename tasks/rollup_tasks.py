@@ -0,0 +1,15 @@
+# Celery tasks that maintain the daily reservation rollups
+from backend.models.rollups import reconcile_rollups
+from celery_app import celery_app
+
+# Get Flask app context from Celery for DB access
+flask_app = celery_app.flask_app
+
+@celery_app.task
+# Nightly scheduled task: rebuild the rollups of the last `days` days from the
+# reservations and report any drift; with days=None, backfill all history
+def reconcile_daily_rollups(days=None):
+    with flask_app.app_context():
+        result = reconcile_rollups(days)
+        print(f"Daily rollups from {result['start']} ({result['days']} days): {result['drift']} rows repaired")
+        return result